@@ -0,0 +1,3 @@
+"""
+API HTTP TextToSQL (FastAPI)
+"""
@@ -0,0 +1,45 @@
+"""
+Dépendances FastAPI : ressources partagées par toutes les requêtes d'un worker
+"""
+import asyncio
+from fastapi import Request
+from langchain_community.utilities import SQLDatabase
+from infrastructure.database import db_manager
+from infrastructure.llm import get_llm
+from infrastructure.rate_limit import current_user
+from app.security import is_valid_api_key
+
+def get_llm_client():
+    """Client LLM partagé (connexions HTTP réutilisées entre requêtes)"""
+    return get_llm()
+
+async def get_database() -> SQLDatabase:
+    """
+    Base partagée, adossée au pool de connexions du DatabaseManager
+
+    La première construction (connexion + snapshot du schéma) est bloquante :
+    elle est déportée dans un thread pour ne pas geler la boucle d'événements.
+    """
+    if db_manager.db is not None:
+        return db_manager.db
+    return await asyncio.to_thread(db_manager.get_db)
+
+async def identify_user(request: Request) -> str:
+    """
+    Identité utilisée pour le quota par utilisateur
+
+    X-User-Id n'est cru que si la requête porte une clé API valide (client
+    de confiance relayant ses utilisateurs) ; sinon l'adresse IP du client,
+    pour qu'un en-tête changeant ne donne pas un quota neuf à chaque requête.
+    Positionnée dans le contexte de la requête, elle suit la génération
+    jusqu'au rate limiter sans être passée explicitement.
+    """
+    user = None
+    if is_valid_api_key(request.headers.get("x-api-key")):
+        user_id = request.headers.get("x-user-id")
+        user = f"key:{user_id}" if user_id else "key"
+    elif request.client:
+        user = f"ip:{request.client.host}"
+    if user:
+        current_user.set(user)
+    return current_user.get()
@@ -0,0 +1,104 @@
+"""
+Point d'entrée FastAPI
+"""
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.routers import health, sql
+from app.security import check_auth_configured
+from infrastructure.cache import cache_manager
+from infrastructure.database import db_manager
+from infrastructure.health import health_prober
+from infrastructure.metrics_exporter import CONTENT_TYPE, metrics_exporter, render_metrics
+from infrastructure.monitoring import metrics
+from infrastructure.rate_limit import RateLimitExceeded
+from infrastructure.resilience import CircuitOpenError
+from infrastructure.settings import settings
+from infrastructure.tracing import new_trace
+from infrastructure.logging import logger
+
+# Langues de l'interface (langue/translator.py) : les autres étiquettes sont regroupées
+_TRACE_LANGUAGES = ("fr", "en", "ja")
+
+def _trace_language(accept_language: str) -> str:
+    """Étiquette de langue bornée d'après Accept-Language (ex: "fr-FR,fr;q=0.9" -> "fr")"""
+    tag = accept_language.split(",")[0].split(";")[0].split("-")[0].strip().lower()
+    return tag if tag in _TRACE_LANGUAGES else "other"
+
+async def _warm_up():
+    """Ouvre le pool et charge le schéma avant la première requête"""
+    try:
+        await asyncio.to_thread(db_manager.get_db)
+        logger.info("API warm-up complete")
+    except Exception as e:
+        # Non bloquant : la première requête retentera la connexion
+        logger.warning("API warm-up failed", error=str(e))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_auth_configured()
+    warm_up = asyncio.create_task(_warm_up())
+    health_prober.start()
+    metrics_exporter.start()
+    logger.info("API worker started", version=settings.app_version)
+    yield
+    warm_up.cancel()
+    health_prober.stop()
+    metrics_exporter.stop()
+    cache_manager.close()
+    db_manager.close()
+    logger.info("API worker stopped")
+
+def create_app() -> FastAPI:
+    """Construit l'application (un exemplaire par worker uvicorn)"""
+    app = FastAPI(title=settings.app_name, version=settings.app_version,
+                  debug=settings.debug, lifespan=lifespan)
+
+    @app.middleware("http")
+    async def record_request(request: Request, call_next):
+        start_time = time.time()
+        # Une trace par requête, étiquetée par langue (cardinalité bornée des métriques)
+        new_trace(language=_trace_language(request.headers.get("accept-language", "")))
+        try:
+            response = await call_next(request)
+        except Exception:
+            metrics.record_request(time.time() - start_time, success=False)
+            raise
+        metrics.record_request(time.time() - start_time, success=response.status_code < 500)
+        return response
+
+    @app.exception_handler(RateLimitExceeded)
+    async def rate_limited(request: Request, exc: RateLimitExceeded):
+        return JSONResponse(
+            status_code=429,
+            content={"detail": str(exc), "reason": exc.reason},
+            headers={"Retry-After": str(math.ceil(exc.retry_after))}
+        )
+
+    @app.exception_handler(CircuitOpenError)
+    async def dependency_unavailable(request: Request, exc: CircuitOpenError):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": str(exc), "dependency": exc.dependency},
+            headers={"Retry-After": str(math.ceil(exc.retry_after))}
+        )
+
+    @app.get("/")
+    async def root():
+        """Informations de base"""
+        return {"name": settings.app_name, "version": settings.app_version, "docs": "/docs"}
+
+    @app.get("/metrics", include_in_schema=False)
+    async def openmetrics():
+        """Métriques agrégées de tous les workers, au format OpenMetrics"""
+        body = await asyncio.to_thread(render_metrics)
+        return PlainTextResponse(body, media_type=CONTENT_TYPE)
+
+    app.include_router(health.router)
+    app.include_router(sql.router)
+    return app
+
+app = create_app()
@@ -0,0 +1,3 @@
+"""
+Routeurs de l'API
+"""
@@ -0,0 +1,46 @@
+"""
+Health checks et métriques
+"""
+import asyncio
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from infrastructure.database import db_manager
+from infrastructure.health import health_prober
+from infrastructure.monitoring import get_system_health, metrics
+from infrastructure.rate_limit import rate_limiter
+from infrastructure.resilience import get_breaker_stats, hedge_stats
+from infrastructure.settings import settings
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+@router.get("")
+async def liveness():
+    """Liveness : le worker répond (aucune dépendance externe consultée)"""
+    return {"status": "ok", "version": settings.app_version}
+
+@router.get("/ready")
+async def readiness():
+    """Readiness : une connexion du pool répond à SELECT 1"""
+    healthy = await asyncio.to_thread(db_manager.health_check)
+    return JSONResponse(
+        status_code=200 if healthy else 503,
+        content={"status": "ok" if healthy else "unavailable", "database": healthy}
+    )
+
+@router.get("/system")
+async def system_status():
+    """État des services (dernière vérification en arrière-plan) et ressources système"""
+    return {
+        "services": health_prober.get_details(),
+        "system": await asyncio.to_thread(get_system_health)
+    }
+
+@router.get("/metrics")
+async def get_metrics():
+    """Métriques applicatives du worker (rate limiter, pool de connexions, disjoncteurs)"""
+    worker_metrics = await asyncio.to_thread(metrics.get_metrics)
+    worker_metrics["rate_limit"] = rate_limiter.get_stats()
+    worker_metrics["database_pool"] = db_manager.get_pool_stats()
+    worker_metrics["circuit_breakers"] = get_breaker_stats()
+    worker_metrics["llm_hedging"] = hedge_stats.get_stats()
+    return worker_metrics
@@ -0,0 +1,149 @@
+"""
+Endpoints SQL : génération, exécution, tables et cache
+"""
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from domain.sql.execution import QueryExecutionError, execute_query_stream
+from domain.sql.generation_cache import generation_cache
+from domain.sql.service import agenerate_sql_query_only, astream_sql_query
+from infrastructure.cache import cache_manager
+from infrastructure.rate_limit import RateLimitExceeded
+from infrastructure.resilience import CircuitOpenError
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+from app.dependencies import get_database, get_llm_client, identify_user
+from app.security import require_api_key, sign_sql, verify_sql_token
+from app.schemas.sql import (
+    CacheStatsResponse, ExecuteRequest, GenerateRequest, GenerateResponse,
+    QueryResult, TablesResponse
+)
+
+router = APIRouter(prefix="/sql", tags=["sql"],
+                   dependencies=[Depends(require_api_key), Depends(identify_user)])
+
+NDJSON = "application/x-ndjson"
+
+def _ndjson(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, ensure_ascii=False, default=str) + "\n"
+
+async def _open_stream(sql: str, **kwargs):
+    """Ouvre le flux de résultat hors de la boucle ; erreurs converties en HTTP"""
+    try:
+        return await asyncio.to_thread(execute_query_stream, sql, **kwargs)
+    except QueryExecutionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.error("Query execution failed", error=str(e))
+        raise HTTPException(status_code=502, detail="Query execution failed")
+
+@router.post("/generate", response_model=GenerateResponse)
+async def generate(request: GenerateRequest, llm=Depends(get_llm_client), db=Depends(get_database)):
+    """Génère la requête SQL (et l'exécute si execute_query)"""
+    start_time = time.time()
+
+    sql = None
+    if request.use_cache:
+        sql = await asyncio.to_thread(generation_cache.lookup, request.question, llm, db)
+    cached = sql is not None
+    if not cached:
+        try:
+            sql = await agenerate_sql_query_only(request.question, llm, db, use_cache=False)
+        except (RateLimitExceeded, CircuitOpenError):
+            raise
+        except Exception as e:
+            logger.error("SQL generation failed", error=str(e))
+            raise HTTPException(status_code=502, detail="SQL generation failed")
+
+    result = None
+    if request.execute_query:
+        stream = await _open_stream(sql, page_size=request.max_rows, max_rows=request.max_rows)
+        try:
+            rows = await asyncio.to_thread(stream.fetch_page)
+        finally:
+            await asyncio.to_thread(stream.close)
+        result = QueryResult(columns=stream.columns, rows=jsonable_encoder(rows),
+                             truncated=stream.truncated or not stream.exhausted)
+
+    return GenerateResponse(sql=sql, execution_time=round(time.time() - start_time, 3),
+                            cached=cached, sql_token=sign_sql(sql), result=result)
+
+@router.post("/generate/stream")
+async def generate_stream(request: GenerateRequest, llm=Depends(get_llm_client),
+                          db=Depends(get_database)):
+    """
+    Génération en flux NDJSON : {"partial": ...} par token, puis {"sql": ..., "done": true}
+
+    Une déconnexion du client ferme le flux côté LLM.
+    """
+    async def events() -> AsyncIterator[str]:
+        sql = ""
+        try:
+            async for partial in astream_sql_query(request.question, llm, db):
+                sql = partial
+                yield _ndjson({"partial": partial})
+        except (RateLimitExceeded, CircuitOpenError) as e:
+            yield _ndjson({"error": str(e), "retry_after": round(e.retry_after, 1), "done": True})
+            return
+        except Exception as e:
+            logger.error("SQL generation failed", error=str(e))
+            yield _ndjson({"error": "SQL generation failed", "done": True})
+            return
+        yield _ndjson({"sql": sql, "sql_token": sign_sql(sql), "done": True})
+
+    return StreamingResponse(events(), media_type=NDJSON)
+
+@router.post("/execute")
+async def execute(request: ExecuteRequest):
+    """
+    Exécute une requête de lecture et renvoie le résultat page par page en NDJSON
+
+    Seul le SQL produit par /sql/generate (accompagné de son sql_token) est
+    accepté, sauf si API_EXECUTE_ARBITRARY_SQL est activé.
+    Première ligne : {"columns": [...]}, puis {"rows": [...]} par page,
+    enfin {"done": true, "rows": n, "truncated": bool}.
+    """
+    if not settings.api_execute_arbitrary_sql and not verify_sql_token(request.sql, request.sql_token):
+        raise HTTPException(status_code=403,
+                            detail="Only SQL generated by this service can be executed (sql_token)")
+    stream = await _open_stream(request.sql, page_size=request.page_size,
+                                max_rows=request.max_rows, use_cache=request.use_cache)
+
+    async def pages() -> AsyncIterator[str]:
+        try:
+            yield _ndjson({"columns": stream.columns})
+            while not stream.closed:
+                rows = await asyncio.to_thread(stream.fetch_page)
+                if rows:
+                    yield _ndjson({"rows": rows})
+            yield _ndjson({"done": True, "rows": stream.rows_fetched, "truncated": stream.truncated})
+        finally:
+            # Rend la connexion au pool même si le client se déconnecte
+            await asyncio.to_thread(stream.close)
+
+    return StreamingResponse(pages(), media_type=NDJSON)
+
+@router.get("/tables", response_model=TablesResponse)
+async def list_tables(db=Depends(get_database)):
+    """Tables utilisables (depuis le snapshot du schéma, sans requête Redshift)"""
+    tables = sorted(db.get_usable_table_names())
+    return TablesResponse(tables=tables, count=len(tables))
+
+@router.get("/cache/stats", response_model=CacheStatsResponse)
+async def cache_stats():
+    """Statistiques du cache"""
+    return CacheStatsResponse(stats=await asyncio.to_thread(cache_manager.get_stats))
+
+@router.delete("/cache/clear")
+async def clear_cache():
+    """Vide le cache local du worker (le cache Redis partagé n'est pas touché)"""
+    await asyncio.to_thread(cache_manager.clear)
+    generation_cache.clear()
+    logger.info("Cache cleared via API")
+    return {"cleared": True}
@@ -0,0 +1,3 @@
+"""
+Schémas Pydantic de l'API
+"""
@@ -0,0 +1,38 @@
+"""
+Schémas des requêtes et réponses SQL
+"""
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+class GenerateRequest(BaseModel):
+    question: str = Field(..., min_length=1, max_length=2000)
+    execute_query: bool = False
+    use_cache: bool = True
+    max_rows: Optional[int] = Field(None, ge=1)
+
+class QueryResult(BaseModel):
+    columns: List[str]
+    rows: List[List[Any]]
+    truncated: bool = False
+
+class GenerateResponse(BaseModel):
+    sql: str
+    execution_time: float
+    cached: bool
+    # Signature du SQL, à renvoyer à /sql/execute
+    sql_token: str
+    result: Optional[QueryResult] = None
+
+class ExecuteRequest(BaseModel):
+    sql: str = Field(..., min_length=1)
+    sql_token: Optional[str] = None
+    page_size: Optional[int] = Field(None, ge=1)
+    max_rows: Optional[int] = Field(None, ge=1)
+    use_cache: bool = True
+
+class TablesResponse(BaseModel):
+    tables: List[str]
+    count: int
+
+class CacheStatsResponse(BaseModel):
+    stats: Dict[str, Any]
@@ -0,0 +1,43 @@
+"""
+Sécurité de l'API : clé d'accès et jetons de SQL généré
+
+- X-API-Key exigé sur les endpoints /sql ; sans API_KEY, l'API refuse de
+  démarrer (et /sql répond 401) sauf si API_AUTH_DISABLED est activé ;
+- /sql/generate signe le SQL produit (sql_token, HMAC) : /sql/execute
+  n'exécute que du SQL signé, sauf si API_EXECUTE_ARBITRARY_SQL est activé.
+"""
+import hashlib
+import hmac
+from typing import Optional
+from fastapi import Header, HTTPException
+from infrastructure.settings import settings
+
+def _signing_key() -> bytes:
+    """Clé HMAC partagée par tous les workers (dérivée d'un secret de configuration)"""
+    secret = settings.api_signing_key or settings.api_key or settings.google_api_key
+    return hashlib.sha256(f"texttosql-sql-token|{secret}".encode()).digest()
+
+def sign_sql(sql: str) -> str:
+    """Jeton prouvant que ce SQL a été produit par le service"""
+    return hmac.new(_signing_key(), sql.encode(), hashlib.sha256).hexdigest()
+
+def verify_sql_token(sql: str, token: Optional[str]) -> bool:
+    return bool(token) and hmac.compare_digest(sign_sql(sql), token)
+
+def is_valid_api_key(x_api_key: Optional[str]) -> bool:
+    """Clé présentée égale à API_KEY (False si aucune clé n'est configurée)"""
+    return bool(settings.api_key and x_api_key) and hmac.compare_digest(x_api_key, settings.api_key)
+
+def check_auth_configured():
+    """Refuse le démarrage sans API_KEY, sauf désactivation explicite"""
+    if not settings.api_key and not settings.api_auth_disabled:
+        raise RuntimeError("API_KEY is not set: define it, or set API_AUTH_DISABLED=true "
+                           "to serve /sql without authentication")
+
+async def require_api_key(x_api_key: Optional[str] = Header(None)):
+    """Authentification par en-tête X-API-Key (ignorée si API_AUTH_DISABLED est activé)"""
+    if settings.api_auth_disabled:
+        return
+    if not is_valid_api_key(x_api_key):
+        raise HTTPException(status_code=401, detail="Invalid or missing API key",
+                            headers={"WWW-Authenticate": "ApiKey"})
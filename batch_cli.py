@@ -0,0 +1,41 @@
+"""
+CLI de génération SQL en lot
+Usage : python batch_cli.py questions.jsonl -o results.jsonl --concurrency 8 --rpm 120
+"""
+import argparse
+import os
+import sys
+
+# Ajouter le répertoire racine au PYTHONPATH pour les imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Génère le SQL d'un fichier de questions (JSONL ou CSV)")
+    parser.add_argument("input", help="Fichier de questions (.jsonl ou .csv avec une colonne 'question')")
+    parser.add_argument("-o", "--output", required=True, help="Fichier JSONL de résultats (sert aussi de checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Générations simultanées (défaut: 4)")
+    parser.add_argument("--retries", type=int, default=3,
+                        help="Nouvelles tentatives par question après un 429 ou un circuit ouvert (défaut: 3)")
+    parser.add_argument("--rpm", type=float, default=None, help="Appels LLM maximum par minute")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore le checkpoint et réécrit la sortie")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from domain.sql.batch import run_batch
+
+    stats = run_batch(
+        args.input,
+        args.output,
+        concurrency=args.concurrency,
+        max_retries=args.retries,
+        requests_per_minute=args.rpm,
+        resume=not args.no_resume
+    )
+    print(f"ok={stats['ok']} error={stats['error']} skipped={stats['skipped']} "
+          f"deduplicated={stats['deduplicated']}")
+    return 1 if stats["error"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
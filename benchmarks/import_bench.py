@@ -0,0 +1,77 @@
+"""
+Benchmark du démarrage à froid : temps d'import des modules applicatifs
+
+Chaque module est importé dans un interpréteur neuf, sans variables
+d'environnement de l'application : l'import ne doit ni valider la
+configuration, ni ouvrir de connexion, ni charger les dépendances lourdes
+(LangChain, SDK Gemini, SQLAlchemy, psutil, redis, sqlglot), réservées au premier usage.
+
+Usage :
+    python -m benchmarks.import_bench --budget-ms 400
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MODULES = [
+    "infrastructure.settings",
+    "infrastructure.logging",
+    "infrastructure.monitoring",
+    "infrastructure.cache",
+    "infrastructure.database",
+    "infrastructure.llm",
+    "infrastructure.health",
+    "infrastructure.rate_limit",
+    "infrastructure.metrics_exporter",
+    "domain.sql.service",
+    "domain.sql.generation_jobs",
+]
+
+HEAVY_MODULES = ["langchain", "langchain_core", "langchain_community", "langchain_google_genai",
+                 "google.ai", "sqlalchemy", "psutil", "redis", "sqlglot"]
+
+_PROBE = """
+import json, sys, time
+start_time = time.perf_counter()
+import {module}
+elapsed_ms = (time.perf_counter() - start_time) * 1000
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"elapsed_ms": elapsed_ms, "heavy": heavy}}))
+"""
+
+def measure(module: str, root: str) -> dict:
+    """Importe le module dans un sous-processus (environnement minimal)"""
+    env = {"PATH": os.environ.get("PATH", ""), "PYTHONPATH": root, "HOME": os.environ.get("HOME", "")}
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=root, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Temps d'import à froid des modules applicatifs")
+    parser.add_argument("--budget-ms", type=float, default=400.0,
+                        help="temps d'import maximal accepté par module (ms)")
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    failed = False
+    for module in MODULES:
+        result = measure(module, root)
+        if "error" in result:
+            failed = True
+            print(f"{module:<34} ERREUR  {result['error']}")
+            continue
+        ok = result["elapsed_ms"] <= args.budget_ms and not result["heavy"]
+        failed |= not ok
+        heavy = f"  chargés={','.join(result['heavy'])}" if result["heavy"] else ""
+        print(f"{module:<34} {result['elapsed_ms']:8.1f} ms  {'OK' if ok else 'FAIL'}{heavy}")
+
+    raise SystemExit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
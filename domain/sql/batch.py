@@ -0,0 +1,208 @@
+"""
+Génération SQL en lot : déduplication, concurrence bornée, gestion des quotas,
+reprise sur checkpoint et écriture des résultats en flux
+"""
+import csv
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+from domain.sql.generation_cache import normalize_question
+from domain.sql.service import generate_sql
+from infrastructure.rate_limit import BATCH_USER, RateLimitExceeded, current_user
+from infrastructure.resilience import CircuitOpenError
+from infrastructure.logging import logger
+
+def read_questions(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Lit un fichier de questions JSONL ou CSV
+
+    Chaque entrée a au moins une clé « question » ; « id » est optionnel
+    (numéro de ligne par défaut).
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            for line_number, row in enumerate(csv.DictReader(f), start=1):
+                if row.get("question"):
+                    yield {"id": row.get("id") or str(line_number), "question": row["question"]}
+        else:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if isinstance(record, str):
+                    record = {"question": record}
+                if record.get("question"):
+                    yield {"id": str(record.get("id") or line_number), "question": record["question"]}
+
+def load_checkpoint(output_path: str) -> Set[str]:
+    """Identifiants déjà traités avec succès (le fichier de sortie sert de checkpoint)"""
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # ligne tronquée par un arrêt brutal
+            if record.get("status") == "ok":
+                done.add(str(record["id"]))
+    return done
+
+def is_rate_limited(error: Exception) -> bool:
+    """Détecte une erreur de quota : rate limiter local ou 429 côté Gemini"""
+    if isinstance(error, RateLimitExceeded):
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in ("429", "resourceexhausted", "resource exhausted",
+                                             "rate limit", "quota"))
+
+class RateLimitGate:
+    """Espacement minimal entre appels + pause globale après un 429"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Attend le prochain créneau d'appel disponible"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._paused_until)
+            self._next_slot = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        """Suspend tous les workers (quota atteint)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+class BatchRunner:
+    """Exécute un lot de questions et écrit un résultat JSONL par question d'entrée"""
+
+    def __init__(self, llm, db, concurrency: int = 4, max_retries: int = 3,
+                 requests_per_minute: Optional[float] = None, backoff_base: float = 2.0):
+        self.llm = llm
+        self.db = db
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.gate = RateLimitGate(requests_per_minute)
+        self._write_lock = threading.Lock()
+        self.stats = {"ok": 0, "error": 0, "skipped": 0, "deduplicated": 0}
+
+    def _generate(self, question: str) -> str:
+        """
+        Génère sous l'identité BATCH_USER (quota dédié), avec pause globale
+        si quota ou dépendance indisponible
+
+        Seuls les refus de quota et les circuits ouverts sont réessayés ici :
+        les erreurs transitoires du LLM le sont déjà par call_llm. Un quota
+        utilisateur épuisé fait attendre sans consommer de tentative.
+        """
+        # Threads du pool : le contexte de l'appelant n'est pas hérité
+        current_user.set(BATCH_USER)
+        attempt = 0
+        while True:
+            self.gate.acquire()
+            try:
+                return generate_sql(question, self.llm, self.db)
+            except Exception as e:
+                if not (is_rate_limited(e) or isinstance(e, CircuitOpenError)):
+                    raise
+                user_quota = isinstance(e, RateLimitExceeded) and e.reason == "user_quota"
+                if not user_quota:
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        raise
+                delay = self.backoff_base ** max(attempt, 1) + random.uniform(0, 1)
+                if isinstance(e, (RateLimitExceeded, CircuitOpenError)):
+                    delay = max(delay, e.retry_after)
+                if isinstance(e, CircuitOpenError):
+                    # Dépendance en panne : inutile que les autres workers insistent
+                    logger.warning("Dependency unavailable, pausing batch",
+                                   dependency=e.dependency, delay=round(delay, 1))
+                else:
+                    logger.warning("Rate limited, pausing batch", delay=round(delay, 1),
+                                   attempt=attempt)
+                self.gate.pause(delay)
+
+    def _write(self, out, records: List[Dict[str, Any]], status: str):
+        with self._write_lock:
+            for record in records:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            self.stats[status] += len(records)
+
+    def _process(self, out, normalized: str, entries: List[Dict[str, Any]]):
+        question = entries[0]["question"]
+        start_time = time.time()
+        try:
+            sql = self._generate(question)
+            status, error = "ok", None
+        except Exception as e:
+            sql, status, error = None, "error", str(e)
+        elapsed = round(time.time() - start_time, 3)
+
+        # Un résultat par identifiant d'entrée, même pour les doublons
+        self._write(out, [
+            {"id": entry["id"], "question": entry["question"], "sql": sql,
+             "status": status, "error": error, "duration_s": elapsed}
+            for entry in entries
+        ], status)
+
+    def run(self, questions: Iterable[Dict[str, Any]], output_path: str,
+            resume: bool = True) -> Dict[str, int]:
+        """Traite les questions ; avec resume, celles déjà réussies sont ignorées"""
+        done = load_checkpoint(output_path) if resume else set()
+
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in questions:
+            if entry["id"] in done:
+                self.stats["skipped"] += 1
+                continue
+            key = normalize_question(entry["question"])
+            if key in groups:
+                self.stats["deduplicated"] += 1
+            groups.setdefault(key, []).append(entry)
+
+        logger.info("Batch started", unique_questions=len(groups),
+                    skipped=self.stats["skipped"], concurrency=self.concurrency)
+        start_time = time.time()
+        mode = "a" if resume else "w"
+        with open(output_path, mode, encoding="utf-8") as out, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            pending = set()
+            for normalized, entries in groups.items():
+                # Fenêtre bornée : pas plus de 2x concurrency tâches en mémoire
+                if len(pending) >= self.concurrency * 2:
+                    _, pending = wait(pending, return_when=FIRST_COMPLETED)
+                pending.add(pool.submit(self._process, out, normalized, entries))
+            wait(pending)
+
+        logger.info("Batch finished", duration_s=round(time.time() - start_time, 1), **self.stats)
+        return self.stats
+
+def run_batch(input_path: str, output_path: str, llm=None, db=None, concurrency: int = 4,
+              max_retries: int = 3, requests_per_minute: Optional[float] = None,
+              resume: bool = True) -> Dict[str, int]:
+    """Point d'entrée programmatique : fichier de questions -> fichier JSONL de résultats"""
+    if llm is None:
+        from infrastructure.llm import get_llm
+        llm = get_llm()
+    if db is None:
+        from infrastructure.database import connect_to_redshift
+        db = connect_to_redshift()
+
+    runner = BatchRunner(llm, db, concurrency=concurrency, max_retries=max_retries,
+                         requests_per_minute=requests_per_minute)
+    return runner.run(read_questions(input_path), output_path, resume=resume)
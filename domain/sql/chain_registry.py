@@ -0,0 +1,100 @@
+"""
+Registre des chaînes SQL partagées entre sessions et threads
+
+LangChain n'est importé qu'à la construction de la première chaîne.
+"""
+import threading
+from typing import Any, Dict, Optional, Tuple
+from infrastructure.database import get_schema_fingerprint
+from infrastructure.llm import get_llm_config_key
+from infrastructure.logging import logger
+
+ChainKey = Tuple[str, float, Optional[int], str]
+
+class ChainRegistry:
+    """Construit chaque chaîne SQL une seule fois par (modèle, température, max_tokens, schéma)"""
+
+    def __init__(self):
+        self._chains: Dict[ChainKey, Any] = {}
+        self._streaming_chains: Dict[ChainKey, Any] = {}
+        self._stages: Dict[Tuple[ChainKey, bool], Tuple[Any, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _make_key(self, llm, db) -> ChainKey:
+        """Clé de registre dérivée de la configuration du LLM et du schéma"""
+        return get_llm_config_key(llm) + (get_schema_fingerprint(db),)
+
+    def get_chain(self, llm, db):
+        """Retourne la chaîne partagée, en la construisant au premier appel"""
+        key = self._make_key(llm, db)
+        chain = self._chains.get(key)
+        if chain is not None:
+            return chain
+
+        with self._lock:
+            chain = self._chains.get(key)
+            if chain is None:
+                from langchain.chains import create_sql_query_chain
+                chain = create_sql_query_chain(llm, db)
+                self._chains[key] = chain
+                logger.info("SQL chain built", model=key[0],
+                            temperature=key[1], max_tokens=key[2],
+                            schema_version=key[3])
+        return chain
+
+    def get_streaming_chain(self, llm, db):
+        """
+        Variante de la chaîne qui émet les tokens au fil de l'eau
+
+        La dernière étape de create_sql_query_chain (strip) agrège toute la sortie
+        avant de l'émettre ; on la retire pour que StrOutputParser streame.
+        """
+        key = self._make_key(llm, db)
+        chain = self._streaming_chains.get(key)
+        if chain is not None:
+            return chain
+
+        from langchain_core.runnables import RunnableSequence
+        full_chain = self.get_chain(llm, db)
+        with self._lock:
+            chain = self._streaming_chains.get(key)
+            if chain is None:
+                steps = getattr(full_chain, "steps", None)
+                if isinstance(full_chain, RunnableSequence) and steps and len(steps) > 2:
+                    chain = RunnableSequence(*steps[:-1])
+                else:
+                    chain = full_chain
+                self._streaming_chains[key] = chain
+        return chain
+
+    def get_chain_stages(self, llm, db, streaming: bool = False) -> Tuple[Any, Any]:
+        """
+        Chaîne découpée en (construction du prompt, appel du modèle + parsing)
+
+        Permet de chronométrer séparément les deux étapes. create_sql_query_chain
+        enchaîne assign, filtre, prompt, llm, parser (et strip hors streaming).
+        """
+        key = (self._make_key(llm, db), streaming)
+        stages = self._stages.get(key)
+        if stages is not None:
+            return stages
+
+        from langchain_core.runnables import RunnablePassthrough, RunnableSequence
+        chain = self.get_streaming_chain(llm, db) if streaming else self.get_chain(llm, db)
+        steps = getattr(chain, "steps", None)
+        if isinstance(chain, RunnableSequence) and steps and len(steps) >= 5:
+            stages = (RunnableSequence(*steps[:3]), RunnableSequence(*steps[3:]))
+        else:
+            stages = (RunnablePassthrough(), chain)
+        with self._lock:
+            return self._stages.setdefault(key, stages)
+
+    def clear(self):
+        """Vide le registre (ex: après un changement de schéma)"""
+        with self._lock:
+            self._chains.clear()
+            self._streaming_chains.clear()
+            self._stages.clear()
+
+# Instance globale
+chain_registry = ChainRegistry()
@@ -0,0 +1,193 @@
+"""
+Exécution des requêtes générées avec curseur serveur et pagination paresseuse
+"""
+import re
+import threading
+import time
+import weakref
+from typing import Any, Callable, List, Optional
+from sqlalchemy import text
+from domain.sql.result_cache import cache_result, get_cached_result, row_size
+from domain.sql.validation import SIDE_EFFECT_FUNCTIONS, load_sqlglot, read_only_error
+from infrastructure.resilience import get_breaker
+from infrastructure.settings import settings
+from infrastructure.tracing import span
+from infrastructure.logging import logger
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_WORD_RE = re.compile(r"[A-Za-z_][\w$]*")
+READ_ONLY_KEYWORDS = ("select", "with")
+
+# Flux ouverts, pour fermer ceux abandonnés par une session
+_open_streams: "weakref.WeakSet[QueryResultStream]" = weakref.WeakSet()
+_streams_lock = threading.Lock()
+
+class QueryExecutionError(Exception):
+    """Requête refusée ou échec d'exécution"""
+
+def is_read_only(sql: str) -> bool:
+    """
+    Vérifie qu'il s'agit d'une seule instruction de lecture (SELECT / WITH)
+
+    Analyse sqlglot (dialecte Redshift) : SELECT ... INTO, CTE modifiant des
+    données et fonctions à effet de bord sont refusés ; une requête que
+    sqlglot ne sait pas analyser l'est aussi. Sans sqlglot, repli sur les mots-clés.
+    """
+    stripped = _STRING_RE.sub("''", _COMMENT_RE.sub(" ", sql)).strip().rstrip(";").strip()
+    if not stripped or ";" in stripped:
+        return False
+    if stripped.split(None, 1)[0].lower() not in READ_ONLY_KEYWORDS:
+        return False
+
+    sqlglot = load_sqlglot()
+    if sqlglot is None:
+        words = {word.lower() for word in _WORD_RE.findall(stripped)}
+        return "into" not in words and not words & SIDE_EFFECT_FUNCTIONS
+    try:
+        statements = [s for s in sqlglot.parse(sql, read="redshift") if s is not None]
+    except sqlglot.errors.SqlglotError:
+        return False
+    return len(statements) == 1 and read_only_error(statements[0]) is None
+
+class QueryResultStream:
+    """Résultat d'une requête lu page par page via un curseur serveur, avec plafonds"""
+
+    def __init__(self, sql: str, engine, page_size: int = None,
+                 max_rows: int = None, max_bytes: int = None,
+                 on_complete: Callable[[str, List[str], List[tuple]], Any] = None,
+                 collect_bytes: int = 0):
+        self.sql = sql
+        self.page_size = page_size or settings.query_page_size
+        self.max_rows = max_rows or settings.query_max_rows
+        self.max_bytes = max_bytes or settings.query_max_bytes
+        self.rows_fetched = 0
+        self.bytes_fetched = 0
+        self.exhausted = False
+        self.truncated = False
+        self.last_access = time.monotonic()
+        self._lock = threading.Lock()
+        # Lignes conservées pour on_complete tant qu'elles tiennent dans collect_bytes
+        self._on_complete = on_complete
+        self._collect_bytes = collect_bytes
+        self._collected: Optional[List[tuple]] = [] if on_complete else None
+
+        # Checkout et exécution protégés par le disjoncteur de la base
+        with get_breaker("database").call():
+            self._conn = engine.connect()
+            if engine.dialect.name in ("postgresql", "redshift"):
+                # Transaction en lecture seule (BEGIN READ ONLY) : défense en profondeur
+                self._conn = self._conn.execution_options(postgresql_readonly=True)
+            try:
+                # stream_results => curseur nommé côté serveur (psycopg2), pas de chargement complet
+                self._result = self._conn.execution_options(
+                    stream_results=True,
+                    max_row_buffer=self.page_size
+                ).execute(text(sql))
+                self.columns: List[str] = list(self._result.keys())
+            except Exception:
+                self._conn.close()
+                raise
+
+    @property
+    def closed(self) -> bool:
+        return self._conn is None
+
+    def fetch_page(self) -> List[tuple]:
+        """Lit la page suivante ; ferme le curseur une fois la fin ou un plafond atteint"""
+        with self._lock:
+            self.last_access = time.monotonic()
+            if self.closed:
+                return []
+
+            budget = min(self.page_size, self.max_rows - self.rows_fetched)
+            rows = [tuple(row) for row in self._result.fetchmany(budget)] if budget > 0 else []
+
+            page = []
+            for row in rows:
+                size = row_size(row)
+                if self.bytes_fetched + size > self.max_bytes:
+                    self.truncated = True
+                    break
+                page.append(row)
+                self.bytes_fetched += size
+            self.rows_fetched += len(page)
+            if self._collected is not None:
+                if self.bytes_fetched <= self._collect_bytes:
+                    self._collected.extend(page)
+                else:
+                    self._collected = None
+
+            if len(rows) < budget:
+                self.exhausted = True
+            elif self.rows_fetched >= self.max_rows:
+                self.truncated = True
+
+            if self.exhausted or self.truncated:
+                self._close()
+                if self.exhausted and not self.truncated and self._collected is not None:
+                    self._complete()
+            return page
+
+    def _complete(self):
+        """Transmet le résultat complet à on_complete (ex: mise en cache)"""
+        rows, self._collected = self._collected, None
+        try:
+            self._on_complete(self.sql, self.columns, rows)
+        except Exception as e:
+            logger.warning("Query completion callback failed", error=str(e))
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._result.close()
+                self._conn.close()
+            finally:
+                self._conn = None
+                logger.info("Query stream closed",
+                            rows=self.rows_fetched,
+                            bytes=self.bytes_fetched,
+                            truncated=self.truncated)
+
+    def close(self):
+        """Libère le curseur et rend la connexion au pool"""
+        with self._lock:
+            self._close()
+
+def close_idle_streams(max_idle: float = None) -> int:
+    """Ferme les flux non consultés depuis max_idle secondes"""
+    max_idle = max_idle if max_idle is not None else settings.query_stream_idle_timeout
+    now = time.monotonic()
+    with _streams_lock:
+        idle = [s for s in _open_streams if not s.closed and now - s.last_access > max_idle]
+    for stream in idle:
+        stream.close()
+    return len(idle)
+
+def execute_query_stream(sql: str, page_size: int = None, max_rows: int = None,
+                         max_bytes: int = None, engine=None, use_cache: bool = True):
+    """Ouvre un flux paginé sur le résultat d'une requête de lecture (cache d'abord)"""
+    if not is_read_only(sql):
+        raise QueryExecutionError("Only single SELECT/WITH statements can be executed")
+
+    if use_cache:
+        cached = get_cached_result(sql, page_size, max_rows, max_bytes)
+        if cached is not None:
+            return cached
+
+    if engine is None:
+        from infrastructure.database import db_manager
+        engine = db_manager.get_engine()
+
+    close_idle_streams()
+    logger.info("Executing query", page_size=page_size or settings.query_page_size)
+    # Exécution côté serveur jusqu'à disponibilité du curseur
+    with span("execution"):
+        stream = QueryResultStream(
+            sql, engine, page_size, max_rows, max_bytes,
+            on_complete=cache_result if use_cache and settings.result_cache_enabled else None,
+            collect_bytes=settings.result_cache_max_entry_bytes
+        )
+    with _streams_lock:
+        _open_streams.add(stream)
+    return stream
@@ -0,0 +1,171 @@
+"""
+Cache question -> SQL devant la génération LLM (exact + similarité n-grammes)
+"""
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, deque
+from typing import Deque, Dict, FrozenSet, Optional, Set, Tuple
+from infrastructure.cache import cache_manager
+from infrastructure.database import get_schema_fingerprint
+from infrastructure.llm import get_llm_config_key
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+
+NGRAM_SIZE = 3
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+
+# Mots sans incidence sur le SQL ; négations et entités n'y figurent jamais
+_STOPWORDS = frozenset("""
+a an the of to in on for by with me my please show give list display get find what which
+is are was were be been do does did i we you our your can could would
+le la les l un une des du de d au aux en dans pour par sur avec moi mon ma mes
+s il elle nous vous qui que quel quelle quels quelles est sont était affiche afficher
+montre montrer donne donner liste lister trouve trouver plait plaît stp svp
+""".split())
+
+def normalize_question(question: str) -> str:
+    """Normalise une question (NFKC, casse, ponctuation, espaces) pour la comparaison"""
+    text = unicodedata.normalize("NFKC", question).casefold()
+    # Conserve lettres (dont CJK), chiffres et espaces ; le reste devient séparateur
+    text = "".join(
+        ch if unicodedata.category(ch)[0] in ("L", "N") else " "
+        for ch in text
+    )
+    return " ".join(text.split())
+
+def _content_words(text: str) -> FrozenSet[str]:
+    """Mots significatifs d'une question normalisée (hors mots vides)"""
+    return frozenset(word for word in text.split() if word not in _STOPWORDS)
+
+def _char_ngrams(text: str, n: int = NGRAM_SIZE) -> Counter:
+    """Vecteur de n-grammes de caractères (fonctionne aussi sans espaces, ex: japonais)"""
+    padded = f" {text} "
+    if len(padded) <= n:
+        return Counter([padded])
+    return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+class NgramIndex:
+    """Index de similarité cosinus sur n-grammes de caractères, borné en taille"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: Deque[Tuple[str, Counter, float, Tuple[str, ...], FrozenSet[str]]] = deque()
+        self._known: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def add(self, text: str):
+        """Ajoute une question normalisée à l'index (FIFO au-delà de max_entries)"""
+        with self._lock:
+            if text in self._known:
+                return
+            vector = _char_ngrams(text)
+            norm = math.sqrt(sum(c * c for c in vector.values()))
+            numbers = tuple(_NUMBER_RE.findall(text))
+            self._entries.append((text, vector, norm, numbers, _content_words(text)))
+            self._known.add(text)
+            while len(self._entries) > self.max_entries:
+                old_text = self._entries.popleft()[0]
+                self._known.discard(old_text)
+
+    def best_match(self, text: str, threshold: float) -> Optional[Tuple[str, float]]:
+        """Retourne la question indexée la plus proche au-dessus du seuil"""
+        vector = _char_ngrams(text)
+        norm = math.sqrt(sum(c * c for c in vector.values()))
+        numbers = tuple(_NUMBER_RE.findall(text))
+        words = _content_words(text)
+        if norm == 0:
+            return None
+
+        best: Optional[Tuple[str, float]] = None
+        with self._lock:
+            entries = list(self._entries)
+        for other_text, other_vector, other_norm, other_numbers, other_words in entries:
+            # "top 10" et "top 5" sont très proches en n-grammes mais pas en SQL ;
+            # de même "shipped" / "not shipped", "active" / "inactive" : seuls
+            # l'ordre des mots et les mots vides peuvent différer
+            if numbers != other_numbers or words != other_words:
+                continue
+            dot = sum(c * other_vector.get(g, 0) for g, c in vector.items())
+            score = dot / (norm * other_norm)
+            if score >= threshold and (best is None or score > best[1]):
+                best = (other_text, score)
+        return best
+
+    def clear(self):
+        """Vide l'index"""
+        with self._lock:
+            self._entries.clear()
+            self._known.clear()
+
+class GenerationCache:
+    """Cache des requêtes SQL générées, indexé par question normalisée, schéma et config LLM"""
+
+    def __init__(self):
+        self._indexes: Dict[str, NgramIndex] = {}
+        self._lock = threading.Lock()
+
+    def _namespace(self, llm, db) -> str:
+        """Espace de clés : empreinte du schéma + configuration du LLM"""
+        model, temperature, max_tokens = get_llm_config_key(llm)
+        return f"{get_schema_fingerprint(db)}|{model}|{temperature}|{max_tokens}"
+
+    def _index(self, namespace: str) -> NgramIndex:
+        index = self._indexes.get(namespace)
+        if index is None:
+            with self._lock:
+                index = self._indexes.setdefault(
+                    namespace, NgramIndex(settings.semantic_cache_max_entries)
+                )
+        return index
+
+    def key(self, question: str, llm, db) -> str:
+        """Clé d'une génération : schéma + configuration LLM + question normalisée"""
+        return f"{self._namespace(llm, db)}|{normalize_question(question)}"
+
+    def lookup(self, question: str, llm, db) -> Optional[str]:
+        """Cherche une requête déjà générée pour cette question (ou une quasi-identique)"""
+        if not settings.generation_cache_enabled:
+            return None
+
+        namespace = self._namespace(llm, db)
+        normalized = normalize_question(question)
+        sql = cache_manager.get_cached_generated_sql(f"{namespace}|{normalized}")
+        if sql is not None:
+            logger.info("Generation cache hit", tier="exact")
+            return sql
+
+        if not settings.semantic_cache_enabled:
+            return None
+
+        match = self._index(namespace).best_match(
+            normalized, settings.semantic_cache_threshold
+        )
+        if match is not None:
+            sql = cache_manager.get_cached_generated_sql(f"{namespace}|{match[0]}")
+            if sql is not None:
+                logger.info("Generation cache hit", tier="similar",
+                            similarity=round(match[1], 3))
+                return sql
+        return None
+
+    def store(self, question: str, llm, db, sql: str) -> bool:
+        """Mémorise la requête générée pour cette question"""
+        if not settings.generation_cache_enabled or not sql:
+            return False
+
+        namespace = self._namespace(llm, db)
+        normalized = normalize_question(question)
+        stored = cache_manager.cache_generated_sql(f"{namespace}|{normalized}", sql)
+        if settings.semantic_cache_enabled:
+            self._index(namespace).add(normalized)
+        return stored
+
+    def clear(self):
+        """Oublie les index de similarité (les entrées expirent avec le cache)"""
+        with self._lock:
+            self._indexes.clear()
+
+# Instance globale
+generation_cache = GenerationCache()
@@ -0,0 +1,201 @@
+"""
+Service de génération asynchrone : boucle asyncio partagée, suivi par request_id,
+timeouts et annulation
+"""
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+from domain.sql.service import astream_sql_query
+from infrastructure.lazy import LazyProxy
+from infrastructure.rate_limit import ANONYMOUS, RateLimitExceeded, current_user
+from infrastructure.resilience import CircuitOpenError
+from infrastructure.settings import settings
+from infrastructure.tracing import new_trace
+from infrastructure.logging import logger
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "error"
+CANCELLED = "cancelled"
+TIMEOUT = "timeout"
+RATE_LIMITED = "rate_limited"
+UNAVAILABLE = "unavailable"
+FINAL_STATES = (DONE, FAILED, CANCELLED, TIMEOUT, RATE_LIMITED, UNAVAILABLE)
+
+class GenerationJob:
+    """État d'une demande de génération, consultable par polling"""
+
+    def __init__(self, question: str, timeout: float, user_id: str = ANONYMOUS,
+                 language: str = None, llm_config: Optional[Dict[str, Any]] = None):
+        self.request_id = uuid.uuid4().hex
+        self.question = question
+        self.timeout = timeout
+        self.user_id = user_id
+        self.language = language
+        # Paramètres du LLM choisis par la session (temperature, max_tokens)
+        self.llm_config = llm_config
+        # Délai conseillé avant une nouvelle demande (statuts RATE_LIMITED, UNAVAILABLE)
+        self.retry_after: Optional[float] = None
+        self.status = PENDING
+        self.sql: Optional[str] = None
+        # SQL partiel reçu en streaming, affiché pendant la génération
+        self.partial_sql = ""
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._future: Optional[Future] = None
+        # cancel() (thread de la session) et la boucle de génération se disputent l'état final
+        self._state_lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINAL_STATES
+
+    def _start(self) -> bool:
+        """Passe en RUNNING ; False si la demande est déjà terminée (annulée)"""
+        with self._state_lock:
+            if self.finished:
+                return False
+            self.status = RUNNING
+            return True
+
+    def _finish(self, status: str, sql: str = None, error: str = None) -> bool:
+        """Fixe l'état final, une seule fois ; False si la demande était déjà terminée"""
+        with self._state_lock:
+            if self.finished:
+                return False
+            self.status = status
+            self.sql = sql
+            self.error = error
+            self.finished_at = time.time()
+            return True
+
+class GenerationService:
+    """Exécute les générations sur une boucle d'événements partagée par toutes les sessions"""
+
+    def __init__(self, max_concurrency: int = None):
+        self.max_concurrency = max_concurrency or settings.generation_max_concurrency
+        self._jobs: Dict[str, GenerationJob] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Démarre la boucle asyncio dans un thread dédié au premier usage"""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                    ready.set()
+                    loop.run_forever()
+
+                threading.Thread(target=run, name="generation-loop", daemon=True).start()
+                ready.wait()
+                self._loop = loop
+                logger.info("Generation event loop started", max_concurrency=self.max_concurrency)
+            return self._loop
+
+    async def _run(self, job: GenerationJob, llm, db):
+        async with self._semaphore:
+            if not job._start():  # annulée pendant l'attente
+                return
+            current_user.set(job.user_id)
+            new_trace(language=job.language)
+            try:
+                if llm is None:
+                    from infrastructure.llm import llm_provider
+                    llm = llm_provider.from_config(job.llm_config)
+                if db is None:
+                    from infrastructure.database import connect_to_redshift
+                    db = await asyncio.to_thread(connect_to_redshift)
+
+                async def consume():
+                    async for partial in astream_sql_query(job.question, llm, db):
+                        job.partial_sql = partial
+                    return job.partial_sql
+
+                sql = await asyncio.wait_for(consume(), timeout=job.timeout)
+                job._finish(DONE, sql=sql)
+            except asyncio.TimeoutError:
+                logger.warning("SQL generation timed out", request_id=job.request_id,
+                               timeout=job.timeout)
+                job._finish(TIMEOUT, error="timeout")
+            except asyncio.CancelledError:
+                job._finish(CANCELLED)
+                raise
+            except RateLimitExceeded as e:
+                job.retry_after = e.retry_after
+                job._finish(RATE_LIMITED, error=str(e))
+            except CircuitOpenError as e:
+                job.retry_after = e.retry_after
+                job._finish(UNAVAILABLE, error=str(e))
+            except Exception as e:
+                logger.error("SQL generation failed", request_id=job.request_id, error=str(e))
+                job._finish(FAILED, error=str(e))
+
+    def submit(self, question: str, llm=None, db=None, timeout: float = None,
+               user_id: str = ANONYMOUS, language: str = None,
+               llm_config: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Planifie une génération et retourne immédiatement son request_id
+
+        Sans llm explicite, le client est choisi selon llm_config.
+        """
+        self._purge_finished()
+        job = GenerationJob(question, timeout or settings.generation_timeout, user_id, language,
+                            llm_config)
+        with self._lock:
+            self._jobs[job.request_id] = job
+        job._future = asyncio.run_coroutine_threadsafe(self._run(job, llm, db), self._ensure_loop())
+        logger.info("SQL generation submitted", request_id=job.request_id)
+        return job.request_id
+
+    def get(self, request_id: str) -> Optional[GenerationJob]:
+        """Retourne l'état d'une demande (None si inconnue ou purgée)"""
+        return self._jobs.get(request_id)
+
+    def cancel(self, request_id: str) -> bool:
+        """Annule une demande en attente ou en cours"""
+        job = self._jobs.get(request_id)
+        if job is None or not job._finish(CANCELLED):
+            return False
+        if job._future is not None:
+            job._future.cancel()
+        logger.info("SQL generation cancelled", request_id=request_id)
+        return True
+
+    def wait(self, request_id: str, timeout: float = None) -> Optional[GenerationJob]:
+        """Attend la fin d'une demande (usage hors UI : API, batch)"""
+        job = self._jobs.get(request_id)
+        if job is not None and job._future is not None:
+            try:
+                job._future.result(timeout)
+            except Exception:
+                pass
+        return job
+
+    def _purge_finished(self):
+        """Oublie les demandes terminées depuis plus de generation_job_ttl"""
+        cutoff = time.time() - settings.generation_job_ttl
+        with self._lock:
+            for request_id in [rid for rid, job in self._jobs.items()
+                               if job.finished and job.finished_at < cutoff]:
+                del self._jobs[request_id]
+
+    def stats(self) -> Dict[str, int]:
+        """Nombre de demandes par état"""
+        counts: Dict[str, int] = {}
+        for job in list(self._jobs.values()):
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+# Instance globale
+generation_service = LazyProxy(GenerationService, "generation_service")
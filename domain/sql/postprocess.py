@@ -0,0 +1,77 @@
+"""
+Post-traitement de la sortie du LLM : nettoyage et détection de fin d'instruction
+
+La validation (syntaxe, tables, colonnes) est faite par domain.sql.validation.
+"""
+import re
+from typing import Optional
+
+_FENCE_RE = re.compile(r"```[a-zA-Z]*\s*")
+_LABEL_RE = re.compile(r"^\s*SQL\s*Query\s*:\s*", re.IGNORECASE)
+_READ_STATEMENT_RE = re.compile(r"^(?:\s|\(|--[^\n]*\n|/\*.*?\*/)*(?:SELECT|WITH)\b",
+                                re.IGNORECASE | re.DOTALL)
+_STATEMENT_LINE_RE = re.compile(r"^[ \t]*(?:SELECT|WITH)\b", re.IGNORECASE | re.MULTILINE)
+
+def find_statement_end(text: str) -> Optional[int]:
+    """
+    Position juste après le premier ';' hors chaînes, identifiants quotés et commentaires
+
+    Retourne None tant que l'instruction n'est pas terminée.
+    """
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch in ("'", '"'):
+            # Chaîne ou identifiant quoté ('' et "" échappent le délimiteur)
+            j = i + 1
+            while j < n:
+                if text[j] == ch:
+                    if j + 1 < n and text[j + 1] == ch:
+                        j += 2
+                        continue
+                    break
+                j += 1
+            if j >= n:
+                return None
+            i = j + 1
+        elif text.startswith("--", i):
+            newline = text.find("\n", i)
+            if newline == -1:
+                return None
+            i = newline + 1
+        elif text.startswith("/*", i):
+            close = text.find("*/", i + 2)
+            if close == -1:
+                return None
+            i = close + 2
+        elif ch == ";":
+            return i + 1
+        else:
+            i += 1
+    return None
+
+def strip_markdown(text: str) -> str:
+    """Retire les balises ```sql et le libellé « SQLQuery: » éventuels"""
+    return _LABEL_RE.sub("", _FENCE_RE.sub("", text)).strip()
+
+def strip_prose(text: str) -> str:
+    """Retire le texte explicatif qui précède l'instruction (« Voici la requête : »...)"""
+    if looks_like_sql(text):
+        return text
+    match = _STATEMENT_LINE_RE.search(text)
+    return text[match.start():].strip() if match else text
+
+def clean_sql_output(text: str) -> str:
+    """
+    Instruction SQL finale : sans markdown ni prose d'introduction, coupée
+    après la première instruction complète
+    """
+    sql = strip_prose(strip_markdown(text or ""))
+    end = find_statement_end(sql)
+    if end is not None:
+        sql = sql[:end]
+    return sql.strip()
+
+def looks_like_sql(sql: str) -> bool:
+    """Sortie exploitable : une instruction de lecture (SELECT / WITH), pas de la prose"""
+    return bool(sql) and _READ_STATEMENT_RE.match(sql) is not None
@@ -0,0 +1,198 @@
+"""
+Cache des résultats de requêtes, stockés en format colonne compact (Arrow IPC)
+"""
+import io
+import pickle
+import re
+import sys
+import zlib
+from typing import Any, List, Optional, Sequence, Set, Tuple
+from infrastructure.cache import cache_manager
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+
+try:
+    import pyarrow as pa
+except ImportError:  # Dépendance optionnelle (installée avec streamlit)
+    pa = None
+
+# Littéraux et identifiants quotés, commentaires, nombres, mots et reste
+_TOKEN_RE = re.compile(
+    r"(?P<string>'(?:[^']|'')*')"
+    r"|(?P<quoted>\"(?:[^\"]|\"\")*\")"
+    r"|(?P<comment>--[^\n]*|/\*.*?\*/)"
+    r"|(?P<number>\b\d+(?:\.\d*)?(?:[eE][+-]?\d+)?\b)"
+    r"|(?P<word>[A-Za-z_][\w$]*)"
+    r"|(?P<space>\s+)"
+    r"|(?P<other>.)",
+    re.DOTALL,
+)
+_TABLE_RE = re.compile(
+    r"\b(?:from|join)\s+((?:\"[^\"]+\"|[\w$]+)(?:\.(?:\"[^\"]+\"|[\w$]+))?)",
+    re.IGNORECASE,
+)
+_CTE_RE = re.compile(r"(?:\bwith|,)\s*([\w$]+)\s+as\s*\(", re.IGNORECASE)
+_TIGHT_PUNCTUATION = set("(),.;=<>!+-*/%|")
+
+_FORMAT_ARROW = b"A"
+_FORMAT_PICKLE = b"P"
+
+def _normalize_number(token: str) -> str:
+    """1.50 -> 1.5, 007 -> 7 ; conserve la distinction entier / décimal"""
+    if "e" in token.lower():
+        return token.lower()
+    if "." in token:
+        integer, _, fraction = token.partition(".")
+        fraction = fraction.rstrip("0") or "0"
+        return f"{int(integer or '0')}.{fraction}"
+    return str(int(token))
+
+def canonicalize_sql(sql: str) -> str:
+    """
+    Forme canonique d'une requête pour la clé de cache
+
+    Supprime les commentaires, normalise espaces, casse (hors littéraux et
+    identifiants quotés) et écriture des nombres, retire le ';' final.
+    """
+    parts: List[str] = []
+    pending_space = False
+    for match in _TOKEN_RE.finditer(sql):
+        kind, token = match.lastgroup, match.group()
+        if kind in ("space", "comment"):
+            pending_space = True
+            continue
+        if kind == "word":
+            token = token.lower()
+        elif kind == "number":
+            token = _normalize_number(token)
+
+        tight = token in _TIGHT_PUNCTUATION or (parts and parts[-1] in _TIGHT_PUNCTUATION)
+        if parts and pending_space and not tight:
+            parts.append(" ")
+        parts.append(token)
+        pending_space = False
+
+    while parts and parts[-1] in (";", " "):
+        parts.pop()
+    return "".join(parts)
+
+def referenced_tables(sql: str) -> Set[str]:
+    """Tables lues par la requête (noms sans schéma, en minuscules, hors CTE)"""
+    ctes = {name.lower() for name in _CTE_RE.findall(sql)}
+    tables = set()
+    for name in _TABLE_RE.findall(sql):
+        table = name.split(".")[-1].strip('"').lower()
+        if table not in ctes:
+            tables.add(table)
+    return tables
+
+def ttl_for_query(sql: str) -> int:
+    """TTL selon la fraîcheur des tables lues : le plus court des TTL configurés"""
+    table_ttls = {k.lower(): v for k, v in settings.result_cache_table_ttls.items()}
+    ttls = [table_ttls[t] for t in referenced_tables(sql) if t in table_ttls]
+    return min(ttls) if ttls else settings.result_cache_ttl
+
+def encode_result(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> bytes:
+    """Encode un résultat en colonnes : Arrow IPC compressé, sinon colonnes picklées"""
+    column_values = [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+    if pa is not None:
+        try:
+            table = pa.Table.from_arrays(
+                [pa.array(values) for values in column_values],
+                names=list(columns)
+            )
+            sink = io.BytesIO()
+            options = pa.ipc.IpcWriteOptions(compression="zstd")
+            with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+            return _FORMAT_ARROW + sink.getvalue()
+        except (pa.ArrowException, TypeError, ValueError):
+            # Types hétérogènes dans une colonne : repli sur le format picklé
+            pass
+    payload = pickle.dumps((list(columns), column_values), protocol=pickle.HIGHEST_PROTOCOL)
+    return _FORMAT_PICKLE + zlib.compress(payload, 3)
+
+def decode_result(data: bytes) -> Tuple[List[str], List[List[Any]]]:
+    """Décode un résultat en (colonnes, valeurs par colonne)"""
+    header, payload = data[:1], data[1:]
+    if header == _FORMAT_ARROW:
+        table = pa.ipc.open_stream(payload).read_all()
+        return table.column_names, [column.to_pylist() for column in table.columns]
+    return pickle.loads(zlib.decompress(payload))
+
+def row_size(row: Sequence[Any]) -> int:
+    """Estimation de la taille mémoire d'une ligne"""
+    return sum(sys.getsizeof(value) for value in row)
+
+class CachedResultStream:
+    """
+    Relit un résultat en cache avec la même interface que QueryResultStream,
+    y compris les plafonds max_rows / max_bytes de l'appelant
+    """
+
+    def __init__(self, sql: str, columns: List[str], column_values: List[List[Any]],
+                 page_size: int = None, max_rows: int = None, max_bytes: int = None):
+        self.sql = sql
+        self.columns = columns
+        self.page_size = page_size or settings.query_page_size
+        self.max_rows = max_rows or settings.query_max_rows
+        self.max_bytes = max_bytes or settings.query_max_bytes
+        self._values = column_values
+        self._total = len(column_values[0]) if column_values else 0
+        self.rows_fetched = 0
+        self.bytes_fetched = 0
+        self.truncated = False
+        self._closed = self._total == 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.rows_fetched >= self._total
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def fetch_page(self) -> List[tuple]:
+        if self._closed:
+            return []
+        budget = min(self.page_size, self.max_rows - self.rows_fetched)
+        start, end = self.rows_fetched, min(self.rows_fetched + budget, self._total)
+        page = []
+        for row in zip(*(values[start:end] for values in self._values)):
+            size = row_size(row)
+            if self.bytes_fetched + size > self.max_bytes:
+                self.truncated = True
+                break
+            page.append(row)
+            self.bytes_fetched += size
+        self.rows_fetched += len(page)
+        if not self.exhausted and self.rows_fetched >= self.max_rows:
+            self.truncated = True
+        if self.exhausted or self.truncated:
+            self._closed = True
+        return page
+
+    def close(self):
+        self._closed = True
+
+def get_cached_result(sql: str, page_size: int = None, max_rows: int = None,
+                      max_bytes: int = None) -> Optional[CachedResultStream]:
+    """Retourne un flux sur le résultat en cache de la requête, s'il existe"""
+    if not settings.result_cache_enabled:
+        return None
+    data = cache_manager.get_cached_sql_result(canonicalize_sql(sql))
+    if data is None:
+        return None
+    columns, column_values = decode_result(data)
+    logger.info("Query result cache hit", rows=len(column_values[0]) if column_values else 0)
+    return CachedResultStream(sql, columns, column_values, page_size, max_rows, max_bytes)
+
+def cache_result(sql: str, columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> bool:
+    """Met en cache un résultat complet s'il respecte la taille maximale par entrée"""
+    if not settings.result_cache_enabled:
+        return False
+    data = encode_result(columns, rows)
+    if len(data) > settings.result_cache_max_entry_bytes:
+        logger.info("Query result too large to cache", bytes=len(data))
+        return False
+    return cache_manager.cache_sql_result(canonicalize_sql(sql), data, ttl=ttl_for_query(sql))
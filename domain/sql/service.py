@@ -1,19 +1,312 @@
+import asyncio
 import datetime
-from langchain.chains import create_sql_query_chain
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from domain.sql.chain_registry import chain_registry
+from domain.sql.generation_cache import generation_cache
+from domain.sql.postprocess import clean_sql_output, find_statement_end, strip_markdown
+from domain.sql.table_selector import table_selector
+from domain.sql.validation import get_catalog, repair_prompt, validate_sql
+from infrastructure.llm import get_llm_config_key, llm_provider
+from infrastructure.monitoring import metrics
+from infrastructure.rate_limit import rate_limiter
+from infrastructure.resilience import acall_llm, call_llm, get_breaker
+from infrastructure.singleflight import AsyncSingleFlight, SingleFlight
 from infrastructure.settings import settings
+from infrastructure.tracing import record_stage, set_trace_tags, span
 from infrastructure.logging import logger
 
+# Générations identiques en vol (même question normalisée, schéma et config LLM)
+_flight = SingleFlight()
+_async_flight = AsyncSingleFlight()
+
+class _PartialSQL:
+    """SQL partiel d'une génération en streaming, partagé avec les demandes identiques"""
+
+    def __init__(self):
+        self.text = ""
+        self.version = 0
+        self.finished = False
+        self._changed = asyncio.Event()
+
+    def publish(self, text: str):
+        self.text = text
+        self.version += 1
+        self._notify()
+
+    def finish(self):
+        self.finished = True
+        self._notify()
+
+    def _notify(self):
+        # Un événement par version : les lecteurs en attente sont tous réveillés
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self, seen: int):
+        """Attend une version plus récente que seen, ou la fin de la génération"""
+        while self.version == seen and not self.finished:
+            await self._changed.wait()
+
+def _build_inputs(question: str, db) -> Dict[str, Any]:
+    """Entrées de la chaîne : question + tables pertinentes"""
+    inputs = {"question": question}
+
+    # Seules les tables pertinentes sont décrites dans le prompt
+    with span("table_selection"):
+        table_names = table_selector.select(question, db)
+    if table_names:
+        inputs["table_names_to_use"] = table_names
+    return inputs
+
+def _build_prompt(prompt_stage, inputs: Dict[str, Any]):
+    """Formate le prompt (descriptions des tables comprises)"""
+    with span("prompt_build"):
+        return prompt_stage.invoke(inputs)
+
+def _call_model(llm, db, prompt) -> str:
+    """Appel non streamé au modèle et nettoyage de la sortie"""
+    _, model_stage = chain_registry.get_chain_stages(llm, db)
+    with span("llm_call"):
+        output = call_llm(lambda: model_stage.invoke(prompt))
+    with span("postprocess"):
+        return clean_sql_output(output)
+
+async def _acall_model(llm, db, prompt) -> str:
+    """Version asynchrone de _call_model (hedging possible)"""
+    _, model_stage = chain_registry.get_chain_stages(llm, db)
+    with span("llm_call"):
+        output = await acall_llm(lambda: model_stage.ainvoke(prompt),
+                                 model=get_llm_config_key(llm)[0])
+    with span("postprocess"):
+        return clean_sql_output(output)
+
+def _validate(sql: str, db) -> Optional[str]:
+    """Erreur de validation locale (None si le SQL est valide)"""
+    with span("sql_validation"):
+        return validate_sql(sql, get_catalog(db))
+
+def _repair_plan(llm) -> List[Any]:
+    """Modèles sollicités pour corriger une sortie invalide : même modèle, puis niveau supérieur"""
+    plan = [llm] * settings.sql_repair_attempts
+    fallback = llm_provider.fallback_for(llm)
+    if fallback is not None:
+        plan.append(fallback)
+    return plan
+
+def _log_repair(llm, repair_llm, error: str):
+    model = get_llm_config_key(repair_llm)[0]
+    if repair_llm is not llm:
+        set_trace_tags(model=model)
+    logger.warning("Invalid SQL output, re-prompting with the error", model=model, error=error)
+
+def _validated(llm, db, prompt, sql: str) -> str:
+    """Valide le SQL ; s'il est invalide, re-prompt avec l'erreur (même modèle puis modèle de repli)"""
+    error = _validate(sql, db)
+    for repair_llm in (_repair_plan(llm) if error else ()):
+        _log_repair(llm, repair_llm, error)
+        rate_limiter.acquire()
+        sql = _call_model(repair_llm, db, repair_prompt(prompt, sql, error))
+        error = _validate(sql, db)
+        if error is None:
+            break
+    if error is not None:
+        logger.warning("Generated SQL failed validation", error=error)
+    return sql
+
+async def _avalidated(llm, db, prompt, sql: str) -> str:
+    """Version asynchrone de _validated"""
+    error = await asyncio.to_thread(_validate, sql, db)
+    for repair_llm in (_repair_plan(llm) if error else ()):
+        _log_repair(llm, repair_llm, error)
+        await rate_limiter.acquire_async()
+        sql = await _acall_model(repair_llm, db, repair_prompt(prompt, sql, error))
+        error = await asyncio.to_thread(_validate, sql, db)
+        if error is None:
+            break
+    if error is not None:
+        logger.warning("Generated SQL failed validation", error=error)
+    return sql
+
+def _log_generated(sql: str):
+    """Succès loggé en INFO sans le texte SQL (DEBUG uniquement)"""
+    logger.info("SQL generation successful", sql_chars=len(sql))
+    logger.debug("Generated SQL", sql=sql)
+
+def generate_sql(question: str, llm, db) -> str:
+    """Génère une requête SQL ; les erreurs du LLM sont propagées (usage batch/API)"""
+    set_trace_tags(model=get_llm_config_key(llm)[0])
+    cached_sql = generation_cache.lookup(question, llm, db)
+    if cached_sql is not None:
+        return cached_sql
+    
+    def invoke() -> str:
+        # Seuls les appels effectifs au LLM consomment le quota
+        rate_limiter.acquire()
+        prompt_stage, _ = chain_registry.get_chain_stages(llm, db)
+        prompt = _build_prompt(prompt_stage, _build_inputs(question, db))
+        sql = _validated(llm, db, prompt, _call_model(llm, db, prompt))
+        
+        _log_generated(sql)
+        metrics.record_sql_generation()
+        generation_cache.store(question, llm, db, sql)
+        return sql
+    
+    # Les demandes identiques concurrentes partagent un seul appel au LLM
+    return _flight.do(generation_cache.key(question, llm, db), invoke)
+
 def generate_sql_query_only(question: str, llm, db):
     """Génère une requête SQL à partir d'une question en langage naturel"""
-    logger.info("Starting SQL generation", question=question)
+    logger.info("Starting SQL generation", question_chars=len(question))
+    logger.debug("SQL generation question", question=question)
     
     try:
-        chain = create_sql_query_chain(llm, db)
-        sql = chain.invoke({"question": question})
-        
-        logger.info("SQL generation successful", sql=sql)
-        return sql
+        return generate_sql(question, llm, db)
 
     except Exception as e:
         logger.error("SQL generation failed", error=str(e), question=question)
         return None
+
+async def agenerate_sql_query_only(question: str, llm, db, use_cache: bool = True) -> Optional[str]:
+    """
+    Version asynchrone de generate_sql_query_only (chain.ainvoke)
+
+    Contrairement à la version synchrone, les erreurs (y compris l'annulation)
+    sont propagées pour que l'appelant puisse les distinguer. Avec
+    use_cache=False le cache n'est pas consulté mais reste alimenté.
+    """
+    logger.info("Starting async SQL generation", question_chars=len(question))
+    logger.debug("SQL generation question", question=question)
+    set_trace_tags(model=get_llm_config_key(llm)[0])
+
+    # Étapes locales potentiellement bloquantes (cache L2, index) hors de la boucle
+    if use_cache:
+        cached_sql = await asyncio.to_thread(generation_cache.lookup, question, llm, db)
+        if cached_sql is not None:
+            return cached_sql
+
+    async def ainvoke() -> str:
+        await rate_limiter.acquire_async()
+        prompt_stage, _ = chain_registry.get_chain_stages(llm, db)
+        inputs = await asyncio.to_thread(_build_inputs, question, db)
+        prompt = await asyncio.to_thread(_build_prompt, prompt_stage, inputs)
+        sql = await _avalidated(llm, db, prompt, await _acall_model(llm, db, prompt))
+
+        _log_generated(sql)
+        metrics.record_sql_generation()
+        await asyncio.to_thread(generation_cache.store, question, llm, db, sql)
+        return sql
+
+    key = await asyncio.to_thread(generation_cache.key, question, llm, db)
+    return await _async_flight.do(key, ainvoke)
+
+def stream_sql_query(question: str, llm, db) -> Iterator[str]:
+    """
+    Génère la requête token par token
+
+    Chaque valeur émise est le SQL partiel cumulé ; la dernière est l'instruction
+    finale nettoyée. Le flux est interrompu dès qu'une instruction complète est
+    détectée, ce qui économise les tokens de sortie superflus.
+    """
+    cached_sql = generation_cache.lookup(question, llm, db)
+    if cached_sql is not None:
+        yield cached_sql
+        return
+
+    rate_limiter.acquire()
+    chain = chain_registry.get_streaming_chain(llm, db)
+    buffer = ""
+    inputs = _build_inputs(question, db)
+    # Flux déjà partiellement émis : disjoncteur sans retry
+    with get_breaker("llm").call():
+        stream = chain.stream(inputs)
+        try:
+            for chunk in stream:
+                buffer += chunk
+                partial = strip_markdown(buffer)
+                yield partial
+                if find_statement_end(partial) is not None:
+                    logger.info("Complete statement detected, stream aborted", chars=len(buffer))
+                    break
+        finally:
+            stream.close()
+
+    sql = clean_sql_output(buffer)
+    if _validate(sql, db) is not None:
+        prompt_stage, _ = chain_registry.get_chain_stages(llm, db)
+        sql = _validated(llm, db, _build_prompt(prompt_stage, inputs), sql)
+    _log_generated(sql)
+    metrics.record_sql_generation()
+    generation_cache.store(question, llm, db, sql)
+    yield sql
+
+async def _astream_to(partial_sql: _PartialSQL, question: str, llm, db) -> str:
+    """Consomme le flux du LLM en publiant le SQL partiel ; retourne l'instruction finale"""
+    await rate_limiter.acquire_async()
+    prompt_stage, model_stage = chain_registry.get_chain_stages(llm, db, streaming=True)
+    inputs = await asyncio.to_thread(_build_inputs, question, db)
+    prompt = await asyncio.to_thread(_build_prompt, prompt_stage, inputs)
+    buffer = ""
+    with span("llm_call"), get_breaker("llm").call():
+        start_time = time.perf_counter()
+        stream = model_stage.astream(prompt)
+        try:
+            async for chunk in stream:
+                if not buffer:
+                    record_stage("llm_first_token", (time.perf_counter() - start_time) * 1000)
+                buffer += chunk
+                partial = strip_markdown(buffer)
+                partial_sql.publish(partial)
+                if find_statement_end(partial) is not None:
+                    logger.info("Complete statement detected, stream aborted", chars=len(buffer))
+                    break
+        finally:
+            # Ferme la requête HTTP en cours côté LLM
+            await stream.aclose()
+
+    with span("postprocess"):
+        sql = clean_sql_output(buffer)
+    repaired_sql = await _avalidated(llm, db, prompt, sql)
+    if repaired_sql != sql:
+        sql = repaired_sql
+        partial_sql.publish(sql)
+    _log_generated(sql)
+    metrics.record_sql_generation()
+    await asyncio.to_thread(generation_cache.store, question, llm, db, sql)
+    return sql
+
+async def astream_sql_query(question: str, llm, db) -> AsyncIterator[str]:
+    """
+    Version asynchrone de stream_sql_query (chain.astream)
+
+    Les demandes identiques concurrentes suivent le même flux : un seul appel
+    au LLM, SQL partiel diffusé à chacune.
+    """
+    set_trace_tags(model=get_llm_config_key(llm)[0])
+    cached_sql = await asyncio.to_thread(generation_cache.lookup, question, llm, db)
+    if cached_sql is not None:
+        yield cached_sql
+        return
+
+    key = await asyncio.to_thread(generation_cache.key, question, llm, db)
+    partial_sql = _PartialSQL()
+    call, leader = _async_flight.join(key, lambda: _astream_to(partial_sql, question, llm, db),
+                                      context=partial_sql)
+    if leader:
+        call.task.add_done_callback(lambda _task: partial_sql.finish())
+    else:
+        logger.info("Joining in-flight SQL generation")
+    # Rejoint éventuellement une génération non streamée (pas de SQL partiel)
+    shared = call.context
+    call.attach()
+    try:
+        seen = 0
+        while shared is not None:
+            await shared.wait(seen)
+            if shared.version == seen:
+                break
+            seen = shared.version
+            yield shared.text
+        yield await asyncio.shield(call.task)
+    finally:
+        call.detach()
@@ -0,0 +1,184 @@
+"""
+Sélection des tables pertinentes pour réduire le prompt (BM25 + embeddings optionnels)
+"""
+import math
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence
+from infrastructure.database import db_manager, get_schema_fingerprint
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+
+Embedder = Callable[[List[str]], List[List[float]]]
+
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_CAMEL_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+# Le nom de table pèse plus que les colonnes et commentaires
+TABLE_NAME_WEIGHT = 3
+
+def tokenize(text: str) -> List[str]:
+    """Découpe snake_case / camelCase, minuscules, pluriels simples retirés"""
+    tokens = []
+    for word in _WORD_RE.findall(_CAMEL_RE.sub(" ", text or "")):
+        word = word.lower()
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+class BM25Index:
+    """Index BM25 (Okapi) sur une description textuelle par table"""
+
+    def __init__(self, documents: Dict[str, List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.names = list(documents)
+        self.term_freqs = [Counter(tokens) for tokens in documents.values()]
+        self.lengths = [len(tokens) for tokens in documents.values()]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        doc_freq = Counter(term for tf in self.term_freqs for term in tf)
+        total = len(self.names)
+        self.idf = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+    def scores(self, query_tokens: List[str]) -> Dict[str, float]:
+        """Score BM25 de chaque table pour la requête"""
+        result = {}
+        terms = [t for t in set(query_tokens) if t in self.idf]
+        for name, tf, length in zip(self.names, self.term_freqs, self.lengths):
+            score = 0.0
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            if score > 0:
+                result[name] = score
+        return result
+
+class TableSelector:
+    """Classe les tables du schéma par pertinence pour une question"""
+
+    def __init__(self, embedder: Optional[Embedder] = None, embedding_weight: float = 0.5):
+        self.embedder = embedder
+        self.embedding_weight = embedding_weight
+        self._fingerprint: Optional[str] = None
+        self._index: Optional[BM25Index] = None
+        self._columns: Dict[str, List[str]] = {}
+        self._embeddings: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def _describe_tables(self, db) -> Dict[str, Dict]:
+        """Noms, colonnes et commentaires des tables (snapshot de schéma si disponible)"""
+        store = db_manager.schema_store
+        if store.fingerprint and store.fingerprint == get_schema_fingerprint(db):
+            return {name: {"columns": store.get_columns(name)} for name in store.table_names()}
+        return {name: {"columns": []} for name in db.get_usable_table_names()}
+
+    def _ensure_index(self, db):
+        fingerprint = get_schema_fingerprint(db)
+        if fingerprint == self._fingerprint:
+            return
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                return
+            tables = self._describe_tables(db)
+            documents = {}
+            texts = {}
+            for name, info in tables.items():
+                tokens = tokenize(name) * TABLE_NAME_WEIGHT
+                parts = [name]
+                for column in info["columns"]:
+                    tokens += tokenize(column["name"]) + tokenize(column.get("comment") or "")
+                    parts.append(f"{column['name']} {column.get('comment') or ''}".strip())
+                documents[name] = tokens
+                texts[name] = " ".join(parts)
+
+            self._columns = {name: [c["name"].lower() for c in info["columns"]]
+                             for name, info in tables.items()}
+            self._index = BM25Index(documents)
+            self._embeddings = {}
+            if self.embedder is not None and texts:
+                try:
+                    vectors = self.embedder(list(texts.values()))
+                    self._embeddings = dict(zip(texts, vectors))
+                except Exception as e:
+                    logger.warning("Table embeddings unavailable", error=str(e))
+            self._fingerprint = fingerprint
+            logger.info("Table selection index built", tables_count=len(documents),
+                        embeddings=bool(self._embeddings), fingerprint=fingerprint)
+
+    def _join_partners(self, table: str, available: Sequence[str]) -> List[str]:
+        """Tables référencées par les colonnes <nom>_id d'une table (jointures probables)"""
+        partners = []
+        lookup = {}
+        for name in available:
+            for token in {name.lower(), name.lower().rstrip("s")}:
+                lookup.setdefault(token, name)
+        for column in self._columns.get(table, []):
+            if column.endswith("_id"):
+                partner = lookup.get(column[:-3])
+                if partner and partner != table:
+                    partners.append(partner)
+        return partners
+
+    def rank(self, question: str, db) -> Dict[str, float]:
+        """Score combiné (BM25 normalisé + similarité d'embedding) par table"""
+        self._ensure_index(db)
+        bm25 = self._index.scores(tokenize(question))
+        best = max(bm25.values(), default=0.0)
+        scores = {name: score / best for name, score in bm25.items()} if best else {}
+
+        if self._embeddings:
+            try:
+                query_vector = self.embedder([question])[0]
+                weight = self.embedding_weight
+                for name, vector in self._embeddings.items():
+                    scores[name] = (1 - weight) * scores.get(name, 0.0) + weight * _cosine(query_vector, vector)
+            except Exception as e:
+                logger.warning("Question embedding failed", error=str(e))
+        return scores
+
+    def select(self, question: str, db, top_k: int = None) -> Optional[List[str]]:
+        """
+        Retourne les top_k tables à passer dans table_names_to_use
+
+        None signifie « toutes les tables » (schéma déjà petit). Sans aucun
+        signal (question dans une autre langue que les noms de tables...), la
+        sélection reste bornée à top_k : tables de faits d'abord (le plus de
+        jointures <nom>_id), avec leurs tables de dimensions.
+        """
+        if not settings.table_selection_enabled:
+            return None
+        top_k = top_k or settings.table_selection_top_k
+        available = db.get_usable_table_names()
+        if len(available) <= top_k:
+            return None
+
+        scores = self.rank(question, db)
+        usable = set(available)
+        ranked = [name for name, _ in sorted(scores.items(), key=lambda x: -x[1]) if name in usable]
+        if not ranked:
+            logger.info("No table matched the question, using most connected tables")
+            ranked = sorted(available, key=lambda name: (-len(self._join_partners(name, available)), name))
+
+        selected: List[str] = []
+        for name in ranked:
+            for table in [name] + self._join_partners(name, available):
+                if table not in selected and len(selected) < top_k:
+                    selected.append(table)
+            if len(selected) >= top_k:
+                break
+        logger.info("Tables selected", tables=selected, candidates=len(available))
+        return selected
+
+# Instance globale
+table_selector = TableSelector()
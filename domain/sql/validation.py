@@ -0,0 +1,204 @@
+"""
+Validation locale du SQL généré, avant de le rendre à l'utilisateur
+
+- instruction de lecture unique (SELECT / WITH), pas de prose ;
+- syntaxe vérifiée par sqlglot (dialecte Redshift) si la bibliothèque est
+  installée (optionnelle : sinon seules les vérifications de base s'appliquent) ;
+- tables et colonnes confrontées au snapshot du schéma (schema_store).
+
+Les messages d'erreur sont destinés au LLM (re-prompt de correction).
+"""
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from domain.sql.postprocess import looks_like_sql
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+
+Catalog = Dict[str, Set[str]]
+
+# Pseudo-colonnes Redshift que sqlglot peut lire comme des colonnes
+_PSEUDO_COLUMNS = {"sysdate", "current_date", "current_time", "current_timestamp",
+                   "current_user", "session_user", "user", "true", "false", "null"}
+# Fonctions à effet de bord appelables depuis un SELECT
+SIDE_EFFECT_FUNCTIONS = frozenset({
+    "pg_terminate_backend", "pg_cancel_backend", "pg_reload_conf", "pg_rotate_logfile",
+    "set_config", "pg_advisory_lock", "pg_advisory_xact_lock", "pg_sleep",
+    "lo_import", "lo_export", "dblink", "dblink_exec"
+})
+_WRITE_NODES = ("Into", "Insert", "Update", "Delete", "Merge", "Create", "Drop", "Alter",
+                "TruncateTable", "Grant", "Copy", "Command")
+_TOKEN_REPR_RE = re.compile(r"\s*<Token .*", re.DOTALL)
+_MAX_LISTED_NAMES = 30
+
+_sqlglot = None
+_sqlglot_lock = threading.Lock()
+
+# Catalogue tables -> colonnes (minuscules) du dernier schéma vu, par empreinte
+_catalog: Tuple[Optional[str], Catalog] = (None, {})
+
+def load_sqlglot():
+    """Import différé de sqlglot (None si non installé)"""
+    global _sqlglot
+    if _sqlglot is None:
+        with _sqlglot_lock:
+            if _sqlglot is None:
+                try:
+                    import sqlglot
+                    _sqlglot = sqlglot
+                except ImportError:
+                    logger.info("sqlglot not installed, SQL validation limited to basic checks")
+                    _sqlglot = False
+    return _sqlglot or None
+
+def get_catalog(db) -> Optional[Catalog]:
+    """
+    Tables et colonnes du snapshot de schéma (recalculé quand l'empreinte change)
+
+    None si db n'a pas été construit par le DatabaseManager (noms non vérifiés).
+    """
+    global _catalog
+    fingerprint = getattr(db, "schema_fingerprint", None)
+    if not fingerprint:
+        return None
+    cached_fingerprint, catalog = _catalog
+    if cached_fingerprint != fingerprint:
+        from infrastructure.database import db_manager
+        store = db_manager.schema_store
+        catalog = {
+            table.lower(): {column["name"].lower() for column in store.get_columns(table)}
+            for table in store.table_names()
+        }
+        _catalog = (fingerprint, catalog)
+    return catalog
+
+def _listed(names) -> str:
+    names = sorted(names)
+    suffix = ", ..." if len(names) > _MAX_LISTED_NAMES else ""
+    return ", ".join(names[:_MAX_LISTED_NAMES]) + suffix
+
+def _syntax_error(error) -> str:
+    """Message court à partir d'une ParseError sqlglot (sans codes de surlignage)"""
+    details = error.errors[0] if getattr(error, "errors", None) else None
+    if not details:
+        return f"Syntax error: {error}"
+    description = _TOKEN_REPR_RE.sub("", details.get("description") or "syntax error")
+    highlight = details.get("highlight")
+    near = f" near '{highlight}'" if highlight else ""
+    return f"Syntax error{near} (line {details.get('line')}, column {details.get('col')}): {description}"
+
+def read_only_error(tree) -> Optional[str]:
+    """Raison pour laquelle l'arbre sqlglot n'est pas une lecture pure (None sinon)"""
+    from sqlglot import exp
+
+    if not isinstance(tree, exp.Query):
+        return "Only read queries (SELECT / WITH) are allowed"
+    write_nodes = tuple(getattr(exp, name) for name in _WRITE_NODES if hasattr(exp, name))
+    node = tree.find(*write_nodes)
+    if isinstance(node, exp.Into):
+        return "SELECT ... INTO creates a table: only plain read queries are allowed"
+    if node is not None:
+        return "Data-modifying statements are not allowed"
+    for func in tree.find_all(exp.Func):
+        name = (func.name if isinstance(func, exp.Anonymous) else func.sql_name()).lower()
+        if name in SIDE_EFFECT_FUNCTIONS:
+            return f"Function {name} is not allowed"
+    return None
+
+def _check_names(tree, catalog: Catalog) -> Optional[str]:
+    """
+    Tables et colonnes inconnues du schéma
+
+    Vérification prudente : colonnes non qualifiées ignorées dès qu'une source
+    dérivée (CTE, sous-requête, autre schéma) pourrait les fournir.
+    """
+    from sqlglot import exp
+
+    schema = (settings.redshift_schema or "").lower()
+    cte_names = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+    # alias ou nom de source -> table du catalogue (None : source dérivée)
+    sources: Dict[str, Optional[str]] = {}
+    derived = False
+    unknown_tables: Set[str] = set()
+
+    for table in tree.find_all(exp.Table):
+        name = table.name.lower()
+        alias = table.alias_or_name.lower()
+        if name in cte_names or (table.db and table.db.lower() != schema):
+            sources[alias] = None
+            derived = True
+        elif name not in catalog:
+            unknown_tables.add(table.name)
+        else:
+            sources[alias] = name
+    if unknown_tables:
+        return (f"Unknown table(s): {_listed(unknown_tables)}. "
+                f"Available tables: {_listed(catalog)}")
+
+    for node in tree.find_all(exp.Subquery, exp.Unnest, exp.Lateral):
+        if node.alias:
+            sources[node.alias.lower()] = None
+        derived = True
+
+    aliases = {alias.alias.lower() for alias in tree.find_all(exp.Alias)}
+    tables = {table for table in sources.values() if table}
+    unknown_columns: List[str] = []
+    for column in tree.find_all(exp.Column):
+        name = column.name.lower()
+        if column.is_star or not name or name in _PSEUDO_COLUMNS:
+            continue
+        qualifier = column.table.lower()
+        if qualifier:
+            if qualifier not in sources:
+                unknown_columns.append(f"{column.table}.{column.name}")
+            elif sources[qualifier] and name not in catalog[sources[qualifier]]:
+                unknown_columns.append(f"{column.table}.{column.name}")
+        elif not derived and name not in aliases and tables \
+                and not any(name in catalog[table] for table in tables):
+            unknown_columns.append(column.name)
+    if unknown_columns:
+        available = "; ".join(f"{table}({_listed(catalog[table])})" for table in sorted(tables))
+        return (f"Unknown column(s): {_listed(set(unknown_columns))}. "
+                f"Columns of the referenced tables: {available}")
+    return None
+
+def validate_sql(sql: str, catalog: Optional[Catalog] = None) -> Optional[str]:
+    """Retourne None si le SQL est valide, sinon l'erreur à renvoyer au LLM"""
+    if not looks_like_sql(sql):
+        return "The output is not a SQL query: answer with a single SELECT statement only"
+    if not settings.sql_validation_enabled:
+        return None
+
+    sqlglot = load_sqlglot()
+    if sqlglot is None:
+        return None
+
+    try:
+        statements = [s for s in sqlglot.parse(sql, read="redshift") if s is not None]
+    except sqlglot.errors.ParseError as e:
+        return _syntax_error(e)
+    except sqlglot.errors.SqlglotError as e:
+        return f"Syntax error: {e}"
+    if len(statements) != 1:
+        return "Expected exactly one SQL statement"
+
+    tree = statements[0]
+    error = read_only_error(tree)
+    if error is not None:
+        return error
+    if catalog:
+        return _check_names(tree, catalog)
+    return None
+
+def repair_prompt(prompt, sql: str, error: str) -> str:
+    """
+    Prompt de correction : prompt initial, réponse invalide et erreur
+
+    Le prompt de create_sql_query_chain se termine par « SQLQuery: » : la
+    réponse fautive y est recollée puis la question reposée au même format.
+    """
+    text = prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+    return (f"{text}{sql}\n\n"
+            f"The SQL query above is invalid. {error}\n"
+            f"Write the corrected query for the same question, using only the tables "
+            f"and columns described above.\nSQLQuery: ")
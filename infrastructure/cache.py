@@ -1,59 +1,431 @@
 """
-Cache manager pour optimiser les performances (Version mémoire gratuite)
+Cache manager à deux niveaux : mémoire locale (L1) et Redis partagé optionnel (L2)
 """
 import json
+import heapq
 import hashlib
+import pickle
+import sys
+import threading
 import time
-from typing import Optional, Any, Dict
+from collections import OrderedDict
+from typing import Optional, Any, Callable, Dict, List, Tuple
+from infrastructure.lazy import LazyProxy
 from infrastructure.settings import settings
 from infrastructure.logging import logger
+from infrastructure.monitoring import metrics
+from infrastructure.redis_cache import RedisCache
+from infrastructure.singleflight import SingleFlight
+
+class EvictionPolicy:
+    """Politique d'éviction : suit les accès et désigne la prochaine victime"""
+
+    def on_insert(self, key: str, item: Dict):
+        pass
+
+    def on_access(self, key: str, item: Dict):
+        pass
+
+    def on_remove(self, key: str):
+        pass
+
+    def victim(self) -> Optional[str]:
+        raise NotImplementedError
+
+class LRUPolicy(EvictionPolicy):
+    """Évince l'entrée la moins récemment utilisée"""
+
+    def __init__(self):
+        self._order: "OrderedDict[str, None]" = OrderedDict()
+
+    def on_insert(self, key: str, item: Dict):
+        self._order[key] = None
+        self._order.move_to_end(key)
+
+    def on_access(self, key: str, item: Dict):
+        self._order.move_to_end(key)
+
+    def on_remove(self, key: str):
+        self._order.pop(key, None)
+
+    def victim(self) -> Optional[str]:
+        return next(iter(self._order), None)
+
+class LFUPolicy(EvictionPolicy):
+    """Évince l'entrée la moins fréquemment utilisée (LRU à fréquence égale), en O(1)"""
 
-class CacheManager:
     def __init__(self):
-        # Cache mémoire gratuit au lieu de Redis
+        self._freq: Dict[str, int] = {}
+        self._buckets: Dict[int, "OrderedDict[str, None]"] = {}
+        self._min_freq = 0
+
+    def _bump(self, key: str, freq: int):
+        self._freq[key] = freq
+        self._buckets.setdefault(freq, OrderedDict())[key] = None
+
+    def _unlink(self, key: str) -> int:
+        freq = self._freq.pop(key)
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+        return freq
+
+    def on_insert(self, key: str, item: Dict):
+        if key in self._freq:
+            self._unlink(key)
+        self._bump(key, 1)
+        self._min_freq = 1
+
+    def on_access(self, key: str, item: Dict):
+        freq = self._unlink(key)
+        if freq == self._min_freq and freq not in self._buckets:
+            self._min_freq = freq + 1
+        self._bump(key, freq + 1)
+
+    def on_remove(self, key: str):
+        if key in self._freq:
+            self._unlink(key)
+            if self._min_freq not in self._buckets:
+                self._min_freq = min(self._buckets, default=0)
+
+    def victim(self) -> Optional[str]:
+        bucket = self._buckets.get(self._min_freq)
+        if not bucket:
+            return None
+        return next(iter(bucket))
+
+class TTLPolicy(EvictionPolicy):
+    """Évince l'entrée dont l'expiration est la plus proche"""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, str]] = []
+        self._expires: Dict[str, float] = {}
+
+    def on_insert(self, key: str, item: Dict):
+        self._expires[key] = item["expires_at"]
+        heapq.heappush(self._heap, (item["expires_at"], key))
+        self._compact()
+
+    def on_remove(self, key: str):
+        self._expires.pop(key, None)
+        self._compact()
+
+    def _compact(self):
+        """Reconstruit le tas quand les entrées périmées y sont majoritaires"""
+        if len(self._heap) > 2 * len(self._expires) + 16:
+            self._heap = [(expires_at, key) for key, expires_at in self._expires.items()]
+            heapq.heapify(self._heap)
+
+    def victim(self) -> Optional[str]:
+        # Suppression paresseuse des entrées périmées du tas
+        while self._heap:
+            expires_at, key = self._heap[0]
+            if self._expires.get(key) == expires_at:
+                return key
+            heapq.heappop(self._heap)
+        return None
+
+EVICTION_POLICIES = {
+    "lru": LRUPolicy,
+    "lfu": LFUPolicy,
+    "ttl": TTLPolicy,
+}
+
+def estimate_size(value: Any) -> int:
+    """Estime la taille mémoire d'une valeur en octets"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return sys.getsizeof(value)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+class CacheManager:
+    def __init__(self, max_entries: int = None, max_bytes: int = None,
+                 eviction_policy: str = None, sweep_interval: int = None,
+                 l2: Optional[RedisCache] = None):
+        # L1 : cache mémoire borné en entrées et en octets
         self.memory_cache: Dict[str, Dict] = {}
-        logger.info("In-memory cache initialized (FREE)")
-    
+        self.max_entries = max_entries or settings.cache_max_entries
+        self.max_bytes = max_bytes or settings.cache_max_bytes
+        self.policy_name = eviction_policy or settings.cache_eviction_policy
+        self._policy: EvictionPolicy = EVICTION_POLICIES[self.policy_name]()
+        self._lock = threading.RLock()
+        self._inflight = SingleFlight()
+
+        # L2 : Redis partagé entre workers et réplicas (optionnel)
+        if l2 is None and settings.redis_url:
+            l2 = RedisCache(settings.redis_url)
+        self.l2 = l2
+
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._stop_event = threading.Event()
+        self._sweeper = None
+        self._start_sweeper(sweep_interval or settings.cache_sweep_interval)
+
+        logger.info("Cache initialized",
+                    l2_enabled=self.l2 is not None,
+                    max_entries=self.max_entries,
+                    max_bytes=self.max_bytes,
+                    eviction_policy=self.policy_name)
+
+    def _start_sweeper(self, interval: int):
+        """Démarre le thread de purge périodique des entrées expirées"""
+        def sweep_loop():
+            while not self._stop_event.wait(interval):
+                try:
+                    self.purge_expired()
+                except Exception as e:
+                    logger.error("Cache sweep failed", error=str(e))
+
+        self._sweeper = threading.Thread(target=sweep_loop, name="cache-sweeper", daemon=True)
+        self._sweeper.start()
+
     def _is_expired(self, cache_item: Dict) -> bool:
         """Vérifie si l'item de cache a expiré"""
         return time.time() > cache_item.get("expires_at", 0)
-    
+
     def _generate_key(self, prefix: str, data: str) -> str:
         """Génère une clé de cache basée sur le hash du contenu"""
         hash_object = hashlib.md5(data.encode())
         return f"{prefix}:{hash_object.hexdigest()}"
-    
-    def get(self, key: str) -> Optional[Any]:
-        """Récupère une valeur du cache mémoire"""
-        if key in self.memory_cache:
-            cache_item = self.memory_cache[key]
+
+    def _remove(self, key: str) -> Optional[Dict]:
+        """Retire une entrée et met à jour la comptabilité (verrou déjà pris)"""
+        cache_item = self.memory_cache.pop(key, None)
+        if cache_item is not None:
+            self.current_bytes -= cache_item["size"]
+            self._policy.on_remove(key)
+        return cache_item
+
+    def _evict_until_fits(self, incoming_size: int):
+        """Évince selon la politique jusqu'à respecter les plafonds (verrou déjà pris)"""
+        while self.memory_cache and (
+            len(self.memory_cache) >= self.max_entries or
+            self.current_bytes + incoming_size > self.max_bytes
+        ):
+            key = self._policy.victim()
+            if key is None:
+                break
+            self._remove(key)
+            self.evictions += 1
+            metrics.record_cache_eviction()
+
+    def _get_local(self, key: str) -> Optional[Any]:
+        """Lecture L1 sans comptabilisation des hits/miss"""
+        with self._lock:
+            cache_item = self.memory_cache.get(key)
+            if cache_item is None:
+                return None
             if not self._is_expired(cache_item):
+                self._policy.on_access(key, cache_item)
                 return cache_item["value"]
-            else:
-                # Supprime l'item expiré
-                del self.memory_cache[key]
+            # Supprime l'item expiré
+            self._remove(key)
+            self.expirations += 1
         return None
 
-    def set(self, key: str, value: Any, ttl: int = None) -> bool:
-        """Stocke une valeur dans le cache mémoire"""
-        ttl = ttl or settings.cache_ttl
-        expires_at = time.time() + ttl
-        
-        self.memory_cache[key] = {
+    def _set_local(self, key: str, value: Any, ttl: float, size: int) -> bool:
+        """
+        Écriture L1 avec éviction si nécessaire
+
+        Refusée (False) au-delà de max_bytes, y compris pour une promotion
+        depuis L2 (valeur écrite par un réplica au plafond plus élevé).
+        """
+        if size > self.max_bytes:
+            logger.warning("Cache item too large, not stored", key=key, size=size)
+            return False
+        cache_item = {
             "value": value,
-            "expires_at": expires_at
+            "expires_at": time.time() + ttl,
+            "size": size
         }
+        with self._lock:
+            self._remove(key)
+            self._evict_until_fits(size)
+            self.memory_cache[key] = cache_item
+            self.current_bytes += size
+            self._policy.on_insert(key, cache_item)
         return True
-    
-    def cache_sql_result(self, query: str, result: Any) -> bool:
+
+    def _record_lookup(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if hit:
+            metrics.record_cache_hit()
+        else:
+            metrics.record_cache_miss()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Récupère une valeur (L1 mémoire puis L2 Redis si configuré)"""
+        value = self._get_local(key)
+        if value is None and self.l2 is not None:
+            value, remaining_ttl = self.l2.get_with_ttl(key)
+            if value is not None:
+                # Promotion en L1 pour la durée de vie restante
+                self._set_local(key, value, remaining_ttl or settings.cache_ttl,
+                                estimate_size(value))
+        self._record_lookup(value is not None)
+        return value
+
+    def set(self, key: str, value: Any, ttl: int = None) -> bool:
+        """Stocke une valeur dans le cache mémoire (et en L2 si configuré)"""
+        ttl = ttl or settings.cache_ttl
+        if not self._set_local(key, value, ttl, estimate_size(value)):
+            return False
+        if self.l2 is not None:
+            self.l2.set(key, value, ttl)
+        return True
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Récupère plusieurs valeurs ; les absentes de L1 sont lues en un seul aller-retour L2"""
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._get_local(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+
+        if missing and self.l2 is not None:
+            for key, (value, remaining_ttl) in self.l2.get_many_with_ttl(missing).items():
+                # Promotion en L1 pour la durée de vie restante, comme get
+                self._set_local(key, value, remaining_ttl or settings.cache_ttl,
+                                estimate_size(value))
+                found[key] = value
+
+        for key in keys:
+            self._record_lookup(key in found)
+        return found
+
+    def set_many(self, items: Dict[str, Any], ttl: int = None) -> bool:
+        """Stocke plusieurs valeurs (pipeline unique vers L2)"""
+        ttl = ttl or settings.cache_ttl
+        accepted = {}
+        for key, value in items.items():
+            if self._set_local(key, value, ttl, estimate_size(value)):
+                accepted[key] = value
+        if self.l2 is not None:
+            self.l2.set_many(accepted, ttl)
+        return len(accepted) == len(items)
+
+    def get_or_set(self, key: str, loader: Callable[[], Any], ttl: int = None) -> Any:
+        """
+        Retourne la valeur en cache ou la calcule une seule fois (protection anti-stampede)
+        
+        Un seul thread par processus calcule la valeur (single-flight) ; avec Redis,
+        un verrou distribué évite que plusieurs réplicas la recalculent en même temps.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        def load():
+            # Un autre thread a pu remplir le cache pendant l'attente
+            cached = self._get_local(key)
+            if cached is not None:
+                return cached
+
+            token = None
+            if self.l2 is not None:
+                token = self.l2.acquire_lock(key, settings.cache_lock_timeout)
+                if token is None:
+                    # Un autre processus calcule déjà cette valeur
+                    shared = self.l2.wait_for(key, settings.cache_lock_timeout)
+                    if shared is not None:
+                        self._set_local(key, shared, ttl or settings.cache_ttl,
+                                        estimate_size(shared))
+                        return shared
+            try:
+                result = loader()
+                if result is not None:
+                    self.set(key, result, ttl)
+                return result
+            finally:
+                if token is not None:
+                    self.l2.release_lock(key, token)
+
+        return self._inflight.do(key, load)
+
+    def delete(self, key: str) -> bool:
+        """Supprime une entrée du cache (L1 et L2)"""
+        if self.l2 is not None:
+            self.l2.delete(key)
+        with self._lock:
+            return self._remove(key) is not None
+
+    def clear(self):
+        """Vide entièrement le cache local (le tier L2 partagé n'est pas touché)"""
+        with self._lock:
+            for key in list(self.memory_cache):
+                self._remove(key)
+
+    def purge_expired(self) -> int:
+        """Supprime toutes les entrées expirées, retourne leur nombre"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, item in self.memory_cache.items()
+                       if now > item.get("expires_at", 0)]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        if expired:
+            logger.debug("Expired cache entries purged", count=len(expired))
+        return len(expired)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retourne les statistiques du cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.memory_cache),
+                "max_entries": self.max_entries,
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "eviction_policy": self.policy_name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups > 0 else 0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "l2": self.l2.get_stats() if self.l2 is not None else None
+            }
+
+    def close(self):
+        """Arrête le thread de purge"""
+        self._stop_event.set()
+
+    def cache_sql_result(self, query: str, result: Any, ttl: int = None) -> bool:
         """Cache le résultat d'une requête SQL"""
         key = self._generate_key("sql", query)
-        return self.set(key, result)
-    
+        return self.set(key, result, ttl)
+
     def get_cached_sql_result(self, query: str) -> Optional[Any]:
         """Récupère le résultat d'une requête SQL du cache"""
         key = self._generate_key("sql", query)
         return self.get(key)
 
+    def cache_generated_sql(self, question_key: str, sql: str) -> bool:
+        """Cache une requête SQL générée pour une question normalisée"""
+        key = self._generate_key("gen", question_key)
+        return self.set(key, sql)
+
+    def get_cached_generated_sql(self, question_key: str) -> Optional[str]:
+        """Récupère une requête SQL générée du cache"""
+        key = self._generate_key("gen", question_key)
+        return self.get(key)
+
 # Instance globale
-cache_manager = CacheManager()
+cache_manager = LazyProxy(CacheManager, "cache_manager")
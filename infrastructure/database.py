@@ -1,41 +1,65 @@
 """
-Gestion robuste des connexions Redshift avec retry et pooling
+Gestion robuste des connexions Redshift avec retry, pooling et schéma paresseux
+
+SQLAlchemy et LangChain ne sont importés qu'à la création du gestionnaire.
+La connexion passe par le disjoncteur "database" : Redshift indisponible,
+les appels échouent immédiatement au lieu d'attendre chacun le timeout TCP.
 """
-from sqlalchemy.engine import create_engine
-from sqlalchemy.pool import QueuePool
-from sqlalchemy import inspect
-from langchain_community.utilities import SQLDatabase
-from tenacity import retry, stop_after_attempt, wait_exponential
+from typing import TYPE_CHECKING, Any, Dict, Optional
+from infrastructure.lazy import LazyProxy
+from infrastructure.resilience import get_breaker, retry_call
 from infrastructure.settings import settings
+from infrastructure.tracing import span
 from infrastructure.logging import logger
 import time
+import hashlib
+import threading
+
+if TYPE_CHECKING:
+    from langchain_community.utilities import SQLDatabase
 
 class DatabaseManager:
     def __init__(self):
+        from infrastructure.schema_store import SchemaStore
+        from infrastructure.table_info_store import TableInfoStore
+        
+        # Aucune connexion à la création : engine et SQLDatabase sont créés au premier usage
         self.engine = None
         self.db = None
-        self._connect()
+        self.pool_maintainer = None
+        self.schema_store = SchemaStore()
+        self.schema_store.on_change(self._on_schema_change)
+        self.table_info_store = TableInfoStore(self.schema_store)
+        self._lock = threading.RLock()
     
-    @retry(
-        stop=stop_after_attempt(2),           # 2 tentatives au lieu de 3
-        wait=wait_exponential(multiplier=1, min=2, max=5)  # 2-5 sec au lieu de 4-10 sec
-    )
     def _connect(self):
-        """Connexion avec retry automatique"""
+        """Connexion avec retry budgété, protégée par le disjoncteur"""
+        retry_call("database", self._connect_once,
+                   attempts=settings.db_connect_attempts,
+                   budget=settings.db_connect_budget,
+                   base_delay=2.0)
+    
+    def _connect_once(self):
+        """Une tentative de connexion"""
+        from sqlalchemy import create_engine, text
+        from infrastructure.pool import ElasticQueuePool, PoolMaintainer
+        
         try:
             logger.info("Connecting to Redshift", 
                        host=settings.redshift_host, 
                        database=settings.redshift_db,
                        schema=settings.redshift_schema)
             
-            # Engine avec pooling robuste et timeout rapide
-            self.engine = create_engine(
+            # Engine avec pool instrumenté ; liveness vérifiée en arrière-plan
+            # (pas de pre-ping : un aller-retour de moins par checkout)
+            engine = create_engine(
                 settings.redshift_dsn,
-                poolclass=QueuePool,
-                pool_size=settings.db_pool_size,
+                poolclass=ElasticQueuePool,
+                pool_size=min(max(settings.db_pool_size, settings.db_pool_min_size),
+                              settings.db_pool_max_size),
                 max_overflow=settings.db_pool_overflow,
-                pool_timeout=10,     # Timeout réduit à 10 secondes
-                pool_pre_ping=True,  # Vérifie la connexion avant utilisation
+                pool_timeout=settings.db_pool_timeout,
+                pool_pre_ping=False,
                 pool_recycle=3600,   # Renouvelle les connexions toutes les heures
                 echo=settings.debug, # Log SQL en mode debug
                 connect_args={
@@ -45,23 +69,17 @@ class DatabaseManager:
             )
             
             # Test de connexion
-            with self.engine.connect() as conn:
-                conn.execute("SELECT 1")
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
             
-            # Introspection du schéma
-            inspector = inspect(self.engine)
-            tables = inspector.get_table_names(schema=settings.redshift_schema)
+            self.engine = engine
+            logger.info("Database connection successful")
             
-            logger.info("Database connection successful", 
-                       tables_count=len(tables),
-                       tables=tables[:5])  # Log les 5 premières tables
-            
-            # Création de l'objet SQLDatabase pour LangChain
-            self.db = SQLDatabase(
-                self.engine, 
-                schema=settings.redshift_schema, 
-                include_tables=tables
-            )
+            # Préchauffage et maintenance du pool hors du chemin critique
+            self.pool_maintainer = PoolMaintainer(engine)
+            threading.Thread(target=self.pool_maintainer.prewarm, name="db-pool-prewarm",
+                             daemon=True).start()
+            self.pool_maintainer.start()
             
         except Exception as e:
             logger.error("Database connection failed", 
@@ -69,31 +87,129 @@ class DatabaseManager:
                         host=settings.redshift_host)
             raise
     
-    def get_db(self) -> SQLDatabase:
-        """Retourne l'instance SQLDatabase"""
-        if self.db is None:
-            self._connect()
-        return self.db
+    def _build_db(self) -> "SQLDatabase":
+        """Construit le SQLDatabase LangChain à partir du snapshot de schéma"""
+        from infrastructure.table_info_store import PrecomputedSQLDatabase
+        
+        engine = self.get_engine()
+        
+        # Snapshot disque d'abord ; introspection complète seulement s'il n'existe pas
+        if not self.schema_store.load():
+            self.schema_store.refresh(engine)
+        elif self.schema_store.is_stale():
+            self.schema_store.refresh_async(engine)
+        
+        tables = self.schema_store.table_names()
+        logger.info("Schema loaded",
+                   tables_count=len(tables),
+                   tables=tables[:5],  # Log les 5 premières tables
+                   fingerprint=self.schema_store.fingerprint)
+        
+        try:
+            # Réflexion différée ; descriptions de tables servies par le store précalculé
+            db = PrecomputedSQLDatabase(
+                engine,
+                schema=settings.redshift_schema,
+                include_tables=tables,
+                lazy_table_reflection=True,
+                table_info_store=self.table_info_store
+            )
+        except ValueError:
+            # Snapshot obsolète (table supprimée) : rafraîchissement synchrone puis
+            # nouvel essai limité aux tables que SQLAlchemy voit réellement
+            from sqlalchemy import inspect
+            
+            self.schema_store.refresh(engine)
+            reflectable = set(inspect(engine).get_table_names(schema=settings.redshift_schema))
+            tables = [t for t in self.schema_store.table_names() if t in reflectable]
+            skipped = sorted(set(self.schema_store.table_names()) - reflectable)
+            if skipped:
+                logger.warning("Snapshot tables not reflectable, skipped", tables=skipped[:10])
+            db = PrecomputedSQLDatabase(
+                engine,
+                schema=settings.redshift_schema,
+                include_tables=tables,
+                lazy_table_reflection=True,
+                table_info_store=self.table_info_store
+            )
+        db.schema_fingerprint = self.schema_store.fingerprint
+        
+        # Précalcul DDL + lignes d'exemple hors du chemin critique
+        self.table_info_store.build_async(db)
+        return db
+    
+    def _on_schema_change(self, fingerprint: str, changed_tables):
+        """Invalide le SQLDatabase quand le schéma change (reconstruit au prochain appel)"""
+        logger.info("Schema changed", fingerprint=fingerprint,
+                   changed_tables=sorted(changed_tables)[:10])
+        with self._lock:
+            self.db = None
+    
+    def get_db(self) -> "SQLDatabase":
+        """Retourne l'instance SQLDatabase (construite paresseusement)"""
+        db = self.db
+        if db is None:
+            with self._lock:
+                if self.db is None:
+                    with span("schema_load"):
+                        self.db = self._build_db()
+                db = self.db
+        elif self.schema_store.is_stale():
+            self.schema_store.refresh_async(self.engine)
+        return db
+    
+    def get_engine(self):
+        """Retourne l'engine SQLAlchemy (connexion établie au besoin)"""
+        if self.engine is None:
+            with self._lock:
+                if self.engine is None:
+                    self._connect()
+        return self.engine
     
     def health_check(self) -> bool:
         """Vérifie la santé de la connexion"""
+        from sqlalchemy import text
+        
         try:
-            with self.engine.connect() as conn:
-                conn.execute("SELECT 1")
+            engine = self.get_engine()
+            with get_breaker("database").call(), engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
             return True
         except Exception as e:
             logger.error("Database health check failed", error=str(e))
             return False
     
+    def get_pool_stats(self) -> Optional[Dict[str, Any]]:
+        """Statistiques du pool (None tant que l'engine n'est pas créé)"""
+        pool = self.engine.pool if self.engine is not None else None
+        if not hasattr(pool, "get_stats"):
+            return None
+        stats = pool.get_stats()
+        if self.pool_maintainer is not None:
+            stats["liveness_failures"] = self.pool_maintainer.liveness_failures
+        return stats
+    
     def close(self):
         """Ferme proprement les connexions"""
+        if self.pool_maintainer is not None:
+            self.pool_maintainer.stop()
         if self.engine:
             self.engine.dispose()
             logger.info("Database connections closed")
 
 # Instance globale
-db_manager = DatabaseManager()
+db_manager = LazyProxy(DatabaseManager, "db_manager")
 
-def connect_to_redshift() -> SQLDatabase:
+def connect_to_redshift() -> "SQLDatabase":
     """Interface publique pour la connexion Redshift"""
     return db_manager.get_db()
+
+def get_schema_fingerprint(db: "SQLDatabase") -> str:
+    """Empreinte courte du schéma exposé (dialecte, schéma et tables utilisables)"""
+    # SQLDatabase construit par DatabaseManager : empreinte colonnes incluses
+    fingerprint = getattr(db, "schema_fingerprint", None)
+    if fingerprint:
+        return fingerprint
+    tables = ",".join(sorted(db.get_usable_table_names()))
+    data = f"{db.dialect}|{getattr(db, '_schema', '')}|{tables}"
+    return hashlib.md5(data.encode()).hexdigest()[:16]
@@ -1,138 +1,198 @@
 """
 Module de health checks pour surveiller l'état des services
+
+Les vérifications tournent dans un thread dédié (HealthProber) ;
+get_system_status lit les derniers résultats en mémoire, sans jamais bloquer.
 """
+import threading
 import time
-from typing import Dict, Tuple
-import streamlit as st
+import urllib.error
+import urllib.request
+from typing import Any, Callable, Dict, Tuple
+from infrastructure.lazy import LazyProxy
+from infrastructure.monitoring import LatencyHistogram
+from infrastructure.settings import settings
+from infrastructure.logging import logger
 
-# Cache des statuts avec TTL de 30 secondes
-CACHE_TTL = 30
-_status_cache = {}
+GEMINI_MODELS_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}"
 
-def get_cached_status(service_name: str, check_function) -> Tuple[str, str]:
-    """
-    Récupère le statut d'un service avec mise en cache
-    
-    Args:
-        service_name: Nom du service (db, llm)
-        check_function: Fonction de vérification à appeler
-        
-    Returns:
-        Tuple (status, message) où status = "OK", "WARNING", "ERROR"
-    """
-    current_time = time.time()
-    cache_key = f"{service_name}_status"
-    cache_time_key = f"{service_name}_time"
-    
-    # Vérifier si le cache est encore valide
-    if (cache_key in _status_cache and 
-        cache_time_key in _status_cache and
-        current_time - _status_cache[cache_time_key] < CACHE_TTL):
-        return _status_cache[cache_key]
-    
-    # Exécuter le check et mettre en cache
-    try:
-        status, message = check_function()
-        _status_cache[cache_key] = (status, message)
-        _status_cache[cache_time_key] = current_time
-        return status, message
-    except Exception as e:
-        error_result = ("ERROR", f"Check failed: {str(e)}")
-        _status_cache[cache_key] = error_result
-        _status_cache[cache_time_key] = current_time
-        return error_result
+# Statut affiché tant que la première vérification n'a pas abouti
+PENDING_STATUS = ("UNKNOWN", "Pending")
+
+def _classify(elapsed_ms: int, ok_below: int, warning_below: int, label: str) -> Tuple[str, str]:
+    """Statut selon la latence mesurée"""
+    if elapsed_ms < ok_below:
+        return "OK", f"{label} ({elapsed_ms}ms)"
+    elif elapsed_ms < warning_below:
+        return "WARNING", f"Slow ({elapsed_ms}ms)"
+    return "ERROR", f"Too slow ({elapsed_ms}ms)"
 
 def check_database_connection() -> Tuple[str, str]:
     """
-    Vérifie la connexion à la base de données Redshift
-    
+    Vérifie la base : ping d'une connexion du pool (SELECT 1)
+
+    Pas de reconstruction du SQLDatabase ni de réflexion du schéma.
+
     Returns:
         Tuple (status, message)
     """
     try:
-        from infrastructure.database import connect_to_redshift
-        
+        from sqlalchemy import text
+        from infrastructure.database import db_manager
+
         start_time = time.time()
-        db = connect_to_redshift()
-        
-        # Test simple de connexion
-        result = db.execute("SELECT 1 as test_connection")
-        if result:
-            connection_time = round((time.time() - start_time) * 1000)
-            
-            if connection_time < 500:  # < 500ms = OK
-                return "OK", f"Connected ({connection_time}ms)"
-            elif connection_time < 2000:  # < 2s = WARNING
-                return "WARNING", f"Slow ({connection_time}ms)"
-            else:  # > 2s = ERROR
-                return "ERROR", f"Too slow ({connection_time}ms)"
-        else:
-            return "ERROR", "No response"
-            
+        with db_manager.get_engine().connect() as conn:
+            conn.execute(text("SELECT 1"))
+        elapsed_ms = round((time.time() - start_time) * 1000)
+        return _classify(elapsed_ms, 500, 2000, "Connected")
+
     except Exception as e:
         return "ERROR", f"Connection failed: {str(e)[:50]}"
 
 def check_llm_availability() -> Tuple[str, str]:
     """
-    Vérifie la disponibilité du LLM Gemini
-    
+    Vérifie Gemini via les métadonnées du modèle (GET models/{model})
+
+    Aucun prompt envoyé : pas de tokens consommés ; valide aussi la clé API.
+
     Returns:
         Tuple (status, message)
     """
+    request = urllib.request.Request(
+        GEMINI_MODELS_URL.format(model=settings.llm_model),
+        headers={"x-goog-api-key": settings.google_api_key}
+    )
     try:
-        from infrastructure.llm import init_llm
-        
         start_time = time.time()
-        llm = init_llm()
-        
-        # Test simple avec une requête courte
-        response = llm.invoke("SELECT 1")
-        
-        if response and len(str(response).strip()) > 0:
-            response_time = round((time.time() - start_time) * 1000)
-            
-            if response_time < 1000:  # < 1s = OK
-                return "OK", f"Responsive ({response_time}ms)"
-            elif response_time < 5000:  # < 5s = WARNING
-                return "WARNING", f"Slow ({response_time}ms)"
-            else:  # > 5s = ERROR
-                return "ERROR", f"Too slow ({response_time}ms)"
-        else:
-            return "ERROR", "No valid response"
-            
+        with urllib.request.urlopen(request, timeout=settings.health_check_timeout) as response:
+            response.read()
+        elapsed_ms = round((time.time() - start_time) * 1000)
+        return _classify(elapsed_ms, 1000, 5000, "Responsive")
+
+    except urllib.error.HTTPError as e:
+        return "ERROR", f"LLM unavailable: HTTP {e.code}"
     except Exception as e:
         return "ERROR", f"LLM unavailable: {str(e)[:50]}"
 
+class HealthProber:
+    """Rafraîchit périodiquement le statut des services dans un thread d'arrière-plan"""
+
+    def __init__(self, checks: Dict[str, Callable[[], Tuple[str, str]]], interval: float = None):
+        self.checks = checks
+        self.interval = interval or settings.health_check_interval
+        self.statuses: Dict[str, Tuple[str, str]] = {name: PENDING_STATUS for name in checks}
+        self.checked_at: Dict[str, float] = {}
+        self.latencies: Dict[str, LatencyHistogram] = {name: LatencyHistogram() for name in checks}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._round_done = threading.Condition()
+        self._rounds = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Démarre le thread de vérification (idempotent)"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="health-prober", daemon=True)
+                self._thread.start()
+                logger.info("Health prober started", interval=self.interval)
+
+    def stop(self):
+        """Arrête le thread de vérification"""
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.probe_all()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def probe_all(self):
+        """Exécute toutes les vérifications (dans le thread appelant)"""
+        for name, check in self.checks.items():
+            start_time = time.time()
+            try:
+                status = check()
+            except Exception as e:
+                status = ("ERROR", f"Check failed: {str(e)[:50]}")
+            self.latencies[name].record((time.time() - start_time) * 1000)
+            if status[0] != self.statuses[name][0]:
+                logger.info("Service status changed", service=name,
+                            status=status[0], message=status[1])
+            self.statuses[name] = status
+            self.checked_at[name] = time.time()
+        with self._round_done:
+            self._rounds += 1
+            self._round_done.notify_all()
+
+    def refresh(self, wait: float = 0) -> bool:
+        """
+        Demande une vérification immédiate au thread
+
+        Avec wait > 0, attend au plus wait secondes la fin du tour ; retourne
+        True si les statuts ont été rafraîchis.
+        """
+        self.start()
+        with self._round_done:
+            target = self._rounds + 1
+            self._wake.set()
+            if wait <= 0:
+                return False
+            return self._round_done.wait_for(lambda: self._rounds >= target, wait)
+
+    def get_status(self) -> Dict[str, Tuple[str, str]]:
+        """Derniers statuts connus (lecture mémoire)"""
+        self.start()
+        return dict(self.statuses)
+
+    def get_details(self) -> Dict[str, Dict[str, Any]]:
+        """Statuts, ancienneté et distribution des latences de vérification"""
+        now = time.time()
+        return {
+            name: {
+                "status": status,
+                "message": message,
+                "age_seconds": round(now - self.checked_at[name], 1) if name in self.checked_at else None,
+                "latency": self.latencies[name].summary()
+            }
+            for name, (status, message) in self.get_status().items()
+        }
+
+# Instance globale
+health_prober = LazyProxy(lambda: HealthProber({
+    "database": check_database_connection,
+    "llm": check_llm_availability
+}), "health_prober")
+
 def get_system_status() -> Dict[str, Tuple[str, str]]:
     """
-    Récupère l'état de tous les services système
-    
+    Récupère l'état de tous les services système (sans bloquer)
+
     Returns:
         Dict avec les statuts de chaque service
     """
-    return {
-        "database": get_cached_status("database", check_database_connection),
-        "llm": get_cached_status("llm", check_llm_availability)
-    }
+    return health_prober.get_status()
 
 def get_status_emoji(status: str) -> str:
     """
     Retourne l'emoji correspondant au statut
-    
+
     Args:
         status: "OK", "WARNING", "ERROR"
-        
+
     Returns:
         Emoji correspondant
     """
     emoji_map = {
         "OK": "🟢",
-        "WARNING": "🟡", 
+        "WARNING": "🟡",
         "ERROR": "🔴"
     }
     return emoji_map.get(status, "⚫")
 
 def clear_health_cache():
-    """Vide le cache des statuts (utile pour forcer un refresh)"""
-    global _status_cache
-    _status_cache.clear()
+    """Force un rafraîchissement des statuts en arrière-plan"""
+    health_prober.refresh()
@@ -0,0 +1,101 @@
+"""
+Singletons paresseux et préchargement des modules lourds
+
+Les instances globales (settings, logger, db_manager, cache_manager,
+metrics...) sont des LazyProxy : l'import d'un module ne construit rien,
+ne valide pas l'environnement et n'ouvre aucune connexion. L'objet réel
+est créé au premier accès à un attribut, une seule fois même si plusieurs
+threads y accèdent simultanément.
+"""
+import importlib
+import inspect
+import threading
+import time
+from typing import Any, Callable, Iterable, Optional, Set
+
+_UNSET = object()
+
+# Modules déjà confiés à un thread de préchargement
+_preloaded: Set[str] = set()
+_preload_lock = threading.Lock()
+
+class LazyProxy:
+    """
+    Proxy construisant son objet cible au premier accès
+
+    Les attributs sont lus et écrits sur la cible ; les méthodes liées sont
+    mémorisées sur le proxy après le premier appel pour que le chemin chaud
+    ne repasse pas par __getattr__.
+    """
+
+    __slots__ = ("_factory", "_name", "_target", "_lock", "__dict__")
+
+    def __init__(self, factory: Callable[[], Any], name: str = None):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_name", name or getattr(factory, "__name__", "lazy"))
+        object.__setattr__(self, "_target", _UNSET)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _resolve(self) -> Any:
+        target = self._target
+        if target is _UNSET:
+            with self._lock:
+                # Double vérification : un autre thread a pu construire la cible
+                target = self._target
+                if target is _UNSET:
+                    target = self._factory()
+                    object.__setattr__(self, "_target", target)
+        return target
+
+    @property
+    def is_initialized(self) -> bool:
+        return self._target is not _UNSET
+
+    def __getattr__(self, name: str) -> Any:
+        target = self._resolve()
+        value = getattr(target, name)
+        if inspect.ismethod(value) and value.__self__ is target:
+            self.__dict__[name] = value
+        return value
+
+    def __setattr__(self, name: str, value: Any):
+        self.__dict__.pop(name, None)
+        setattr(self._resolve(), name, value)
+
+    def __delattr__(self, name: str):
+        self.__dict__.pop(name, None)
+        delattr(self._resolve(), name)
+
+    def __repr__(self) -> str:
+        if self.is_initialized:
+            return repr(self._target)
+        return f"<LazyProxy {self._name} (non initialisé)>"
+
+def preload_modules(modules: Iterable[str]) -> Optional[threading.Thread]:
+    """
+    Importe des modules lourds (langchain, SDK Gemini...) dans un thread
+    d'arrière-plan, pour que la première requête ne paie pas leur import
+
+    Idempotent : un module déjà demandé n'est pas rechargé (None si rien à faire).
+    """
+    with _preload_lock:
+        modules = [m for m in modules if m not in _preloaded]
+        _preloaded.update(modules)
+    if not modules:
+        return None
+
+    def _load():
+        from infrastructure.logging import logger
+        for module in modules:
+            start_time = time.perf_counter()
+            try:
+                importlib.import_module(module)
+            except Exception as e:
+                logger.warning("Module preload failed", module=module, error=str(e))
+                continue
+            logger.debug("Module preloaded", module=module,
+                         duration_ms=round((time.perf_counter() - start_time) * 1000, 1))
+
+    thread = threading.Thread(target=_load, name="module-preload", daemon=True)
+    thread.start()
+    return thread
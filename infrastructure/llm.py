@@ -1,58 +1,152 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+"""
+Fournisseur unique des clients LLM (Gemini)
+
+Un client de base porte les connexions vers l'API Gemini ; chaque
+configuration (modèle, température, max_tokens) en est une copie légère
+(model_copy) qui partage ce transport, créée une seule fois par processus.
+Les niveaux de modèles : llm_model (rapide) d'abord, llm_fallback_model
+quand la sortie du premier n'est pas une requête exploitable.
+"""
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+from infrastructure.lazy import LazyProxy
+from infrastructure.resilience import call_llm
 from infrastructure.settings import settings
 from infrastructure.logging import logger
 
-class LLMManager:
-    """Gestionnaire pour les interactions avec le modèle LLM"""
-    
+if TYPE_CHECKING:
+    # Import coûteux (SDK Gemini) différé jusqu'à la création du premier client
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+LLMConfigKey = Tuple[str, float, Optional[int]]
+
+_UNSET = object()
+
+def _model_name(model: str) -> str:
+    """Nom complet attendu par le SDK (préfixe models/)"""
+    return model if model.startswith("models/") else f"models/{model}"
+
+class LLMProvider:
+    """Clients LLM partagés entre sessions Streamlit, indexés par configuration"""
+
     def __init__(self):
-        """Initialise le gestionnaire LLM"""
-        self.llm = None
-        self._initialize_llm()
-    
-    def _initialize_llm(self):
-        """Initialise le modèle LLM avec gestion d'erreur"""
-        try:
-            self.llm = ChatGoogleGenerativeAI(
-                model="gemini-1.5-flash",
-                temperature=0,
+        self._base: Optional["ChatGoogleGenerativeAI"] = None
+        self._clients: Dict[LLMConfigKey, "ChatGoogleGenerativeAI"] = {}
+        self._lock = threading.Lock()
+
+    def _get_base(self) -> "ChatGoogleGenerativeAI":
+        """Client de base (appelé sous verrou) : seul à ouvrir un transport"""
+        if self._base is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            # Timeout explicite et pas de retries internes au SDK (6 par défaut) :
+            # les retries sont budgétés par infrastructure.resilience
+            self._base = ChatGoogleGenerativeAI(
+                model=settings.llm_model,
+                temperature=settings.llm_temperature,
+                max_output_tokens=settings.llm_max_tokens,
+                timeout=settings.llm_request_timeout,
+                max_retries=0,
                 google_api_key=settings.google_api_key
             )
-            logger.info("LLM initialisé avec succès", model="gemini-1.5-flash")
-        except Exception as e:
-            logger.error("Erreur lors de l'initialisation du LLM", error=str(e))
-            self.llm = None
-    
+        return self._base
+
+    def get(self, model: str = None, temperature: float = None,
+            max_tokens: Optional[int] = _UNSET) -> "ChatGoogleGenerativeAI":
+        """
+        Client partagé pour cette configuration (créé une seule fois)
+
+        Valeurs omises : celles des settings ; max_tokens=None retire le plafond.
+        """
+        key = (
+            _model_name(model or settings.llm_model),
+            float(settings.llm_temperature if temperature is None else temperature),
+            settings.llm_max_tokens if max_tokens is _UNSET else max_tokens,
+        )
+        llm = self._clients.get(key)
+        if llm is not None:
+            return llm
+
+        with self._lock:
+            # Double vérification : un autre thread a pu créer le client entre-temps
+            llm = self._clients.get(key)
+            if llm is None:
+                llm = self._get_base().model_copy(update={
+                    "model": key[0],
+                    "temperature": key[1],
+                    "max_output_tokens": key[2]
+                })
+                self._clients[key] = llm
+                logger.info("LLM client created", model=key[0],
+                            temperature=key[1], max_tokens=key[2])
+        return llm
+
+    def from_config(self, config: Optional[Dict[str, Any]]) -> "ChatGoogleGenerativeAI":
+        """Client correspondant à st.session_state.llm_config (model, temperature, max_tokens)"""
+        config = config or {}
+        return self.get(config.get("model"), config.get("temperature"),
+                        config.get("max_tokens", _UNSET))
+
+    def fallback_for(self, llm) -> Optional["ChatGoogleGenerativeAI"]:
+        """
+        Client du niveau supérieur (llm_fallback_model), même température et
+        même plafond ; None si llm est déjà au dernier niveau ou n'est pas
+        un client de ce fournisseur
+        """
+        if not settings.llm_fallback_model:
+            return None
+        key = get_llm_config_key(llm)
+        if key not in self._clients or key[0] == _model_name(settings.llm_fallback_model):
+            return None
+        return self.get(settings.llm_fallback_model, key[1], key[2])
+
     def generate_sql(self, question: str, schema_info: str = "") -> str:
         """Génère une requête SQL à partir d'une question en langage naturel"""
-        if not self.llm:
-            raise ValueError("LLM non initialisé")
-        
         prompt = f"""
         Convertis cette question en requête SQL valide.
-        
+
         Question: {question}
-        
+
         Schéma de base de données: {schema_info}
-        
+
         Réponds uniquement avec la requête SQL, sans explication.
         """
-        
+
+        llm = self.get()
         try:
-            response = self.llm.invoke(prompt)
+            response = call_llm(lambda: llm.invoke(prompt))
             return response.content.strip()
         except Exception as e:
             logger.error("Erreur lors de la génération SQL", error=str(e), question=question)
             raise
-    
+
     def is_available(self) -> bool:
-        """Vérifie si le LLM est disponible"""
-        return self.llm is not None
+        """Vérifie si le client LLM peut être créé (clé API, SDK)"""
+        try:
+            self.get()
+            return True
+        except Exception as e:
+            logger.error("Erreur lors de l'initialisation du LLM", error=str(e))
+            return False
 
-def init_llm():
-    """Fonction legacy pour compatibilité"""
-    return ChatGoogleGenerativeAI(
-        model="gemini-1.5-flash",
-        temperature=0,
-        google_api_key=settings.google_api_key
+# Alias legacy
+LLMManager = LLMProvider
+
+# Instance globale
+llm_provider = LazyProxy(LLMProvider, "llm_provider")
+
+def get_llm(model: str = None, temperature: float = None,
+            max_tokens: Optional[int] = _UNSET) -> "ChatGoogleGenerativeAI":
+    """Retourne le client LLM partagé pour cette configuration"""
+    return llm_provider.get(model, temperature, max_tokens)
+
+def get_llm_config_key(llm) -> LLMConfigKey:
+    """Identifie la configuration effective d'un client LLM (modèle, température, max_tokens)"""
+    return (
+        str(getattr(llm, "model", type(llm).__name__)),
+        float(getattr(llm, "temperature", 0.0) or 0.0),
+        getattr(llm, "max_output_tokens", None),
     )
+
+def init_llm():
+    """Fonction legacy pour compatibilité (retourne le client partagé)"""
+    return get_llm()
@@ -1,41 +1,212 @@
 """
 Logging structuré pour la production
+
+Les threads appelants ne font que filtrer, horodater et déposer l'événement
+dans une file bornée ; un thread dédié rend le JSON (orjson si disponible)
+et écrit les lignes par lots. Un stdout lent ne bloque donc plus les
+requêtes : si la file est pleine, l'événement est abandonné et compté.
 """
-import structlog
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, TextIO
+import structlog
+from infrastructure.lazy import LazyProxy
 from infrastructure.settings import settings
 
+try:
+    import orjson
+except ImportError:  # Dépendance optionnelle
+    orjson = None
+
+# Niveaux jamais échantillonnés
+_ALWAYS_LOGGED = {"warning", "error", "critical", "exception"}
+
+def _dumps(event_dict: Dict[str, Any], **kwargs) -> str:
+    if orjson is not None:
+        return orjson.dumps(event_dict, default=str).decode("utf-8")
+    return json.dumps(event_dict, default=str, ensure_ascii=False)
+
+def cap_field_sizes(logger, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Tronque les valeurs textuelles trop longues (question, SQL, erreurs...)"""
+    max_length = settings.log_max_field_length
+    for key, value in event_dict.items():
+        if key != "exception" and isinstance(value, str) and len(value) > max_length:
+            event_dict[key] = f"{value[:max_length]}...[+{len(value) - max_length} chars]"
+    return event_dict
+
+def sample_events(logger, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Échantillonnage par événement (log_sample_rates) ; avertissements et erreurs conservés"""
+    rate = settings.log_sample_rates.get(event_dict.get("event"))
+    if rate is None or method_name in _ALWAYS_LOGGED:
+        return event_dict
+    if random.random() >= rate:
+        raise structlog.DropEvent
+    event_dict["sample_rate"] = rate
+    return event_dict
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler qui ne bloque jamais et ne formate rien
+
+    Le rendu est laissé au thread d'écriture ; file pleine = événement
+    abandonné (compté dans dropped).
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class BatchedLogWriter:
+    """Thread d'écriture : vide la file par lots et écrit en un seul appel"""
+
+    def __init__(self, log_queue: queue.Queue, formatter: logging.Formatter,
+                 stream: TextIO, batch_size: int, flush_interval: float):
+        self.queue = log_queue
+        self.formatter = formatter
+        self.stream = stream
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.handler: Optional[NonBlockingQueueHandler] = None
+        self._reported_dropped = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="log-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _drain(self, timeout: float, linger: bool = True) -> List[logging.LogRecord]:
+        """
+        Attend un premier événement puis complète le lot (au plus batch_size),
+        pendant flush_interval au plus si linger
+        """
+        try:
+            batch = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + (self.flush_interval if linger else 0)
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[logging.LogRecord]):
+        lines = []
+        dropped = self.handler.dropped if self.handler is not None else 0
+        if dropped > self._reported_dropped:
+            lines.append(_dumps({"event": "Log events dropped, queue full", "level": "warning",
+                                 "count": dropped - self._reported_dropped}))
+            self._reported_dropped = dropped
+        for record in batch:
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception as e:
+                lines.append(_dumps({"event": "Log record formatting failed", "error": str(e)}))
+        try:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+        except (OSError, ValueError):
+            pass  # flux fermé : rien de mieux à faire
+
+    def _loop(self):
+        while not self._stop.is_set():
+            batch = self._drain(timeout=self.flush_interval)
+            if batch:
+                self._write(batch)
+
+    def stop(self, timeout: float = 2.0):
+        """Arrête le thread puis écrit ce qui reste en file"""
+        self._stop.set()
+        self._thread.join(timeout)
+        while True:
+            batch = self._drain(timeout=0, linger=False)
+            if not batch:
+                break
+            self._write(batch)
+
 def setup_logging():
     """Configure structured logging"""
-    
-    # Configuration de structlog
+
+    renderer = (structlog.processors.JSONRenderer(serializer=_dumps) if settings.log_format == "json"
+                else structlog.dev.ConsoleRenderer())
+
+    # Configuration de structlog (étapes exécutées dans le thread appelant)
     structlog.configure(
         processors=[
+            # trace_id / span liés par infrastructure.tracing
+            structlog.contextvars.merge_contextvars,
             structlog.stdlib.filter_by_level,
+            sample_events,
             structlog.stdlib.add_logger_name,
             structlog.stdlib.add_log_level,
             structlog.stdlib.PositionalArgumentsFormatter(),
             structlog.processors.TimeStamper(fmt="iso"),
             structlog.processors.StackInfoRenderer(),
             structlog.processors.format_exc_info,
-            structlog.processors.UnicodeDecoder(),
-            structlog.processors.JSONRenderer() if settings.log_format == "json" else structlog.dev.ConsoleRenderer()
+            cap_field_sizes,
+            # Rendu différé au formatter (thread d'écriture)
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter
         ],
         context_class=dict,
-        logger_factory=structlog.stdlib.LoggerFactory(),
+        # Le logger est créé via le LazyProxy : son module ne doit pas servir de nom
+        logger_factory=structlog.stdlib.LoggerFactory(ignore_frame_names=["infrastructure.lazy"]),
         wrapper_class=structlog.stdlib.BoundLogger,
         cache_logger_on_first_use=True,
     )
-    
-    # Configuration du logging standard
-    logging.basicConfig(
-        format="%(message)s",
-        stream=sys.stdout,
-        level=getattr(logging, settings.log_level)
+
+    # Même rendu pour les logs des bibliothèques (uvicorn, sqlalchemy...)
+    formatter = structlog.stdlib.ProcessorFormatter(
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            structlog.processors.UnicodeDecoder(),
+            renderer
+        ],
+        foreign_pre_chain=[
+            structlog.stdlib.add_logger_name,
+            structlog.stdlib.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso"),
+            structlog.processors.format_exc_info
+        ]
     )
-    
+
+    # Configuration du logging standard
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, settings.log_level))
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    if settings.log_async:
+        log_queue = queue.Queue(maxsize=settings.log_queue_size)
+        writer = BatchedLogWriter(log_queue, formatter, sys.stdout,
+                                  settings.log_batch_size, settings.log_flush_interval)
+        writer.handler = NonBlockingQueueHandler(log_queue)
+        writer.start()
+        atexit.register(writer.stop)
+        root.addHandler(writer.handler)
+    else:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+
     return structlog.get_logger()
 
-# Logger global
-logger = setup_logging()
+# Logger global (configuré au premier log)
+logger = LazyProxy(setup_logging, "logger")
@@ -0,0 +1,396 @@
+"""
+Export des métriques au format OpenMetrics (Prometheus)
+
+Chaque processus publie périodiquement un snapshot JSON dans
+metrics_multiproc_dir ; l'exporteur fusionne ces snapshots (compteurs et
+histogrammes additionnés) pour servir une vue unique de tous les workers.
+Les snapshots des processus terminés sont cumulés dans retired.json puis
+supprimés : les compteurs restent monotones sans que le répertoire grossisse.
+"""
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from infrastructure.monitoring import LatencyHistogram, metrics, system_sampler
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+
+try:
+    import fcntl
+except ImportError:  # Hors POSIX : pas de cumul, les snapshots sont conservés
+    fcntl = None
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PREFIX = "texttosql"
+
+# Bornes des buckets exportés (secondes)
+BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+COUNTERS = {
+    "requests": "Requêtes traitées",
+    "request_errors": "Requêtes en erreur",
+    "sql_generations": "Générations SQL effectuées par le LLM",
+    "cache_hits": "Hits du cache",
+    "cache_misses": "Miss du cache",
+    "cache_evictions": "Entrées évincées du cache"
+}
+
+RETIRED_FILE = "retired.json"
+_MAX_FOLDED_IDS = 1000
+
+_instance: Tuple[int, str] = (0, "")
+
+def instance_id() -> str:
+    """Identifiant du processus courant, unique même si le pid est réutilisé (fork compris)"""
+    global _instance
+    pid = os.getpid()
+    if _instance[0] != pid:
+        _instance = (pid, f"{pid}-{uuid.uuid4().hex[:12]}")
+    return _instance[1]
+
+def collect_snapshot() -> Dict[str, Any]:
+    """Snapshot du processus courant : compteurs, histogrammes et jauges"""
+    snapshot = metrics.snapshot()
+    snapshot["pid"] = os.getpid()
+    snapshot["instance"] = instance_id()
+    snapshot["written_at"] = time.time()
+
+    gauges = {"uptime_seconds": time.time() - metrics.start_time}
+    try:
+        from infrastructure.cache import cache_manager
+        from infrastructure.rate_limit import rate_limiter
+        cache_stats = cache_manager.get_stats()
+        gauges["cache_entries"] = cache_stats["entries"]
+        gauges["cache_bytes"] = cache_stats["bytes"]
+        gauges["rate_limit_queue_depth"] = rate_limiter.queue_depth
+
+        from infrastructure.database import db_manager
+        pool_stats = db_manager.get_pool_stats() if db_manager.is_initialized else None
+        if pool_stats:
+            for name in ("size", "checked_out", "idle", "overflow"):
+                gauges[f"db_pool_{name}"] = pool_stats[name]
+
+        # 1 si le disjoncteur de la dépendance est ouvert (somme : processus concernés)
+        from infrastructure.resilience import OPEN, get_breaker_stats
+        for dependency, breaker_stats in get_breaker_stats().items():
+            gauges[f"circuit_{dependency}_open"] = int(breaker_stats["state"] == OPEN)
+    except Exception as e:
+        logger.debug("Gauge collection failed", error=str(e))
+    snapshot["gauges"] = gauges
+    return snapshot
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+def _is_live(snapshot: Dict[str, Any]) -> bool:
+    """Processus vivant : pid existant et snapshot récent (le pid a pu être réutilisé)"""
+    if snapshot.get("retired"):
+        return False
+    if snapshot.get("instance") == instance_id():
+        return True
+    max_age = max(60.0, 10 * settings.metrics_flush_interval)
+    return time.time() - snapshot.get("written_at", 0) < max_age and _pid_alive(snapshot["pid"])
+
+def _write_json(path: str, data: Dict[str, Any]):
+    """Écriture atomique (fichier temporaire puis rename)"""
+    tmp_path = f"{path}.{instance_id()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None  # fichier absent ou en cours de remplacement
+
+def _snapshot_paths(directory: str) -> List[str]:
+    return [path for path in glob.glob(os.path.join(directory, "*.json"))
+            if os.path.basename(path) != RETIRED_FILE]
+
+def _merge_into(target: Dict[str, Any], snapshot: Dict[str, Any]):
+    """Ajoute compteurs et histogrammes d'un snapshot à target (format snapshot)"""
+    counters = target.setdefault("counters", {})
+    for name, value in snapshot["counters"].items():
+        counters[name] = counters.get(name, 0) + value
+
+    if target.get("request_latency") is None:
+        target["request_latency"] = snapshot["request_latency"]
+    else:
+        histogram = LatencyHistogram.from_dict(target["request_latency"])
+        histogram.merge_dict(snapshot["request_latency"])
+        target["request_latency"] = histogram.to_dict()
+
+    stages = {(e["stage"], e["model"], e["language"]): e for e in target.setdefault("stage_latencies", [])}
+    for entry in snapshot["stage_latencies"]:
+        key = (entry["stage"], entry["model"], entry["language"])
+        if key in stages:
+            histogram = LatencyHistogram.from_dict(stages[key]["histogram"])
+            histogram.merge_dict(entry["histogram"])
+            stages[key]["histogram"] = histogram.to_dict()
+        else:
+            stages[key] = dict(entry)
+    target["stage_latencies"] = list(stages.values())
+
+def fold_retired(directory: str) -> int:
+    """
+    Cumule les snapshots des processus terminés dans retired.json puis les supprime
+
+    Sous verrou de fichier (un seul processus à la fois) ; les instances
+    cumulées sont mémorisées pour ne jamais compter deux fois un snapshot
+    relu avant sa suppression. Retourne le nombre de snapshots cumulés.
+    """
+    if fcntl is None:
+        return 0
+    with open(os.path.join(directory, "retired.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        retired_path = os.path.join(directory, RETIRED_FILE)
+        retired = _read_json(retired_path) or {
+            "pid": 0, "retired": True, "counters": {}, "request_latency": None,
+            "stage_latencies": [], "folded": []
+        }
+        folded = set(retired["folded"])
+        dead = []
+        for path in _snapshot_paths(directory):
+            snapshot = _read_json(path)
+            if snapshot is None or _is_live(snapshot):
+                continue
+            if snapshot.get("instance") not in folded:
+                _merge_into(retired, snapshot)
+                retired["folded"].append(snapshot.get("instance"))
+            dead.append(path)
+        if not dead:
+            return 0
+        retired["folded"] = retired["folded"][-_MAX_FOLDED_IDS:]
+        retired["written_at"] = time.time()
+        # retired.json d'abord : un snapshot supprimé est toujours déjà cumulé
+        _write_json(retired_path, retired)
+        for path in dead:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    logger.info("Retired metrics snapshots folded", count=len(dead))
+    return len(dead)
+
+class SnapshotWriter:
+    """Écrit le snapshot du processus dans le répertoire partagé, à intervalle fixe"""
+
+    def __init__(self, directory: str, interval: float = None):
+        self.directory = directory
+        self.interval = interval or settings.metrics_flush_interval
+        # pid + identifiant aléatoire : un pid réutilisé n'écrase pas un ancien snapshot
+        self.path = os.path.join(directory, f"{instance_id()}.json")
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._loop, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+            try:
+                fold_retired(self.directory)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Retired metrics fold failed", error=str(e))
+
+    def flush(self):
+        """Écriture atomique du snapshot du processus"""
+        try:
+            _write_json(self.path, collect_snapshot())
+        except OSError as e:
+            logger.warning("Metrics snapshot write failed", error=str(e))
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+def load_snapshots(directory: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Snapshot du processus courant + ceux des autres processus et le cumul
+    des processus terminés (répertoire partagé)
+    """
+    snapshots = [collect_snapshot()]
+    if not directory:
+        return snapshots
+    own = instance_id()
+    others = []
+    for path in _snapshot_paths(directory):
+        snapshot = _read_json(path)
+        if snapshot is not None and snapshot.get("instance") != own:
+            others.append(snapshot)
+    # Lu après les snapshots : ceux déjà cumulés (puis supprimés) sont écartés
+    retired = _read_json(os.path.join(directory, RETIRED_FILE))
+    if retired is not None:
+        folded = set(retired.get("folded", []))
+        others = [s for s in others if s.get("instance") not in folded]
+        others.append(retired)
+    return snapshots + others
+
+def aggregate(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Fusionne les snapshots : compteurs et histogrammes additionnés (processus
+    terminés compris, pour que les compteurs restent monotones), jauges de
+    processus additionnées sur les processus vivants uniquement
+    """
+    counters: Dict[str, float] = {name: 0 for name in COUNTERS}
+    gauges: Dict[str, float] = {}
+    request_latency: Optional[LatencyHistogram] = None
+    stages: Dict[Tuple[str, str, str], LatencyHistogram] = {}
+
+    for snapshot in snapshots:
+        for name, value in snapshot["counters"].items():
+            counters[name] = counters.get(name, 0) + value
+
+        data = snapshot["request_latency"]
+        if data is not None:
+            if request_latency is None:
+                request_latency = LatencyHistogram.from_dict(data)
+            else:
+                request_latency.merge_dict(data)
+
+        for entry in snapshot["stage_latencies"]:
+            key = (entry["stage"], entry["model"], entry["language"])
+            if key in stages:
+                stages[key].merge_dict(entry["histogram"])
+            else:
+                stages[key] = LatencyHistogram.from_dict(entry["histogram"])
+
+        if _is_live(snapshot):
+            for name, value in snapshot.get("gauges", {}).items():
+                gauges[name] = gauges.get(name, 0) + value
+
+    gauges["processes"] = sum(1 for s in snapshots if _is_live(s))
+    return {"counters": counters, "gauges": gauges,
+            "request_latency": request_latency, "stages": stages}
+
+def _labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), chr(92) + "n")}"'
+        for k, v in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+def _histogram_lines(name: str, histogram: LatencyHistogram, labels: Dict[str, str]) -> List[str]:
+    lines = []
+    counts = histogram.cumulative_counts([b * 1000 for b in BUCKETS_SECONDS])
+    for bound, count in zip(BUCKETS_SECONDS, counts):
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {count}")
+    lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+    lines.append(f"{name}_sum{_labels(labels)} {histogram.total / 1000}")
+    return lines
+
+def render_openmetrics(aggregated: Dict[str, Any]) -> str:
+    """Exposition texte OpenMetrics"""
+    lines = []
+    for name, help_text in COUNTERS.items():
+        metric = f"{PREFIX}_{name}"
+        lines += [f"# TYPE {metric} counter", f"# HELP {metric} {help_text}",
+                  f"{metric}_total {aggregated['counters'].get(name, 0)}"]
+
+    for name, value in sorted(aggregated["gauges"].items()):
+        metric = f"{PREFIX}_{name}"
+        lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+
+    # Jauges système : échantillon en cache, communes à l'hôte
+    system = system_sampler.get()
+    for name in ("cpu_usage_percent", "memory_usage_percent", "memory_available_bytes",
+                 "disk_usage_percent", "disk_free_bytes"):
+        metric = f"{PREFIX}_system_{name}"
+        lines += [f"# TYPE {metric} gauge", f"{metric} {system[name]}"]
+
+    metric = f"{PREFIX}_request_duration_seconds"
+    lines += [f"# TYPE {metric} histogram", f"# HELP {metric} Durée des requêtes"]
+    lines += _histogram_lines(metric, aggregated["request_latency"], {})
+
+    metric = f"{PREFIX}_stage_duration_seconds"
+    lines += [f"# TYPE {metric} histogram",
+              f"# HELP {metric} Durée de chaque étape question -> résultat"]
+    for (stage, model, language), histogram in sorted(aggregated["stages"].items()):
+        lines += _histogram_lines(metric, histogram,
+                                  {"stage": stage, "model": model, "language": language})
+
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+def render_metrics() -> str:
+    """Vue agrégée de tous les processus, au format OpenMetrics"""
+    return render_openmetrics(aggregate(load_snapshots(settings.metrics_multiproc_dir)))
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # pas de log par scrape
+
+class MetricsExporter:
+    """Serveur HTTP /metrics dans un thread d'arrière-plan + écriture des snapshots"""
+
+    def __init__(self):
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.writer: Optional[SnapshotWriter] = None
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """Démarre l'export (idempotent) ; un seul processus obtient le port"""
+        with self._lock:
+            if self._started or not settings.metrics_enabled:
+                return
+            self._started = True
+
+            if settings.metrics_multiproc_dir:
+                self.writer = SnapshotWriter(settings.metrics_multiproc_dir)
+                self.writer.start()
+
+            try:
+                self.server = ThreadingHTTPServer((settings.metrics_host, settings.metrics_port),
+                                                  _MetricsHandler)
+            except OSError as e:
+                # Port déjà servi par un autre worker : il agrège nos snapshots
+                logger.info("Metrics endpoint not started in this process", error=str(e))
+                return
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, name="metrics-exporter",
+                             daemon=True).start()
+            logger.info("Metrics endpoint started", port=settings.metrics_port)
+
+    def stop(self):
+        with self._lock:
+            if self.server is not None:
+                self.server.shutdown()
+                self.server.server_close()
+                self.server = None
+            if self.writer is not None:
+                self.writer.stop()
+                self.writer = None
+            self._started = False
+
+# Instance globale
+metrics_exporter = MetricsExporter()
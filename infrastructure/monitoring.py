@@ -1,102 +1,382 @@
 """
 Monitoring et métriques pour la production
 """
+import itertools
+import math
+import random
+import threading
 import time
-import psutil
-from typing import Dict, Any
+import weakref
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+from infrastructure.lazy import LazyProxy
 from infrastructure.logging import logger
 from infrastructure.settings import settings
 
+class LatencyHistogram:
+    """
+    Histogramme de latences à buckets logarithmiques (style HDR)
+
+    L'erreur relative sur chaque centile est bornée par relative_accuracy,
+    de la microseconde à l'heure, avec quelques centaines de buckets au plus.
+    """
+    
+    def __init__(self, relative_accuracy: float = 0.01, min_value_ms: float = 0.001):
+        self.relative_accuracy = relative_accuracy
+        self.min_value_ms = min_value_ms
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.counts: Dict[int, int] = {}
+        self.zero_count = 0  # valeurs sous min_value_ms
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+    
+    def _index(self, value_ms: float) -> int:
+        return math.ceil(math.log(value_ms) / self._log_gamma)
+    
+    def _bucket_value(self, index: int) -> float:
+        """Valeur représentative d'un bucket (erreur relative <= relative_accuracy)"""
+        return 2 * self._gamma ** index / (self._gamma + 1)
+    
+    def record(self, value_ms: float):
+        """Enregistre une latence en millisecondes"""
+        # Index calculé hors verrou : section critique minimale
+        index = self._index(value_ms) if value_ms > self.min_value_ms else None
+        with self._lock:
+            if index is None:
+                self.zero_count += 1
+            else:
+                self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.total += value_ms
+            if value_ms > self.max:
+                self.max = value_ms
+    
+    def percentile(self, p: float) -> float:
+        """Estimation du p-ième centile (ms)"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = p / 100 * (self.count - 1)
+            cumulative = self.zero_count
+            if cumulative > rank:
+                return 0.0
+            for index in sorted(self.counts):
+                cumulative += self.counts[index]
+                if cumulative > rank:
+                    return min(self._bucket_value(index), self.max)
+            return self.max
+    
+    def cumulative_counts(self, bounds_ms: Sequence[float]) -> List[int]:
+        """Nombre de valeurs <= chaque borne (buckets cumulatifs façon Prometheus)"""
+        with self._lock:
+            # Bucket i : valeurs dans ]gamma^(i-1), gamma^i]
+            items = sorted(self.counts.items())
+            zero_count = self.zero_count
+        result = []
+        for bound in bounds_ms:
+            total = zero_count
+            for index, bucket_count in items:
+                if self._gamma ** index > bound:
+                    break
+                total += bucket_count
+            result.append(total)
+        return result
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """État sérialisable (JSON), fusionnable entre processus"""
+        with self._lock:
+            return {
+                "relative_accuracy": self.relative_accuracy,
+                "min_value_ms": self.min_value_ms,
+                "counts": {str(index): n for index, n in self.counts.items()},
+                "zero_count": self.zero_count,
+                "count": self.count,
+                "total": self.total,
+                "max": self.max
+            }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        histogram = cls(data["relative_accuracy"], data["min_value_ms"])
+        histogram.merge_dict(data)
+        return histogram
+    
+    def merge_dict(self, data: Dict[str, Any]):
+        """Ajoute un histogramme sérialisé de même précision (fusion exacte)"""
+        with self._lock:
+            for index, n in data["counts"].items():
+                self.counts[int(index)] = self.counts.get(int(index), 0) + n
+            self.zero_count += data["zero_count"]
+            self.count += data["count"]
+            self.total += data["total"]
+            self.max = max(self.max, data["max"])
+    
+    def summary(self) -> Dict[str, float]:
+        """Nombre, moyenne, p50/p95/p99 et maximum (ms)"""
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max
+        }
+
+class SystemSampler:
+    """
+    Échantillonne CPU, mémoire et disque dans un thread dédié
+
+    Les lectures (get_metrics, exporter) ne paient jamais d'appel psutil.
+    """
+    
+    def __init__(self, interval: float = None):
+        self.interval = interval or settings.metrics_system_interval
+        self.sample: Dict[str, float] = {}
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def _take_sample(self):
+        import psutil
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        self.sample = {
+            # Non bloquant : utilisation depuis l'échantillon précédent
+            "cpu_usage_percent": psutil.cpu_percent(interval=None),
+            "memory_usage_percent": memory.percent,
+            "memory_available_bytes": memory.available,
+            "disk_usage_percent": disk.percent,
+            "disk_free_bytes": disk.free,
+            "sampled_at": time.time()
+        }
+    
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self._take_sample()
+            except Exception as e:
+                logger.warning("System sampling failed", error=str(e))
+    
+    def get(self) -> Dict[str, float]:
+        """Dernier échantillon (le premier est pris au premier appel)"""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._take_sample()
+                    self._thread = threading.Thread(target=self._loop, name="system-sampler", daemon=True)
+                    self._thread.start()
+        return self.sample
+
+# Instance globale
+system_sampler = LazyProxy(SystemSampler, "system_sampler")
+
+class _ShardOwner:
+    """Détenu par le thread-local : sa disparition signale la fin du thread"""
+    __slots__ = ("__weakref__",)
+
+class ShardedCounters:
+    """
+    Compteurs répartis par thread, additionnés à la lecture
+
+    Chaque thread n'écrit que dans sa propre tranche : pas de verrou ni de
+    mise à jour perdue sur le chemin chaud. La tranche d'un thread terminé
+    (Streamlit crée un thread par exécution de script) est reportée dans les
+    totaux puis libérée.
+    """
+    
+    def __init__(self, names: Sequence[str]):
+        self.names = tuple(names)
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self._local = threading.local()
+        self._shards: Dict[int, List[float]] = {}
+        self._retired: List[float] = [0] * len(self.names)
+        self._ids = itertools.count()
+        self._lock = threading.RLock()
+    
+    def _new_shard(self) -> List[float]:
+        shard = [0] * len(self.names)
+        shard_id = next(self._ids)
+        owner = _ShardOwner()
+        weakref.finalize(owner, self._retire, shard_id).atexit = False
+        with self._lock:
+            self._shards[shard_id] = shard
+        self._local.shard = shard
+        self._local.owner = owner
+        return shard
+    
+    def _retire(self, shard_id: int):
+        with self._lock:
+            shard = self._shards.pop(shard_id, None)
+            if shard is not None:
+                for i, value in enumerate(shard):
+                    self._retired[i] += value
+    
+    def add(self, name: str, value: float = 1):
+        """Incrémente un compteur (tranche du thread courant)"""
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        shard[self._index[name]] += value
+    
+    def values(self) -> Dict[str, float]:
+        """Totaux courants, toutes tranches confondues"""
+        with self._lock:
+            totals = list(self._retired)
+            shards = list(self._shards.values())
+        for shard in shards:
+            for i, value in enumerate(shard):
+                totals[i] += value
+        return dict(zip(self.names, totals))
+    
+    @property
+    def shard_count(self) -> int:
+        return len(self._shards)
+
 class MetricsCollector:
-    """Collecteur de métriques pour le monitoring"""
+    """
+    Collecteur de métriques pour le monitoring
+
+    Appelé depuis tous les threads (sessions Streamlit, workers API) :
+    compteurs par thread et log des requêtes échantillonné.
+    """
     
-    def __init__(self):
+    COUNTERS = ("requests", "request_errors", "response_time_total", "sql_generations",
+                "cache_hits", "cache_misses", "cache_evictions")
+    
+    def __init__(self, log_sample_rate: float = None):
         self.start_time = time.time()
-        self.request_count = 0
-        self.error_count = 0
-        self.total_response_time = 0.0
-        self.sql_generation_count = 0
-        self.cache_hits = 0
-        self.cache_misses = 0
+        self.counters = ShardedCounters(self.COUNTERS)
+        self.log_sample_rate = settings.metrics_log_sample_rate if log_sample_rate is None else log_sample_rate
+        self.request_latency = LatencyHistogram()
+        # (étape, modèle, langue) -> histogramme
+        self.stage_latencies: Dict[Tuple[str, str, str], LatencyHistogram] = {}
+        self._lock = threading.Lock()
     
     def record_request(self, response_time: float, success: bool = True):
         """Enregistre une requête"""
-        self.request_count += 1
-        self.total_response_time += response_time
+        add = self.counters.add
+        add("requests")
+        add("response_time_total", response_time)
+        self.request_latency.record(response_time * 1000)
         
         if not success:
-            self.error_count += 1
+            add("request_errors")
         
-        logger.info("Request recorded",
-                   response_time=response_time,
-                   success=success,
-                   total_requests=self.request_count)
+        # Erreurs toujours loggées ; succès échantillonnés
+        if not success or random.random() < self.log_sample_rate:
+            logger.info("Request recorded",
+                       response_time=response_time,
+                       success=success,
+                       sample_rate=1.0 if not success else self.log_sample_rate)
     
     def record_sql_generation(self):
         """Enregistre une génération SQL"""
-        self.sql_generation_count += 1
+        self.counters.add("sql_generations")
+    
+    def record_stage(self, stage: str, duration_ms: float,
+                     model: Optional[str] = None, language: Optional[str] = None):
+        """Enregistre la durée d'une étape, étiquetée par modèle et langue"""
+        key = (stage, model or "unknown", language or "unknown")
+        histogram = self.stage_latencies.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stage_latencies.setdefault(key, LatencyHistogram())
+        histogram.record(duration_ms)
+    
+    def get_stage_metrics(self) -> List[Dict[str, Any]]:
+        """Centiles par étape, modèle et langue"""
+        return [
+            {"stage": stage, "model": model, "language": language, **histogram.summary()}
+            for (stage, model, language), histogram in sorted(list(self.stage_latencies.items()))
+        ]
     
     def record_cache_hit(self):
         """Enregistre un hit cache"""
-        self.cache_hits += 1
+        self.counters.add("cache_hits")
     
     def record_cache_miss(self):
         """Enregistre un miss cache"""
-        self.cache_misses += 1
+        self.counters.add("cache_misses")
+    
+    def record_cache_eviction(self):
+        """Enregistre une éviction cache"""
+        self.counters.add("cache_evictions")
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """État brut sérialisable (compteurs + histogrammes) pour l'export multi-processus"""
+        counters = self.counters.values()
+        del counters["response_time_total"]  # couvert par l'histogramme
+        return {
+            "start_time": self.start_time,
+            "counters": counters,
+            "request_latency": self.request_latency.to_dict(),
+            "stage_latencies": [
+                {"stage": stage, "model": model, "language": language,
+                 "histogram": histogram.to_dict()}
+                for (stage, model, language), histogram in list(self.stage_latencies.items())
+            ]
+        }
     
     def get_metrics(self) -> Dict[str, Any]:
         """Retourne les métriques actuelles"""
         uptime = time.time() - self.start_time
-        avg_response_time = self.total_response_time / self.request_count if self.request_count > 0 else 0
+        counters = self.counters.values()
+        requests = counters["requests"]
+        avg_response_time = counters["response_time_total"] / requests if requests > 0 else 0
         
-        # Métriques système
-        memory_usage = psutil.virtual_memory()
-        cpu_usage = psutil.cpu_percent()
+        # Métriques système (échantillon en cache)
+        system = system_sampler.get()
         
         # Métriques cache
-        cache_hit_rate = self.cache_hits / (self.cache_hits + self.cache_misses) if (self.cache_hits + self.cache_misses) > 0 else 0
+        lookups = counters["cache_hits"] + counters["cache_misses"]
+        cache_hit_rate = counters["cache_hits"] / lookups if lookups > 0 else 0
         
         return {
             "uptime_seconds": uptime,
-            "requests_total": self.request_count,
-            "errors_total": self.error_count,
-            "error_rate": self.error_count / self.request_count if self.request_count > 0 else 0,
+            "requests_total": requests,
+            "errors_total": counters["request_errors"],
+            "error_rate": counters["request_errors"] / requests if requests > 0 else 0,
             "avg_response_time": avg_response_time,
-            "sql_generations_total": self.sql_generation_count,
-            "cache_hits": self.cache_hits,
-            "cache_misses": self.cache_misses,
+            "response_time_ms": self.request_latency.summary(),
+            "sql_generations_total": counters["sql_generations"],
+            "cache_hits": counters["cache_hits"],
+            "cache_misses": counters["cache_misses"],
             "cache_hit_rate": cache_hit_rate,
+            "cache_evictions": counters["cache_evictions"],
+            "stages": self.get_stage_metrics(),
             "system": {
-                "memory_usage_percent": memory_usage.percent,
-                "memory_available_mb": memory_usage.available / (1024 * 1024),
-                "cpu_usage_percent": cpu_usage
+                "memory_usage_percent": system["memory_usage_percent"],
+                "memory_available_mb": system["memory_available_bytes"] / (1024 * 1024),
+                "cpu_usage_percent": system["cpu_usage_percent"]
             }
         }
 
 # Instance globale
-metrics = MetricsCollector()
+metrics = LazyProxy(MetricsCollector, "metrics")
 
 def get_system_health() -> Dict[str, Any]:
     """Retourne l'état de santé du système"""
-    memory = psutil.virtual_memory()
-    disk = psutil.disk_usage('/')
+    system = system_sampler.get()
     
     return {
         "healthy": True,
         "checks": {
             "memory": {
-                "status": "healthy" if memory.percent < 80 else "warning",
-                "usage_percent": memory.percent,
-                "available_mb": memory.available / (1024 * 1024)
+                "status": "healthy" if system["memory_usage_percent"] < 80 else "warning",
+                "usage_percent": system["memory_usage_percent"],
+                "available_mb": system["memory_available_bytes"] / (1024 * 1024)
             },
             "disk": {
-                "status": "healthy" if disk.percent < 80 else "warning",
-                "usage_percent": disk.percent,
-                "free_gb": disk.free / (1024 * 1024 * 1024)
+                "status": "healthy" if system["disk_usage_percent"] < 80 else "warning",
+                "usage_percent": system["disk_usage_percent"],
+                "free_gb": system["disk_free_bytes"] / (1024 * 1024 * 1024)
             },
             "cpu": {
                 "status": "healthy",
-                "usage_percent": psutil.cpu_percent()
+                "usage_percent": system["cpu_usage_percent"]
             }
         }
     }
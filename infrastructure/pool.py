@@ -0,0 +1,190 @@
+"""
+Pool de connexions Redshift instrumenté et redimensionnable
+
+- pas de pre-ping à chaque checkout : un thread de maintenance vérifie
+  périodiquement les connexions inactives (SELECT 1) et invalide les mortes ;
+- préchauffage : quelques connexions ouvertes dès la création de l'engine ;
+- statistiques : attente au checkout, connexions utilisées, pic, timeouts ;
+- taille ajustée dans [db_pool_min_size, db_pool_max_size] selon le pic
+  de connexions simultanées observé.
+"""
+import math
+import threading
+import time
+from typing import Any, Dict, Optional
+from sqlalchemy import exc
+from sqlalchemy.pool import Pool, QueuePool
+from infrastructure.monitoring import LatencyHistogram
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+
+class ElasticQueuePool(QueuePool):
+    """QueuePool qui mesure l'attente au checkout et peut changer de taille à chaud"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_wait = LatencyHistogram()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.peak_checked_out = 0
+        self.resizes = 0
+        self._stats_lock = threading.Lock()
+
+    def connect(self):
+        start_time = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            self.checkout_wait.record((time.perf_counter() - start_time) * 1000)
+        checked_out = self.checkedout()
+        with self._stats_lock:
+            self.checkouts += 1
+            if checked_out > self.peak_checked_out:
+                self.peak_checked_out = checked_out
+        return connection
+
+    def connect_unrecorded(self):
+        """Checkout hors statistiques (maintenance, préchauffage)"""
+        return Pool.connect(self)
+
+    def take_peak(self) -> int:
+        """Pic de connexions simultanées depuis le dernier appel (remis au niveau actuel)"""
+        with self._stats_lock:
+            peak = self.peak_checked_out
+            self.peak_checked_out = self.checkedout()
+        return peak
+
+    def resize(self, pool_size: int, max_overflow: int = None):
+        """
+        Change la taille du pool sans fermer les connexions en cours
+
+        Le nombre de connexions ouvertes est conservé (overflow ajusté) ; en
+        réduction, les connexions inactives au-delà de la nouvelle taille sont
+        fermées.
+        """
+        with self._overflow_lock:
+            with self._pool.mutex:
+                excess = []
+                while len(self._pool.queue) > pool_size:
+                    excess.append(self._pool.queue.pop())
+                self._overflow -= (pool_size - self._pool.maxsize) + len(excess)
+                self._pool.maxsize = pool_size
+                if max_overflow is not None:
+                    self._max_overflow = max_overflow
+        for record in excess:
+            record.close()
+        self.resizes += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        size = self.size()
+        checked_out = self.checkedout()
+        return {
+            "size": size,
+            "max_overflow": self._max_overflow,
+            "checked_out": checked_out,
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "utilization": checked_out / size if size else 0.0,
+            "peak_checked_out": self.peak_checked_out,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "resizes": self.resizes,
+            "checkout_wait_ms": self.checkout_wait.summary()
+        }
+
+class PoolMaintainer:
+    """
+    Thread de maintenance du pool de l'engine : liveness et redimensionnement
+
+    Lit engine.pool à chaque tour (engine.dispose() remplace le pool).
+    """
+
+    def __init__(self, engine, interval: float = None):
+        self.engine = engine
+        self.interval = interval or settings.db_pool_maintenance_interval
+        self.min_size = settings.db_pool_min_size
+        self.max_size = max(settings.db_pool_max_size, self.min_size)
+        self.liveness_failures = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="db-pool-maintainer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check_liveness()
+                if settings.db_pool_adaptive:
+                    self.adjust_size()
+            except Exception as e:
+                logger.warning("Database pool maintenance failed", error=str(e))
+
+    def prewarm(self, count: int = None):
+        """Ouvre count connexions (simultanément détenues) puis les rend au pool"""
+        pool = self.engine.pool
+        count = min(count if count is not None else settings.db_pool_prewarm, pool.size())
+        start_time = time.time()
+        connections = []
+        try:
+            for _ in range(count):
+                connections.append(pool.connect_unrecorded())
+        except Exception as e:
+            logger.warning("Database pool prewarm failed", error=str(e), opened=len(connections))
+        finally:
+            for connection in connections:
+                connection.close()
+        if connections:
+            logger.info("Database pool prewarmed", connections=len(connections),
+                        duration_ms=round((time.time() - start_time) * 1000))
+
+    def check_liveness(self) -> int:
+        """
+        Ping des connexions inactives (ordre FIFO : chacune une fois par tour)
+
+        Une connexion qui ne répond pas est invalidée ; le pool en rouvrira
+        une au besoin. Retourne le nombre de connexions invalidées.
+        """
+        pool = self.engine.pool
+        invalidated = 0
+        for _ in range(pool.checkedin()):
+            connection = pool.connect_unrecorded()
+            try:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchall()
+                finally:
+                    cursor.close()
+            except Exception as e:
+                connection.invalidate(e)
+                invalidated += 1
+            finally:
+                connection.close()
+        if invalidated:
+            self.liveness_failures += invalidated
+            logger.warning("Dead pooled connections invalidated", count=invalidated)
+        return invalidated
+
+    def adjust_size(self):
+        """
+        Taille cible = pic observé + 25 %, bornée ; réduction d'une connexion
+        par tour au plus pour absorber les creux passagers
+        """
+        pool = self.engine.pool
+        peak = pool.take_peak()
+        size = pool.size()
+        target = min(max(math.ceil(peak * 1.25), self.min_size), self.max_size)
+        if target < size:
+            target = size - 1
+        if target != size:
+            pool.resize(target)
+            logger.info("Database pool resized", previous_size=size, size=target, peak=peak)
@@ -0,0 +1,294 @@
+"""
+Contrôle d'admission des appels LLM : token buckets par utilisateur et global,
+file d'attente équitable (round-robin entre utilisateurs) et statistiques
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict
+from infrastructure.lazy import LazyProxy
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+
+ANONYMOUS = "anonymous"
+# Identité des lots (batch_cli) : quota dédié rate_limit_batch_requests
+BATCH_USER = "batch"
+
+# Utilisateur courant (session Streamlit, client API...), hérité par les tâches asyncio
+current_user: contextvars.ContextVar[str] = contextvars.ContextVar("rate_limit_user", default=ANONYMOUS)
+
+class RateLimitExceeded(Exception):
+    """Demande refusée : quota utilisateur épuisé ou attente trop longue dans la file"""
+
+    def __init__(self, message: str, retry_after: float, reason: str):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.reason = reason
+
+class TokenBucket:
+    """Token bucket en mémoire : capacity jetons, rechargés à rate jetons/seconde"""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, tokens: float = 1) -> float:
+        """Consomme si possible ; retourne 0 si accordé, sinon l'attente en secondes"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    @property
+    def full(self) -> bool:
+        return self.tokens + (time.monotonic() - self.updated_at) * self.rate >= self.capacity
+
+class SharedTokenBucket:
+    """Token bucket partagé entre workers via Redis, avec repli local si Redis échoue"""
+
+    def __init__(self, redis_cache, key: str, capacity: float, rate: float):
+        self.redis_cache = redis_cache
+        self.key = key
+        self.capacity = capacity
+        self.rate = rate
+        self._fallback = TokenBucket(capacity, rate)
+
+    def take(self, tokens: float = 1) -> float:
+        wait = self.redis_cache.take_tokens(self.key, self.capacity, self.rate, tokens)
+        if wait is None:
+            return self._fallback.take(tokens)
+        return wait
+
+    @property
+    def full(self) -> bool:
+        # L'état vit dans Redis : l'objet local peut être oublié à tout moment
+        return True
+
+class _Waiter:
+    """Demande en file ; notify réveille le demandeur (thread ou tâche asyncio)"""
+
+    __slots__ = ("user", "enqueued_at", "granted", "event", "notify")
+
+    def __init__(self, user: str, event, notify):
+        self.user = user
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.event = event
+        self.notify = notify
+
+class RateLimiter:
+    """
+    Admission en deux temps : quota par utilisateur (refus immédiat),
+    puis débit global lissé par une file équitable entre utilisateurs
+    """
+
+    def __init__(self, user_requests: int = None, user_window: int = None,
+                 global_requests: int = None, global_window: int = None,
+                 global_burst: int = None, queue_timeout: float = None,
+                 redis_cache=None, max_users: int = 10000):
+        user_requests = user_requests or settings.rate_limit_requests
+        user_window = user_window or settings.rate_limit_window
+        global_requests = global_requests or settings.rate_limit_global_requests
+        global_window = global_window or settings.rate_limit_global_window
+        self.queue_timeout = queue_timeout if queue_timeout is not None else settings.rate_limit_queue_timeout
+
+        self._user_capacity = user_requests
+        self._user_rate = user_requests / user_window
+        self._batch_capacity = settings.rate_limit_batch_requests
+        self._batch_rate = self._batch_capacity / user_window
+        global_rate = global_requests / global_window
+        global_burst = global_burst or settings.rate_limit_global_burst
+        self._redis = redis_cache
+        self._global = (SharedTokenBucket(redis_cache, "rate:global", global_burst, global_rate)
+                        if redis_cache is not None else TokenBucket(global_burst, global_rate))
+
+        self._users: "OrderedDict[str, Any]" = OrderedDict()
+        self._max_users = max_users
+        # File équitable : une sous-file par utilisateur, servies à tour de rôle
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.max_queue_depth = 0
+        self._wait_times: Deque[float] = deque(maxlen=1000)
+
+    def _user_bucket(self, user: str):
+        bucket = self._users.get(user)
+        if bucket is None:
+            capacity, rate = ((self._batch_capacity, self._batch_rate) if user == BATCH_USER
+                              else (self._user_capacity, self._user_rate))
+            if self._redis is not None:
+                bucket = SharedTokenBucket(self._redis, f"rate:user:{user}", capacity, rate)
+            else:
+                bucket = TokenBucket(capacity, rate)
+            self._users[user] = bucket
+            if len(self._users) > self._max_users:
+                # Un bucket plein équivaut à un bucket neuf : on peut l'oublier
+                for name in [u for u, b in self._users.items() if b.full][:len(self._users) // 10 or 1]:
+                    del self._users[name]
+        else:
+            self._users.move_to_end(user)
+        return bucket
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _check_user_quota(self, user: str):
+        with self._lock:
+            bucket = self._user_bucket(user)
+        # Hors verrou : un bucket partagé fait un aller-retour Redis
+        wait = bucket.take()
+        if wait > 0:
+            self.rejected += 1
+            logger.warning("User rate limit exceeded", user=user, retry_after=round(wait, 1))
+            raise RateLimitExceeded("Too many requests for this user", wait, "user_quota")
+
+    def _enqueue(self, user: str, event, notify) -> _Waiter:
+        waiter = _Waiter(user, event, notify)
+        with self._lock:
+            self._queues.setdefault(user, deque()).append(waiter)
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        return waiter
+
+    def _dispatch(self) -> float:
+        """
+        Attribue les jetons globaux disponibles aux têtes de file, à tour de rôle
+
+        Retourne l'attente avant le prochain jeton (0 si la file est vide).
+        Le jeton est pris hors verrou (aller-retour Redis) ; le verrou ne
+        protège que les files.
+        """
+        while True:
+            with self._lock:
+                if not self._queues:
+                    return 0.0
+            wait = self._global.take()
+            if wait > 0:
+                return wait
+            with self._lock:
+                if not self._queues:
+                    # File vidée entre-temps (abandon, autre dispatch) : jeton perdu
+                    return 0.0
+                user, queue = next(iter(self._queues.items()))
+                waiter = queue.popleft()
+                if queue:
+                    self._queues.move_to_end(user)
+                else:
+                    del self._queues[user]
+                waiter.granted = True
+                self.admitted += 1
+                self._wait_times.append(time.monotonic() - waiter.enqueued_at)
+                waiter.notify()
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Retire un demandeur de la file ; False s'il a été servi entre-temps"""
+        with self._lock:
+            if waiter.granted:
+                return False
+            queue = self._queues.get(waiter.user)
+            if queue is not None:
+                queue.remove(waiter)
+                if not queue:
+                    del self._queues[waiter.user]
+            return True
+
+    def _timeout(self, waiter: _Waiter):
+        self.timed_out += 1
+        logger.warning("Rate limit queue timeout", user=waiter.user,
+                       waited=round(time.monotonic() - waiter.enqueued_at, 2),
+                       queue_depth=self.queue_depth)
+        raise RateLimitExceeded("Service busy, please retry", 1.0, "queue_timeout")
+
+    def acquire(self, user: str = None, timeout: float = None):
+        """Attend l'autorisation d'un appel LLM (lève RateLimitExceeded)"""
+        if not settings.rate_limit_enabled:
+            return
+        user = user or current_user.get()
+        self._check_user_quota(user)
+
+        event = threading.Event()
+        waiter = self._enqueue(user, event, event.set)
+        deadline = time.monotonic() + (timeout if timeout is not None else self.queue_timeout)
+        while not waiter.granted:
+            wait = self._dispatch()
+            if waiter.granted:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                if self._abandon(waiter):
+                    self._timeout(waiter)
+                break
+            event.wait(min(remaining, max(wait, 0.01)))
+
+    async def acquire_async(self, user: str = None, timeout: float = None):
+        """
+        Version asynchrone de acquire (n'occupe pas de thread pendant l'attente)
+
+        Les prises de jetons (Redis) passent par asyncio.to_thread pour ne
+        pas bloquer la boucle d'événements.
+        """
+        if not settings.rate_limit_enabled:
+            return
+        user = user or current_user.get()
+        await asyncio.to_thread(self._check_user_quota, user)
+
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = self._enqueue(user, event, lambda: loop.call_soon_threadsafe(event.set))
+        deadline = time.monotonic() + (timeout if timeout is not None else self.queue_timeout)
+        try:
+            while not waiter.granted:
+                wait = await asyncio.to_thread(self._dispatch)
+                if waiter.granted:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if self._abandon(waiter):
+                        self._timeout(waiter)
+                    break
+                try:
+                    await asyncio.wait_for(event.wait(), min(remaining, max(wait, 0.01)))
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Profondeur de file et temps d'attente observés"""
+        waits = sorted(self._wait_times)
+        return {
+            "enabled": settings.rate_limit_enabled,
+            "shared": self._redis is not None,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_seconds": sum(waits) / len(waits) if waits else 0.0,
+            "p95_wait_seconds": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            "tracked_users": len(self._users),
+        }
+
+def _create_rate_limiter() -> RateLimiter:
+    redis_cache = None
+    if settings.rate_limit_shared:
+        # Réutilise la connexion Redis du cache L2 (None si REDIS_URL absent)
+        from infrastructure.cache import cache_manager
+        redis_cache = cache_manager.l2
+    return RateLimiter(redis_cache=redis_cache)
+
+# Instance globale
+rate_limiter = LazyProxy(_create_rate_limiter, "rate_limiter")
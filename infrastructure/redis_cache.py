@@ -0,0 +1,226 @@
+"""
+Tier de cache partagé (L2) sur protocole Redis, commun aux workers et réplicas
+"""
+import pickle
+import time
+import uuid
+import zlib
+from typing import Any, Dict, Iterable, Optional, Tuple
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+
+# En-tête d'un octet décrivant l'encodage de la valeur
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+COMPRESSION_THRESHOLD = 1024  # octets
+
+# Libère un verrou uniquement si on en est toujours propriétaire
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Token bucket atomique : recharge selon l'horloge Redis, consomme si possible,
+# sinon retourne l'attente en secondes (chaîne : Lua tronque les flottants)
+_TAKE_TOKENS_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local time = redis.call('time')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local data = redis.call('hmget', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = (requested - tokens) / rate
+end
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('pexpire', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+def dumps(value: Any) -> bytes:
+    """Sérialisation binaire compacte (pickle, zlib au-delà du seuil)"""
+    payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(payload) > COMPRESSION_THRESHOLD:
+        compressed = zlib.compress(payload, 3)
+        if len(compressed) < len(payload):
+            return _ZLIB + compressed
+    return _RAW + payload
+
+def loads(data: bytes) -> Any:
+    """Désérialise une valeur produite par dumps"""
+    header, payload = data[:1], data[1:]
+    if header == _ZLIB:
+        payload = zlib.decompress(payload)
+    return pickle.loads(payload)
+
+class RedisCache:
+    """Client L2 : get/set unitaires et en lot (pipeline), verrous anti-stampede"""
+
+    def __init__(self, url: str = None, client=None, prefix: str = None):
+        if client is None:
+            try:
+                # Dépendance optionnelle, importée seulement si redis_url est défini
+                import redis
+            except ImportError:
+                raise ImportError("Le paquet 'redis' est requis pour utiliser redis_url")
+            client = redis.Redis.from_url(
+                url or settings.redis_url,
+                socket_timeout=settings.redis_socket_timeout,
+                socket_connect_timeout=settings.redis_socket_timeout,
+            )
+        # client peut être un fakeredis.FakeRedis ou tout objet compatible
+        self.client = client
+        self.prefix = prefix if prefix is not None else settings.redis_prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _k(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _error(self, operation: str, e: Exception):
+        self.errors += 1
+        logger.warning("Redis cache operation failed", operation=operation, error=str(e))
+
+    def get_with_ttl(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        """Retourne (valeur, TTL restant en secondes) ou (None, None)"""
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.get(self._k(key))
+            pipe.pttl(self._k(key))
+            data, pttl = pipe.execute()
+        except Exception as e:
+            self._error("get", e)
+            return None, None
+
+        if data is None:
+            self.misses += 1
+            return None, None
+        self.hits += 1
+        ttl = pttl / 1000 if pttl and pttl > 0 else None
+        return loads(data), ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        """Récupère une valeur"""
+        return self.get_with_ttl(key)[0]
+
+    def set(self, key: str, value: Any, ttl: int) -> bool:
+        """Stocke une valeur avec expiration"""
+        try:
+            self.client.set(self._k(key), dumps(value), px=int(ttl * 1000))
+            return True
+        except Exception as e:
+            self._error("set", e)
+            return False
+
+    def get_many_with_ttl(self, keys: Iterable[str]) -> Dict[str, Tuple[Any, Optional[float]]]:
+        """
+        Récupère plusieurs valeurs et leur TTL restant (secondes) en un seul
+        aller-retour (pipeline MGET + PTTL)
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.mget([self._k(k) for k in keys])
+            for key in keys:
+                pipe.pttl(self._k(key))
+            values, *pttls = pipe.execute()
+        except Exception as e:
+            self._error("mget", e)
+            return {}
+
+        found = {}
+        for key, data, pttl in zip(keys, values, pttls):
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                found[key] = (loads(data), pttl / 1000 if pttl and pttl > 0 else None)
+        return found
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Récupère plusieurs valeurs en un seul aller-retour"""
+        return {key: value for key, (value, _) in self.get_many_with_ttl(keys).items()}
+
+    def set_many(self, items: Dict[str, Any], ttl: int) -> bool:
+        """Stocke plusieurs valeurs en un seul aller-retour (pipeline)"""
+        if not items:
+            return True
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.set(self._k(key), dumps(value), px=int(ttl * 1000))
+            pipe.execute()
+            return True
+        except Exception as e:
+            self._error("mset", e)
+            return False
+
+    def delete(self, *keys: str) -> int:
+        """Supprime une ou plusieurs clés"""
+        if not keys:
+            return 0
+        try:
+            return self.client.delete(*[self._k(k) for k in keys])
+        except Exception as e:
+            self._error("delete", e)
+            return 0
+
+    def acquire_lock(self, key: str, ttl: int) -> Optional[str]:
+        """Tente de prendre le verrou de recalcul d'une clé ; retourne un jeton ou None"""
+        token = uuid.uuid4().hex
+        try:
+            if self.client.set(self._k(f"lock:{key}"), token, nx=True, px=int(ttl * 1000)):
+                return token
+        except Exception as e:
+            self._error("lock", e)
+            # Redis indisponible : on laisse l'appelant calculer
+            return token
+        return None
+
+    def release_lock(self, key: str, token: str):
+        """Libère le verrou s'il nous appartient encore"""
+        try:
+            self.client.eval(_RELEASE_LOCK_SCRIPT, 1, self._k(f"lock:{key}"), token)
+        except Exception as e:
+            self._error("unlock", e)
+
+    def take_tokens(self, key: str, capacity: float, rate: float,
+                    tokens: float = 1) -> Optional[float]:
+        """
+        Consomme des jetons d'un token bucket partagé
+
+        Retourne 0 si accordé, l'attente en secondes sinon, None si Redis est indisponible.
+        """
+        try:
+            wait = self.client.eval(_TAKE_TOKENS_SCRIPT, 1, self._k(f"bucket:{key}"),
+                                    capacity, rate, tokens)
+            return float(wait)
+        except Exception as e:
+            self._error("take_tokens", e)
+            return None
+
+    def wait_for(self, key: str, timeout: float, interval: float = 0.05) -> Optional[Any]:
+        """Attend qu'un autre processus publie la valeur d'une clé"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            value = self.get(key)
+            if value is not None:
+                return value
+            time.sleep(interval)
+            interval = min(interval * 2, 0.5)
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiques du tier L2"""
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
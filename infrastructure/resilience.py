@@ -0,0 +1,272 @@
+"""
+Résilience des appels aux dépendances (Gemini, Redshift)
+
+- circuit breaker par dépendance : après circuit_failure_threshold échecs
+  consécutifs, les appels échouent immédiatement (CircuitOpenError) pendant
+  circuit_recovery_timeout, puis un appel d'essai décide de la réouverture ;
+- retries à budget de latence : backoff exponentiel avec jitter, aucune
+  nouvelle tentative si elle dépasserait le budget total ;
+- requêtes LLM couvertes (hedging, asynchrone uniquement) : une seconde
+  requête part si la première dépasse le p95 observé ; la perdante est annulée.
+"""
+import asyncio
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+from infrastructure.lazy import LazyProxy
+from infrastructure.monitoring import LatencyHistogram, metrics
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_TRANSIENT_MARKERS = ("timeout", "timed out", "deadline", "unavailable", "503", "502", "500",
+                      "internal", "connection", "reset by peer", "temporarily")
+
+class CircuitOpenError(Exception):
+    """Dépendance indisponible : appel refusé sans être tenté"""
+
+    def __init__(self, dependency: str, retry_after: float):
+        super().__init__(f"{dependency} temporarily unavailable (circuit open)")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+def is_transient(error: Exception) -> bool:
+    """Erreur susceptible de disparaître en réessayant (timeout, 5xx, connexion)"""
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    from sqlalchemy import exc as sa_exc
+    if isinstance(error, sa_exc.DBAPIError):
+        # Le message contient le SQL : seule la classe d'erreur est fiable
+        return error.connection_invalidated or isinstance(
+            error, (sa_exc.OperationalError, sa_exc.InterfaceError))
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in _TRANSIENT_MARKERS)
+
+class CircuitBreaker:
+    """Disjoncteur fermé / ouvert / semi-ouvert pour une dépendance"""
+
+    def __init__(self, name: str, failure_threshold: int = None,
+                 recovery_timeout: float = None, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.circuit_failure_threshold
+        self.recovery_timeout = recovery_timeout or settings.circuit_recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_count = 0
+        self.rejected = 0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Lève CircuitOpenError si l'appel doit être refusé"""
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self.opened_at + self.recovery_timeout - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self.state = HALF_OPEN
+                self._half_open_calls = 0
+                logger.info("Circuit half-open, probing dependency", dependency=self.name)
+            if self.state == HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 1.0)
+                self._half_open_calls += 1
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("Circuit closed", dependency=self.name)
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self, error: Exception = None):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opened_count += 1
+                    logger.warning("Circuit opened", dependency=self.name, failures=self.failures,
+                                   error=str(error) if error else None)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def _release(self):
+        """Appel d'essai interrompu (annulation) : ni succès ni échec"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    @contextmanager
+    def call(self) -> Iterator[None]:
+        """
+        Encadre un appel à la dépendance (refus, succès, échec)
+
+        Seules les erreurs transitoires comptent comme des échecs : une erreur
+        applicative (SQL invalide, requête refusée) prouve que la dépendance répond.
+        """
+        self.before_call()
+        try:
+            yield
+        except Exception as e:
+            if is_transient(e):
+                self.record_failure(e)
+            else:
+                self.record_success()
+            raise
+        except BaseException:
+            self._release()
+            raise
+        else:
+            self.record_success()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opened_count": self.opened_count,
+            "rejected": self.rejected
+        }
+
+# Un disjoncteur par dépendance
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(dependency: str) -> CircuitBreaker:
+    breaker = _breakers.get(dependency)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(dependency, CircuitBreaker(dependency))
+    return breaker
+
+def get_breaker_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: breaker.get_stats() for name, breaker in list(_breakers.items())}
+
+def _backoff(attempt: int, base_delay: float) -> float:
+    """Backoff exponentiel avec jitter complet"""
+    return random.uniform(0, base_delay * 2 ** (attempt - 1))
+
+def _next_delay(attempt: int, attempts: int, base_delay: float, budget: float,
+                start_time: float, error: Exception) -> Optional[float]:
+    """Délai avant la prochaine tentative, ou None s'il ne faut plus réessayer"""
+    if attempt >= attempts or isinstance(error, CircuitOpenError) or not is_transient(error):
+        return None
+    delay = _backoff(attempt, base_delay)
+    if time.monotonic() - start_time + delay >= budget:
+        return None
+    return delay
+
+def retry_call(dependency: str, fn: Callable[[], T], attempts: int, budget: float,
+               base_delay: float = 0.5) -> T:
+    """Appel protégé par le disjoncteur, réessayé tant que le budget (s) le permet"""
+    breaker = get_breaker(dependency)
+    start_time = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            with breaker.call():
+                return fn()
+        except Exception as e:
+            delay = _next_delay(attempt, attempts, base_delay, budget, start_time, e)
+            if delay is None:
+                raise
+            logger.warning("Dependency call failed, retrying", dependency=dependency,
+                           attempt=attempt, delay=round(delay, 2), error=str(e))
+            time.sleep(delay)
+
+async def aretry_call(dependency: str, fn: Callable[[], Awaitable[T]], attempts: int,
+                      budget: float, base_delay: float = 0.5) -> T:
+    """Version asynchrone de retry_call"""
+    breaker = get_breaker(dependency)
+    start_time = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            with breaker.call():
+                return await fn()
+        except Exception as e:
+            delay = _next_delay(attempt, attempts, base_delay, budget, start_time, e)
+            if delay is None:
+                raise
+            logger.warning("Dependency call failed, retrying", dependency=dependency,
+                           attempt=attempt, delay=round(delay, 2), error=str(e))
+            await asyncio.sleep(delay)
+
+def hedge_delay(stage: str, model: str) -> Optional[float]:
+    """p95 (s) des durées observées de l'étape pour ce modèle, toutes langues confondues"""
+    merged = None
+    for (name, stage_model, _), histogram in list(metrics.stage_latencies.items()):
+        if name == stage and stage_model == model:
+            if merged is None:
+                merged = LatencyHistogram.from_dict(histogram.to_dict())
+            else:
+                merged.merge_dict(histogram.to_dict())
+    if merged is None or merged.count < settings.llm_hedge_min_samples:
+        return None
+    return merged.percentile(95) / 1000
+
+async def hedged(fn: Callable[[], Awaitable[T]], delay: Optional[float]) -> T:
+    """
+    Lance fn ; si elle n'a pas répondu après delay secondes, lance une
+    seconde requête et retourne la première réponse réussie (l'autre est annulée)
+    """
+    first = asyncio.ensure_future(fn())
+    if delay is None:
+        return await first
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return first.result()
+        tasks.append(asyncio.ensure_future(fn()))
+        hedge_stats.launched += 1
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        hedge_stats.won += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+class HedgeStats:
+    """Requêtes de couverture lancées et gagnées"""
+
+    def __init__(self):
+        self.launched = 0
+        self.won = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"launched": self.launched, "won": self.won}
+
+# Instance globale
+hedge_stats = LazyProxy(HedgeStats, "hedge_stats")
+
+def call_llm(fn: Callable[[], T]) -> T:
+    """Appel synchrone au LLM : disjoncteur + retries budgétés"""
+    return retry_call("llm", fn, settings.llm_retry_attempts, settings.llm_retry_budget)
+
+async def acall_llm(fn: Callable[[], Awaitable[T]], model: str = None) -> T:
+    """Appel asynchrone au LLM : disjoncteur + retries budgétés + hedging optionnel"""
+    delay = hedge_delay("llm_call", model) if settings.llm_hedging_enabled and model else None
+    return await aretry_call("llm", lambda: hedged(fn, delay),
+                             settings.llm_retry_attempts, settings.llm_retry_budget)
@@ -0,0 +1,252 @@
+"""
+Snapshot local du schéma (SQLite) avec empreinte et rafraîchissement incrémental
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Set
+from sqlalchemy import inspect, text
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+
+_SNAPSHOT_DDL = """
+CREATE TABLE IF NOT EXISTS tables (
+    name TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    columns_json TEXT NOT NULL,
+    rows INTEGER,
+    size_mb INTEGER,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Redshift : catalogues système légers (pas de réflexion SQLAlchemy table par table)
+# Tables de base uniquement : SQLDatabase ne reflète pas les vues (include_tables)
+_REDSHIFT_COLUMNS_SQL = """
+SELECT c.table_name, c.column_name, c.data_type, c.ordinal_position, c.remarks
+FROM svv_columns c
+JOIN svv_tables t ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+WHERE c.table_schema = :schema AND t.table_type = 'BASE TABLE'
+ORDER BY c.table_name, c.ordinal_position
+"""
+_REDSHIFT_STATS_SQL = """
+SELECT "table", tbl_rows, size
+FROM svv_table_info
+WHERE "schema" = :schema
+"""
+_INFORMATION_SCHEMA_COLUMNS_SQL = """
+SELECT c.table_name, c.column_name, c.data_type, c.ordinal_position, NULL AS remarks
+FROM information_schema.columns c
+JOIN information_schema.tables t ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+WHERE c.table_schema = :schema AND t.table_type = 'BASE TABLE'
+ORDER BY c.table_name, c.ordinal_position
+"""
+
+def _table_fingerprint(columns: List[Dict[str, Any]]) -> str:
+    data = json.dumps(columns, sort_keys=True, default=str)
+    return hashlib.md5(data.encode()).hexdigest()
+
+class SchemaStore:
+    """Métadonnées du schéma servies depuis la mémoire et un snapshot disque"""
+
+    def __init__(self, path: str = None, schema: str = None):
+        self.path = path or settings.schema_snapshot_path
+        self.schema = schema or settings.redshift_schema
+        self.tables: Dict[str, Dict[str, Any]] = {}
+        self.fingerprint: Optional[str] = None
+        self.refreshed_at = 0.0
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._listeners = []
+
+    @contextmanager
+    def _snapshot(self):
+        """Connexion au fichier snapshot (transaction validée en sortie)"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                conn.executescript(_SNAPSHOT_DDL)
+                yield conn
+        finally:
+            conn.close()
+
+    def _compute_fingerprint(self) -> str:
+        data = "|".join(f"{name}:{info['fingerprint']}" for name, info in sorted(self.tables.items()))
+        return hashlib.md5(f"{self.schema}|{data}".encode()).hexdigest()[:16]
+
+    def load(self) -> bool:
+        """Charge le snapshot disque en mémoire ; retourne False s'il est absent ou vide"""
+        with self._lock:
+            if self._loaded:
+                return bool(self.tables)
+            try:
+                with self._snapshot() as conn:
+                    meta = dict(conn.execute("SELECT key, value FROM meta"))
+                    if meta.get("schema") == self.schema:
+                        for name, fingerprint, columns_json, rows, size_mb in conn.execute(
+                            "SELECT name, fingerprint, columns_json, rows, size_mb FROM tables"
+                        ):
+                            self.tables[name] = {
+                                "fingerprint": fingerprint,
+                                "columns": json.loads(columns_json),
+                                "rows": rows,
+                                "size_mb": size_mb,
+                            }
+                        self.refreshed_at = float(meta.get("refreshed_at", 0))
+            except sqlite3.Error as e:
+                logger.warning("Schema snapshot unreadable", path=self.path, error=str(e))
+                self.tables = {}
+            self.fingerprint = self._compute_fingerprint() if self.tables else None
+            self._loaded = True
+            logger.info("Schema snapshot loaded", tables_count=len(self.tables),
+                        fingerprint=self.fingerprint)
+            return bool(self.tables)
+
+    def _fetch_columns(self, engine) -> Dict[str, List[Dict[str, Any]]]:
+        """Colonnes de toutes les tables du schéma en une requête catalogue"""
+        dialect = engine.dialect.name
+        columns: Dict[str, List[Dict[str, Any]]] = {}
+        if dialect in ("redshift", "postgresql"):
+            sql = _REDSHIFT_COLUMNS_SQL if dialect == "redshift" else _INFORMATION_SCHEMA_COLUMNS_SQL
+            with engine.connect() as conn:
+                for table, column, data_type, position, remarks in conn.execute(
+                    text(sql), {"schema": self.schema}
+                ):
+                    columns.setdefault(table, []).append({
+                        "name": column, "type": data_type,
+                        "position": position, "comment": remarks,
+                    })
+            return columns
+
+        # Autres dialectes (dev/tests) : réflexion via l'inspecteur SQLAlchemy
+        inspector = inspect(engine)
+        schema = None if dialect == "sqlite" else self.schema
+        for table in inspector.get_table_names(schema=schema):
+            columns[table] = [
+                {"name": c["name"], "type": str(c["type"]), "position": i + 1,
+                 "comment": c.get("comment")}
+                for i, c in enumerate(inspector.get_columns(table, schema=schema))
+            ]
+        return columns
+
+    def _fetch_stats(self, engine) -> Dict[str, Dict[str, Any]]:
+        """Volumétrie par table (Redshift uniquement, best effort)"""
+        if engine.dialect.name != "redshift":
+            return {}
+        try:
+            with engine.connect() as conn:
+                return {
+                    table: {"rows": rows, "size_mb": size}
+                    for table, rows, size in conn.execute(text(_REDSHIFT_STATS_SQL), {"schema": self.schema})
+                }
+        except Exception as e:
+            logger.warning("Table stats unavailable", error=str(e))
+            return {}
+
+    def refresh(self, engine) -> Set[str]:
+        """
+        Compare le catalogue au snapshot et ne réécrit que les tables modifiées
+
+        Returns:
+            Ensemble des tables ajoutées, modifiées ou supprimées
+        """
+        self.load()
+        start_time = time.time()
+        live_columns = self._fetch_columns(engine)
+        stats = self._fetch_stats(engine)
+
+        with self._lock:
+            changed = {}
+            for table, columns in live_columns.items():
+                fingerprint = _table_fingerprint(columns)
+                current = self.tables.get(table)
+                table_stats = stats.get(table, {})
+                if current is None or current["fingerprint"] != fingerprint:
+                    changed[table] = {
+                        "fingerprint": fingerprint,
+                        "columns": columns,
+                        "rows": table_stats.get("rows"),
+                        "size_mb": table_stats.get("size_mb"),
+                    }
+                elif table_stats:
+                    current.update(table_stats)
+            dropped = set(self.tables) - set(live_columns)
+
+            self.tables.update(changed)
+            for table in dropped:
+                del self.tables[table]
+            self.refreshed_at = time.time()
+            previous = self.fingerprint
+            self.fingerprint = self._compute_fingerprint() if self.tables else None
+
+            with self._snapshot() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO tables VALUES (?, ?, ?, ?, ?, ?)",
+                    [(name, info["fingerprint"], json.dumps(info["columns"]),
+                      info["rows"], info["size_mb"], self.refreshed_at)
+                     for name, info in changed.items()]
+                )
+                conn.executemany("DELETE FROM tables WHERE name = ?", [(t,) for t in dropped])
+                conn.executemany(
+                    "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                    [("schema", self.schema), ("refreshed_at", str(self.refreshed_at))]
+                )
+
+        modified = set(changed) | dropped
+        logger.info("Schema snapshot refreshed",
+                    tables_count=len(self.tables),
+                    changed_tables=len(modified),
+                    fingerprint=self.fingerprint,
+                    duration_ms=round((time.time() - start_time) * 1000))
+        if self.fingerprint != previous:
+            for listener in list(self._listeners):
+                try:
+                    listener(self.fingerprint, modified)
+                except Exception as e:
+                    logger.error("Schema change listener failed", error=str(e))
+        return modified
+
+    def refresh_async(self, engine):
+        """Lance un rafraîchissement en arrière-plan (un seul à la fois)"""
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+
+            def run():
+                try:
+                    self.refresh(engine)
+                except Exception as e:
+                    logger.error("Background schema refresh failed", error=str(e))
+
+            self._refresh_thread = threading.Thread(target=run, name="schema-refresh", daemon=True)
+            self._refresh_thread.start()
+
+    def is_stale(self) -> bool:
+        """Indique si le snapshot a dépassé l'intervalle de rafraîchissement"""
+        return time.time() - self.refreshed_at > settings.schema_refresh_interval
+
+    def on_change(self, listener):
+        """Enregistre un callback appelé avec (fingerprint, tables modifiées)"""
+        self._listeners.append(listener)
+
+    def table_names(self) -> List[str]:
+        """Noms des tables connues"""
+        with self._lock:
+            return sorted(self.tables)
+
+    def get_columns(self, table: str) -> List[Dict[str, Any]]:
+        """Colonnes d'une table (liste vide si inconnue)"""
+        with self._lock:
+            return list(self.tables.get(table, {}).get("columns", []))
@@ -3,9 +3,10 @@ Configuration robuste avec Pydantic
 """
 from pydantic_settings import BaseSettings
 from pydantic import field_validator
-from typing import Optional
+from typing import Dict, Optional
 import os
 from dotenv import load_dotenv
+from infrastructure.lazy import LazyProxy
 
 load_dotenv()
 
@@ -26,22 +27,123 @@ class Settings(BaseSettings):
     app_version: str = "1.0.0"
     debug: bool = False
     
+    # HTTP API
+    api_host: str = "127.0.0.1"  # 0.0.0.0 pour exposer l'API hors de la machine
+    api_port: int = 8000
+    api_workers: int = 0  # 0 = un worker par cœur CPU
+    api_key: Optional[str] = None  # en-tête X-API-Key exigé sur /sql
+    api_auth_disabled: bool = False  # sans API_KEY, /sql n'est ouvert que si ce drapeau est activé
+    api_signing_key: Optional[str] = None  # secret des sql_token (défaut : dérivé d'api_key)
+    api_execute_arbitrary_sql: bool = False  # /sql/execute accepte du SQL non généré par le service
+    
     # Database Pool Settings
     db_pool_size: int = 10
     db_pool_overflow: int = 20
     db_pool_timeout: int = 30
+    db_pool_min_size: int = 2  # bornes du redimensionnement automatique
+    db_pool_max_size: int = 20
+    db_pool_adaptive: bool = True  # taille ajustée au pic de connexions observé
+    db_pool_prewarm: int = 2  # connexions ouvertes dès la création de l'engine
+    db_pool_maintenance_interval: float = 30.0  # secondes (liveness + redimensionnement)
+    
+    # Schema Snapshot
+    schema_snapshot_path: str = ".cache/schema_snapshot.sqlite3"
+    schema_refresh_interval: int = 3600  # secondes
+    table_info_path: str = ".cache/table_info.sqlite3"
+    
+    # Async Generation
+    generation_timeout: int = 60  # secondes par demande
+    generation_max_concurrency: int = 16
+    generation_poll_interval: float = 0.5  # secondes, rafraîchissement UI
+    generation_job_ttl: int = 600  # secondes de conservation des demandes terminées
+    
+    # Table Selection (réduction du prompt)
+    table_selection_enabled: bool = True
+    table_selection_top_k: int = 8
+
+    # SQL Validation (sqlglot, avant de rendre le SQL généré)
+    sql_validation_enabled: bool = True
+    sql_repair_attempts: int = 1  # re-prompts avec l'erreur sur le même modèle, avant le modèle de repli
+
+    # Query Execution
+    query_page_size: int = 500
+    query_max_rows: int = 100000
+    query_max_bytes: int = 50 * 1024 * 1024  # 50 MB
+    query_stream_idle_timeout: int = 300  # secondes
+    
+    # Query Result Cache
+    result_cache_enabled: bool = True
+    result_cache_ttl: int = 900  # 15 minutes
+    result_cache_max_entry_bytes: int = 8 * 1024 * 1024  # 8 MB
+    result_cache_table_ttls: Dict[str, int] = {}  # ex: {"sales": 300}, TTL par table
     
     # Rate Limiting
-    rate_limit_requests: int = 100
+    rate_limit_enabled: bool = True
+    rate_limit_requests: int = 100  # par utilisateur
+    rate_limit_batch_requests: int = 5000  # quota propre aux lots (batch_cli), même fenêtre
     rate_limit_window: int = 3600  # 1 hour
+    rate_limit_global_requests: int = 60  # appels LLM, tous utilisateurs confondus
+    rate_limit_global_window: int = 60  # 1 minute
+    rate_limit_global_burst: int = 10
+    rate_limit_queue_timeout: float = 30  # secondes d'attente maximum dans la file
+    rate_limit_shared: bool = True  # buckets partagés via Redis si REDIS_URL est défini
     
     # Caching
     redis_url: Optional[str] = None
+    redis_prefix: str = "texttosql:"
+    redis_socket_timeout: float = 0.5  # secondes
+    cache_lock_timeout: int = 30  # secondes, verrou anti-stampede
     cache_ttl: int = 3600  # 1 hour
+    cache_max_entries: int = 10000
+    cache_max_bytes: int = 256 * 1024 * 1024  # 256 MB
+    cache_eviction_policy: str = "lru"  # lru, lfu ou ttl
+    cache_sweep_interval: int = 60  # secondes
+    
+    # Generation Cache (question -> SQL)
+    generation_cache_enabled: bool = True
+    semantic_cache_enabled: bool = False  # réutilise le SQL d'une question quasi identique
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_max_entries: int = 2000
+    
+    # Health Checks
+    health_check_interval: int = 30  # secondes entre deux vérifications
+    health_check_timeout: float = 5.0  # secondes
+
+    # LLM
+    llm_model: str = "gemini-1.5-flash"  # modèle rapide, essayé en premier
+    llm_fallback_model: Optional[str] = "gemini-1.5-pro"  # si la sortie n'est pas du SQL exploitable
+    llm_temperature: float = 0.0
+    llm_max_tokens: Optional[int] = 1000  # plafond de tokens de sortie (latence)
+
+    # Resilience (circuit breakers, retries, hedging)
+    circuit_failure_threshold: int = 5  # échecs consécutifs avant ouverture
+    circuit_recovery_timeout: float = 30.0  # secondes avant un appel d'essai
+    llm_request_timeout: float = 30.0  # secondes par appel Gemini
+    llm_retry_attempts: int = 2
+    llm_retry_budget: float = 45.0  # secondes, toutes tentatives comprises
+    llm_hedging_enabled: bool = False  # seconde requête si la première dépasse le p95
+    llm_hedge_min_samples: int = 50  # mesures nécessaires avant de couvrir
+    db_connect_attempts: int = 2
+    db_connect_budget: float = 20.0  # secondes, toutes tentatives comprises
+
+    # Metrics Export (OpenMetrics)
+    metrics_enabled: bool = True
+    metrics_host: str = "0.0.0.0"
+    metrics_port: int = 9464
+    metrics_multiproc_dir: Optional[str] = None  # ex: ".cache/metrics", agrège les processus
+    metrics_flush_interval: float = 5.0  # secondes entre deux snapshots sur disque
+    metrics_system_interval: float = 15.0  # secondes entre deux échantillons psutil
+    metrics_log_sample_rate: float = 0.01  # part des requêtes réussies loggées (erreurs : toutes)
     
     # Logging
     log_level: str = "INFO"
     log_format: str = "json"
+    log_async: bool = True  # rendu et écriture dans un thread dédié
+    log_queue_size: int = 10000  # au-delà, événements abandonnés (jamais bloquant)
+    log_batch_size: int = 256
+    log_flush_interval: float = 0.2  # secondes
+    log_max_field_length: int = 1024  # caractères par valeur textuelle
+    log_sample_rates: Dict[str, float] = {}  # ex: {"Cache hit": 0.1}, par nom d'événement
     
     @field_validator('redshift_port')
     @classmethod
@@ -50,6 +152,21 @@ class Settings(BaseSettings):
             raise ValueError('Port must be between 1 and 65535')
         return v
     
+    @field_validator('cache_eviction_policy')
+    @classmethod
+    def validate_eviction_policy(cls, v):
+        valid_policies = ['lru', 'lfu', 'ttl']
+        if v.lower() not in valid_policies:
+            raise ValueError(f'Eviction policy must be one of {valid_policies}')
+        return v.lower()
+    
+    @field_validator('semantic_cache_threshold')
+    @classmethod
+    def validate_similarity_threshold(cls, v):
+        if not 0.0 < v <= 1.0:
+            raise ValueError('Similarity threshold must be in (0, 1]')
+        return v
+    
     @field_validator('log_level')
     @classmethod
     def validate_log_level(cls, v):
@@ -69,5 +186,5 @@ class Settings(BaseSettings):
         "extra": "ignore"  # Ignore les champs supplémentaires
     }
 
-# Instance globale des settings
-settings = Settings()
+# Instance globale des settings (environnement validé au premier accès)
+settings = LazyProxy(Settings, "settings")
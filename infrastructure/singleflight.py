@@ -0,0 +1,118 @@
+"""
+Déduplication des appels concurrents identiques (single-flight)
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+class _Call:
+    """Appel en cours partagé par tous les demandeurs de la même clé"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Garantit qu'une seule exécution de fn est en vol par clé ; les autres attendent son résultat"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Exécute fn (ou attend l'exécution en cours) et retourne son résultat"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def in_flight(self) -> int:
+        """Nombre d'appels actuellement en vol"""
+        with self._lock:
+            return len(self._calls)
+
+class _AsyncCall:
+    """Tâche en cours partagée ; annulée quand plus aucun demandeur ne l'attend"""
+
+    def __init__(self, task: "asyncio.Task", context: Any = None):
+        self.task = task
+        # Données partagées avec les suiveurs (ex: SQL partiel en streaming)
+        self.context = context
+        self.waiters = 0
+
+    def attach(self):
+        self.waiters += 1
+
+    def detach(self):
+        self.waiters -= 1
+        if self.waiters <= 0 and not self.task.done():
+            self.task.cancel()
+
+class AsyncSingleFlight:
+    """Équivalent asyncio de SingleFlight : une tâche par clé et par boucle d'événements"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _AsyncCall] = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: Hashable, fn: Callable[[], Awaitable[Any]],
+             context: Any = None) -> Tuple[_AsyncCall, bool]:
+        """
+        Rejoint l'appel en vol pour key, ou le démarre (fn() dans une tâche)
+
+        Retourne (appel, leader). L'appelant doit attach()/detach() l'appel
+        autour de son attente ; le contexte est celui fourni par le leader.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and not call.task.done() and call.task.get_loop() is loop:
+                return call, False
+            call = _AsyncCall(loop.create_task(fn()), context)
+            self._calls[key] = call
+
+        def forget(_task, key=key, call=call):
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+
+        call.task.add_done_callback(forget)
+        return call, True
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Attend le résultat de l'appel en vol pour key (démarré au besoin)"""
+        call, _ = self.join(key, fn)
+        call.attach()
+        try:
+            # shield : l'annulation d'un demandeur n'annule pas les autres
+            return await asyncio.shield(call.task)
+        finally:
+            call.detach()
+
+    def in_flight(self) -> int:
+        """Nombre d'appels actuellement en vol"""
+        with self._lock:
+            return len(self._calls)
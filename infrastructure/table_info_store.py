@@ -0,0 +1,164 @@
+"""
+Descriptions de tables (DDL + lignes d'exemple) précalculées hors du chemin critique
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+from langchain_community.utilities import SQLDatabase
+from infrastructure.schema_store import SchemaStore
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+
+_TABLE_INFO_DDL = """
+CREATE TABLE IF NOT EXISTS table_info (
+    name TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    info TEXT NOT NULL,
+    built_at REAL NOT NULL
+);
+"""
+
+class TableInfoStore:
+    """
+    Cache versionné des blocs get_table_info, en mémoire et sur disque
+
+    Chaque entrée porte l'empreinte de la table au moment du calcul : une
+    entrée dont l'empreinte ne correspond plus au snapshot de schéma est ignorée.
+    """
+
+    def __init__(self, schema_store: SchemaStore, path: str = None):
+        self.schema_store = schema_store
+        self.path = path or settings.table_info_path
+        self._entries: Dict[str, Tuple[str, str]] = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._build_thread: Optional[threading.Thread] = None
+        schema_store.on_change(self._on_schema_change)
+
+    @contextmanager
+    def _storage(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                conn.executescript(_TABLE_INFO_DDL)
+                yield conn
+        finally:
+            conn.close()
+
+    def _table_fingerprint(self, table: str) -> Optional[str]:
+        return self.schema_store.tables.get(table, {}).get("fingerprint")
+
+    def load(self):
+        """Charge les descriptions persistées"""
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                with self._storage() as conn:
+                    for name, fingerprint, info in conn.execute(
+                        "SELECT name, fingerprint, info FROM table_info"
+                    ):
+                        self._entries[name] = (fingerprint, info)
+            except sqlite3.Error as e:
+                logger.warning("Table info store unreadable", path=self.path, error=str(e))
+            self._loaded = True
+
+    def get(self, table: str) -> Optional[str]:
+        """Description à jour d'une table, ou None si absente / périmée"""
+        self.load()
+        entry = self._entries.get(table)
+        if entry is None or entry[0] != self._table_fingerprint(table):
+            return None
+        return entry[1]
+
+    def put(self, table: str, info: str):
+        """Enregistre la description d'une table pour son empreinte courante"""
+        fingerprint = self._table_fingerprint(table)
+        if fingerprint is None:
+            return
+        with self._lock:
+            self._entries[table] = (fingerprint, info)
+            try:
+                with self._storage() as conn:
+                    conn.execute("INSERT OR REPLACE INTO table_info VALUES (?, ?, ?, ?)",
+                                 (table, fingerprint, info, time.time()))
+            except sqlite3.Error as e:
+                logger.warning("Table info not persisted", table=table, error=str(e))
+
+    def missing(self, tables: Iterable[str]) -> List[str]:
+        """Tables sans description à jour"""
+        return [table for table in tables if self.get(table) is None]
+
+    def build(self, db: "PrecomputedSQLDatabase") -> int:
+        """Calcule les descriptions manquantes ou périmées (interroge la base)"""
+        start_time = time.time()
+        todo = self.missing(db.get_usable_table_names())
+        for table in todo:
+            try:
+                self.put(table, db.compute_table_info([table]))
+            except Exception as e:
+                logger.warning("Table info build failed", table=table, error=str(e))
+        if todo:
+            logger.info("Table info precomputed", tables_count=len(todo),
+                        duration_ms=round((time.time() - start_time) * 1000))
+        return len(todo)
+
+    def build_async(self, db: "PrecomputedSQLDatabase"):
+        """Lance le précalcul en arrière-plan (un seul job à la fois)"""
+        with self._lock:
+            if self._build_thread is not None and self._build_thread.is_alive():
+                return
+
+            def run():
+                try:
+                    self.build(db)
+                except Exception as e:
+                    logger.error("Background table info build failed", error=str(e))
+
+            self._build_thread = threading.Thread(target=run, name="table-info-build", daemon=True)
+            self._build_thread.start()
+
+    def _on_schema_change(self, fingerprint: str, changed_tables):
+        """Invalide explicitement les descriptions des tables modifiées"""
+        with self._lock:
+            for table in changed_tables:
+                self._entries.pop(table, None)
+            try:
+                with self._storage() as conn:
+                    conn.executemany("DELETE FROM table_info WHERE name = ?",
+                                     [(t,) for t in changed_tables])
+            except sqlite3.Error as e:
+                logger.warning("Table info invalidation not persisted", error=str(e))
+
+class PrecomputedSQLDatabase(SQLDatabase):
+    """SQLDatabase dont get_table_info est servi par le TableInfoStore"""
+
+    def __init__(self, *args, table_info_store: TableInfoStore = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.table_info_store = table_info_store
+
+    def compute_table_info(self, table_names: List[str]) -> str:
+        """Calcul direct (réflexion + SELECT ... LIMIT) sans passer par le store"""
+        return super().get_table_info(table_names)
+
+    def get_table_info(self, table_names: Optional[List[str]] = None,
+                       get_col_comments: bool = False) -> str:
+        if self.table_info_store is None or get_col_comments:
+            return super().get_table_info(table_names, get_col_comments=get_col_comments)
+
+        names = sorted(table_names) if table_names else sorted(self.get_usable_table_names())
+        blocks = []
+        for table in names:
+            info = self.table_info_store.get(table)
+            if info is None:
+                # Absente du store (job pas encore passé) : calcul live puis mémorisation
+                info = self.compute_table_info([table])
+                self.table_info_store.put(table, info)
+            blocks.append(info)
+        return "\n\n".join(blocks)
@@ -0,0 +1,72 @@
+"""
+Traçage par étape : spans chronométrés, propagés dans les logs via structlog
+
+Étapes tracées : schema_load, table_selection, prompt_build, llm_call,
+llm_first_token, postprocess, execution, render. Chaque span alimente
+l'histogramme (étape, modèle, langue) du MetricsCollector.
+"""
+import contextvars
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+import structlog
+from infrastructure.monitoring import metrics
+from infrastructure.logging import logger
+
+# Étiquettes de la trace courante (model, language), héritées par les tâches et threads
+_trace_tags: contextvars.ContextVar[Optional[Dict[str, str]]] = contextvars.ContextVar("trace_tags", default=None)
+_current_span: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_span", default=None)
+
+def new_trace(**tags) -> str:
+    """Démarre une trace dans le contexte courant ; retourne son identifiant"""
+    trace_id = uuid.uuid4().hex[:16]
+    structlog.contextvars.bind_contextvars(trace_id=trace_id)
+    _trace_tags.set({k: v for k, v in tags.items() if v is not None})
+    return trace_id
+
+def set_trace_tags(**tags):
+    """Complète les étiquettes de la trace courante (valeurs None ignorées)"""
+    current = dict(_trace_tags.get() or {})
+    current.update({k: v for k, v in tags.items() if v is not None})
+    _trace_tags.set(current)
+
+def get_trace_tags() -> Dict[str, str]:
+    return dict(_trace_tags.get() or {})
+
+def record_stage(stage: str, duration_ms: float, **tags):
+    """Enregistre une durée mesurée hors span (ex: premier token d'un flux)"""
+    all_tags = {**get_trace_tags(), **tags}
+    metrics.record_stage(stage, duration_ms, model=all_tags.get("model"),
+                         language=all_tags.get("language"))
+
+@contextmanager
+def span(stage: str, **tags) -> Iterator[None]:
+    """Chronomètre une étape ; trace_id et span sont ajoutés aux logs émis dedans"""
+    # Span racine hors trace : identifiant temporaire, retiré à la sortie
+    root_tokens = None
+    if "trace_id" not in structlog.contextvars.get_contextvars():
+        root_tokens = structlog.contextvars.bind_contextvars(trace_id=uuid.uuid4().hex[:16])
+    parent = _current_span.get()
+    span_token = _current_span.set(stage)
+    log_tokens = structlog.contextvars.bind_contextvars(span=stage)
+    start_time = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start_time) * 1000
+        record_stage(stage, duration_ms, **tags)
+        logger.debug("Span finished", stage=stage, parent=parent, status=status,
+                     duration_ms=round(duration_ms, 2))
+        try:
+            structlog.contextvars.reset_contextvars(**log_tokens)
+            _current_span.reset(span_token)
+            if root_tokens:
+                structlog.contextvars.reset_contextvars(**root_tokens)
+        except ValueError:
+            # Span refermé dans un autre contexte (générateur repris ailleurs)
+            pass
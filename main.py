@@ -0,0 +1,27 @@
+"""
+Point d'entrée de l'API HTTP
+Usage : python main.py (rechargement automatique si DEBUG=true)
+"""
+import os
+import sys
+
+# Ajouter le répertoire racine au PYTHONPATH pour les imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import uvicorn
+from infrastructure.settings import settings
+
+def main():
+    # Un processus par cœur : la génération et la sérialisation restent liées au GIL
+    workers = settings.api_workers or os.cpu_count() or 1
+    uvicorn.run(
+        "app.main:app",
+        host=settings.api_host,
+        port=settings.api_port,
+        reload=settings.debug,
+        workers=1 if settings.debug else workers,
+        log_level=settings.log_level.lower()
+    )
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,9 @@ from ui.styles.themes import load_custom_css, apply_theme
 
 # Imports pour l'initialisation
 from langue.translator import get_text, set_language
+from infrastructure.health import health_prober
+from infrastructure.lazy import preload_modules
+from infrastructure.metrics_exporter import metrics_exporter
 from infrastructure.logging import logger
 
 def initialize_app():
@@ -46,6 +49,16 @@ def initialize_app():
     # Chargement des styles personnalisés
     load_custom_css()
     
+    # Health checks en arrière-plan (idempotent, un thread par processus)
+    health_prober.start()
+    
+    # Export OpenMetrics (/metrics sur metrics_port)
+    metrics_exporter.start()
+    
+    # LangChain / SDK Gemini importés en arrière-plan pendant le premier rendu
+    preload_modules(["domain.sql.generation_jobs", "domain.sql.execution", "langchain.chains",
+                     "langchain_google_genai"])
+    
     # Log de démarrage
     logger.info("Streamlit application started")
 
@@ -0,0 +1,20 @@
+"""
+Configuration commune des tests unitaires
+
+Les settings exigent les variables Redshift et Gemini : des valeurs factices
+suffisent, aucun test n'ouvre de connexion réelle.
+"""
+import os
+
+for name, value in {
+    "REDSHIFT_USER": "test",
+    "REDSHIFT_PASSWORD": "test",
+    "REDSHIFT_HOST": "localhost",
+    "REDSHIFT_DB": "test",
+    "GOOGLE_API_KEY": "test",
+    "LOG_LEVEL": "WARNING",
+    "LOG_ASYNC": "false",
+}.items():
+    os.environ.setdefault(name, value)
+# Jamais de Redis partagé pendant les tests
+os.environ["REDIS_URL"] = ""
@@ -0,0 +1,91 @@
+"""Tests de la génération en lot (LLM remplacé par une fonction factice)"""
+import json
+import pytest
+from domain.sql import batch
+from domain.sql.batch import BatchRunner
+from infrastructure.rate_limit import BATCH_USER, RateLimitExceeded, current_user
+from infrastructure.resilience import CircuitOpenError
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(batch.random, "uniform", lambda a, b: 0.0)
+
+def _runner(**kwargs) -> BatchRunner:
+    return BatchRunner(llm=None, db=None, concurrency=2, backoff_base=0.0, **kwargs)
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_duplicates_generated_once(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(batch, "generate_sql",
+                        lambda question, llm, db: calls.append(question) or f"SELECT '{question}'")
+    output = tmp_path / "out.jsonl"
+    stats = _runner().run([
+        {"id": "1", "question": "Ventes totales ?"},
+        {"id": "2", "question": "  ventes   TOTALES ?"},
+        {"id": "3", "question": "Nombre de marques"},
+    ], str(output))
+    assert len(calls) == 2
+    assert stats["deduplicated"] == 1 and stats["ok"] == 3
+    assert sorted(r["id"] for r in _read(output)) == ["1", "2", "3"]
+
+def test_resume_skips_successful_ids(tmp_path, monkeypatch):
+    output = tmp_path / "out.jsonl"
+    output.write_text(
+        json.dumps({"id": "1", "status": "ok"}) + "\n"
+        + json.dumps({"id": "2", "status": "error"}) + "\n"
+        + '{"id": "3", "sta',  # ligne tronquée par un arrêt brutal
+        encoding="utf-8")
+    calls = []
+    monkeypatch.setattr(batch, "generate_sql",
+                        lambda question, llm, db: calls.append(question) or "SELECT 1")
+    stats = _runner().run([{"id": str(i), "question": f"question {i}"} for i in (1, 2, 3)],
+                          str(output), resume=True)
+    assert stats["skipped"] == 1
+    assert sorted(calls) == ["question 2", "question 3"]
+
+def test_runs_under_batch_identity(tmp_path, monkeypatch):
+    users = []
+    monkeypatch.setattr(batch, "generate_sql",
+                        lambda question, llm, db: users.append(current_user.get()) or "SELECT 1")
+    _runner().run([{"id": "1", "question": "q"}], str(tmp_path / "out.jsonl"))
+    assert users == [BATCH_USER]
+
+def test_user_quota_waits_without_consuming_retries(tmp_path, monkeypatch):
+    calls = []
+
+    def generate(question, llm, db):
+        calls.append(question)
+        if len(calls) <= 3:
+            raise RateLimitExceeded("Too many requests for this user", 0.01, "user_quota")
+        return "SELECT 1"
+
+    monkeypatch.setattr(batch, "generate_sql", generate)
+    stats = _runner(max_retries=0).run([{"id": "1", "question": "q"}], str(tmp_path / "out.jsonl"))
+    assert stats["ok"] == 1 and len(calls) == 4
+
+def test_circuit_open_retried_up_to_max_retries(tmp_path, monkeypatch):
+    calls = []
+
+    def generate(question, llm, db):
+        calls.append(question)
+        raise CircuitOpenError("llm", 0.01)
+
+    monkeypatch.setattr(batch, "generate_sql", generate)
+    stats = _runner(max_retries=2).run([{"id": "1", "question": "q"}], str(tmp_path / "out.jsonl"))
+    assert stats["error"] == 1 and len(calls) == 3
+
+def test_other_errors_not_retried(tmp_path, monkeypatch):
+    calls = []
+
+    def generate(question, llm, db):
+        calls.append(question)
+        raise TimeoutError("deadline exceeded")
+
+    monkeypatch.setattr(batch, "generate_sql", generate)
+    output = tmp_path / "out.jsonl"
+    stats = _runner(max_retries=3).run([{"id": "1", "question": "q"}], str(output))
+    assert stats["error"] == 1 and len(calls) == 1
+    assert _read(output)[0]["error"] == "deadline exceeded"
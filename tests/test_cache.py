@@ -0,0 +1,105 @@
+"""Tests des politiques d'éviction et du cache L1"""
+import time
+import pytest
+from infrastructure.cache import CacheManager, LFUPolicy, LRUPolicy, TTLPolicy
+
+def _item(expires_at: float) -> dict:
+    return {"value": None, "expires_at": expires_at, "size": 1}
+
+@pytest.fixture
+def make_cache():
+    caches = []
+
+    def make(**kwargs):
+        cache = CacheManager(sweep_interval=3600, l2=None, **kwargs)
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        cache.close()
+
+def test_ttl_policy_evicts_nearest_expiration():
+    policy = TTLPolicy()
+    policy.on_insert("late", _item(300))
+    policy.on_insert("soon", _item(100))
+    policy.on_insert("middle", _item(200))
+    assert policy.victim() == "soon"
+    policy.on_remove("soon")
+    assert policy.victim() == "middle"
+
+def test_ttl_policy_ignores_stale_heap_entries():
+    policy = TTLPolicy()
+    policy.on_insert("a", _item(100))
+    policy.on_insert("b", _item(200))
+    # Réécriture de a : l'ancienne expiration ne doit plus compter
+    policy.on_insert("a", _item(300))
+    assert policy.victim() == "b"
+
+def test_ttl_policy_heap_stays_bounded():
+    policy = TTLPolicy()
+    for i in range(10000):
+        policy.on_insert("key", _item(i))
+    assert len(policy._heap) <= 2 * len(policy._expires) + 16
+    assert policy.victim() == "key"
+
+def test_lru_policy_evicts_least_recently_used():
+    policy = LRUPolicy()
+    for key in ("a", "b", "c"):
+        policy.on_insert(key, _item(0))
+    policy.on_access("a", _item(0))
+    assert policy.victim() == "b"
+
+def test_lfu_policy_evicts_least_frequently_used():
+    policy = LFUPolicy()
+    for key in ("a", "b", "c"):
+        policy.on_insert(key, _item(0))
+    policy.on_access("a", _item(0))
+    policy.on_access("c", _item(0))
+    assert policy.victim() == "b"
+
+def test_cache_evicts_on_max_entries(make_cache):
+    cache = make_cache(max_entries=3, eviction_policy="lru")
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+    cache.get("a")
+    cache.set("d", "d")
+    assert cache.get("b") is None
+    assert {cache.get(k) for k in ("a", "c", "d")} == {"a", "c", "d"}
+    assert cache.evictions == 1
+
+def test_cache_evicts_on_max_bytes(make_cache):
+    cache = make_cache(max_bytes=1000, eviction_policy="lru")
+    cache.set("a", b"x" * 400)
+    cache.set("b", b"x" * 400)
+    cache.set("c", b"x" * 400)
+    assert cache.get("a") is None
+    assert cache.current_bytes == 800
+
+def test_cache_rejects_oversized_item(make_cache):
+    cache = make_cache(max_bytes=100)
+    assert not cache.set("big", b"x" * 200)
+    assert cache.get("big") is None
+
+def test_cache_ttl_policy_evicts_soonest_expiring(make_cache):
+    cache = make_cache(max_entries=2, eviction_policy="ttl")
+    cache.set("long", 1, ttl=600)
+    cache.set("short", 2, ttl=60)
+    cache.set("new", 3, ttl=300)
+    assert cache.get("short") is None
+    assert cache.get("long") == 1
+
+def test_cache_expired_entries(make_cache):
+    cache = make_cache()
+    cache.set("a", 1, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    cache.set("b", 2, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.purge_expired() == 1
+    assert cache.current_bytes == 0
+
+def test_cache_get_many(make_cache):
+    cache = make_cache()
+    cache.set_many({"a": 1, "b": 2})
+    assert cache.get_many(["a", "b", "c"]) == {"a": 1, "b": 2}
@@ -0,0 +1,60 @@
+"""Tests du cache à deux niveaux (L2 Redis simulé par fakeredis)"""
+import time
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from infrastructure.cache import CacheManager
+from infrastructure.redis_cache import RedisCache
+
+@pytest.fixture
+def l2():
+    return RedisCache(client=fakeredis.FakeRedis(), prefix="test:")
+
+@pytest.fixture
+def make_cache(l2):
+    caches = []
+
+    def make(**kwargs):
+        cache = CacheManager(sweep_interval=3600, l2=l2, **kwargs)
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        cache.close()
+
+def _remaining_ttl(cache: CacheManager, key: str) -> float:
+    return cache.memory_cache[key]["expires_at"] - time.time()
+
+def test_get_promotes_with_remaining_ttl(l2, make_cache):
+    l2.set("a", "value", 20)
+    cache = make_cache()
+    assert cache.get("a") == "value"
+    assert 15 < _remaining_ttl(cache, "a") <= 20
+
+def test_get_many_promotes_with_remaining_ttl(l2, make_cache):
+    l2.set("a", 1, 20)
+    l2.set("b", 2, 500)
+    cache = make_cache()
+    assert cache.get_many(["a", "b", "c"]) == {"a": 1, "b": 2}
+    assert 15 < _remaining_ttl(cache, "a") <= 20
+    assert 450 < _remaining_ttl(cache, "b") <= 500
+
+def test_oversized_l2_value_not_promoted(l2, make_cache):
+    cache = make_cache(max_bytes=1000)
+    cache.set("small", b"x" * 100)
+    # Écrite par un réplica au plafond plus élevé
+    l2.set("big", b"x" * 5000, 60)
+    assert cache.get("big") == b"x" * 5000
+    assert cache.get_many(["big"]) == {"big": b"x" * 5000}
+    assert "big" not in cache.memory_cache
+    assert "small" in cache.memory_cache
+    assert cache.current_bytes <= cache.max_bytes
+
+def test_set_writes_through_to_l2(l2, make_cache):
+    cache = make_cache()
+    cache.set("a", {"rows": 3}, ttl=60)
+    assert l2.get("a") == {"rows": 3}
+    other = make_cache()
+    assert other.get("a") == {"rows": 3}
@@ -0,0 +1,85 @@
+"""Tests du contrôle des requêtes exécutables"""
+import pytest
+from domain.sql import execution
+from domain.sql.execution import is_read_only
+
+READ_QUERIES = [
+    "SELECT 1",
+    "select name from brands;",
+    "-- commentaire\nSELECT name FROM brands",
+    "WITH t AS (SELECT 1 AS x) SELECT x FROM t",
+    "SELECT DATEADD(month, -1, sale_date) AS d FROM sales",
+    "SELECT 'insert into t; drop table x' AS label",
+]
+
+WRITE_QUERIES = [
+    "",
+    "DELETE FROM sales",
+    "DROP TABLE sales",
+    "SELECT 1; DROP TABLE sales",
+    "SELECT * INTO backup FROM sales",
+    "SELECT pg_terminate_backend(42)",
+    "/* SELECT */ UPDATE sales SET qty = 0",
+]
+
+@pytest.mark.parametrize("sql", READ_QUERIES)
+def test_read_queries_allowed(sql):
+    pytest.importorskip("sqlglot")
+    assert is_read_only(sql)
+
+@pytest.mark.parametrize("sql", WRITE_QUERIES + [
+    "WITH d AS (DELETE FROM sales RETURNING id) SELECT * FROM d",
+])
+def test_write_queries_rejected(sql):
+    pytest.importorskip("sqlglot")
+    assert not is_read_only(sql)
+
+@pytest.mark.parametrize("sql", READ_QUERIES)
+def test_read_queries_allowed_without_sqlglot(monkeypatch, sql):
+    monkeypatch.setattr(execution, "load_sqlglot", lambda: None)
+    assert is_read_only(sql)
+
+@pytest.mark.parametrize("sql", WRITE_QUERIES)
+def test_write_queries_rejected_without_sqlglot(monkeypatch, sql):
+    monkeypatch.setattr(execution, "load_sqlglot", lambda: None)
+    assert not is_read_only(sql)
+
+@pytest.fixture
+def engine(tmp_path):
+    from sqlalchemy import create_engine, text
+    engine = create_engine(f"sqlite:///{tmp_path / 'results.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE sales (id INTEGER, label TEXT)"))
+        conn.execute(text("INSERT INTO sales VALUES " + ", ".join(f"({i}, 'row {i}')" for i in range(25))))
+    yield engine
+    engine.dispose()
+
+def _read_all(stream):
+    rows = []
+    while not stream.closed:
+        rows.extend(stream.fetch_page())
+    return rows
+
+def test_stream_pages_until_exhausted(engine):
+    stream = execution.QueryResultStream("SELECT id FROM sales ORDER BY id", engine, page_size=10)
+    assert stream.columns == ["id"]
+    assert len(stream.fetch_page()) == 10
+    rows = [row[0] for row in _read_all(stream)]
+    assert rows == list(range(10, 25))
+    assert stream.exhausted and not stream.truncated
+
+def test_stream_max_rows(engine):
+    stream = execution.QueryResultStream("SELECT id FROM sales", engine, page_size=10, max_rows=15)
+    assert len(_read_all(stream)) == 15
+    assert stream.truncated
+
+def test_stream_max_bytes(engine):
+    stream = execution.QueryResultStream("SELECT id, label FROM sales", engine, page_size=10,
+                                         max_bytes=1000)
+    rows = _read_all(stream)
+    assert 0 < len(rows) < 25
+    assert stream.truncated and stream.bytes_fetched <= 1000
+
+def test_execute_rejects_writes(engine):
+    with pytest.raises(execution.QueryExecutionError):
+        execution.execute_query_stream("DELETE FROM sales", engine=engine, use_cache=False)
@@ -0,0 +1,61 @@
+"""Tests du redimensionnement à chaud du pool de connexions"""
+import pytest
+from sqlalchemy import create_engine
+from infrastructure.pool import ElasticQueuePool
+
+@pytest.fixture
+def pool(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=ElasticQueuePool,
+                           pool_size=2, max_overflow=5)
+    yield engine.pool
+    engine.dispose()
+
+def test_grow_absorbs_overflow(pool):
+    connections = [pool.connect() for _ in range(4)]
+    assert pool.overflow() == 2
+    pool.resize(4)
+    assert pool.size() == 4
+    assert pool.overflow() == 0
+    assert pool.checkedout() == 4
+    for connection in connections:
+        connection.close()
+    assert pool.checkedin() == 4
+
+def test_shrink_closes_idle_connections(pool):
+    pool.resize(4)
+    connections = [pool.connect() for _ in range(4)]
+    for connection in connections:
+        connection.close()
+    assert pool.checkedin() == 4
+    pool.resize(2)
+    assert pool.size() == 2
+    assert pool.checkedin() == 2
+    # Connexions ouvertes = taille du pool
+    assert pool.overflow() == 0
+
+def test_shrink_keeps_checked_out_connections(pool):
+    pool.resize(4)
+    connections = [pool.connect() for _ in range(4)]
+    pool.resize(2)
+    assert pool.checkedout() == 4
+    assert pool.overflow() == 2
+    for connection in connections:
+        connection.close()
+    # Les connexions au-delà de la nouvelle taille sont fermées au retour
+    assert pool.checkedin() == 2
+
+def test_resize_updates_max_overflow(pool):
+    pool.resize(3, max_overflow=1)
+    connections = [pool.connect() for _ in range(4)]
+    assert pool.get_stats()["max_overflow"] == 1
+    assert pool.resizes == 1
+    for connection in connections:
+        connection.close()
+
+def test_peak_tracking(pool):
+    connections = [pool.connect() for _ in range(3)]
+    for connection in connections[1:]:
+        connection.close()
+    assert pool.take_peak() == 3
+    assert pool.take_peak() == 1
+    connections[0].close()
@@ -0,0 +1,35 @@
+"""Tests du post-traitement de la sortie du LLM"""
+from domain.sql.postprocess import clean_sql_output, find_statement_end
+
+def test_statement_end_first_semicolon():
+    text = "SELECT 1; SELECT 2;"
+    assert find_statement_end(text) == len("SELECT 1;")
+
+def test_statement_end_ignores_quoted_semicolons():
+    text = "SELECT ';', \"a;b\" FROM t; extra"
+    assert text[:find_statement_end(text)] == "SELECT ';', \"a;b\" FROM t;"
+
+def test_statement_end_ignores_escaped_quotes():
+    text = "SELECT 'it''s;' FROM t;"
+    assert find_statement_end(text) == len(text)
+
+def test_statement_end_ignores_comments():
+    text = "SELECT 1 -- fin;\n, 2 /* ; */ FROM t;"
+    assert find_statement_end(text) == len(text)
+
+def test_statement_end_incomplete():
+    assert find_statement_end("SELECT * FROM t") is None
+    assert find_statement_end("SELECT 'abc;") is None
+    assert find_statement_end("SELECT 1 /* ;") is None
+
+def test_clean_strips_markdown_and_label():
+    assert clean_sql_output("```sql\nSQLQuery: SELECT 1;\n```") == "SELECT 1;"
+
+def test_clean_cuts_after_first_statement():
+    assert clean_sql_output("SELECT name FROM brands; SELECT 2;") == "SELECT name FROM brands;"
+
+def test_clean_keeps_unterminated_statement():
+    assert clean_sql_output("WITH t AS (SELECT 1) SELECT * FROM t") == "WITH t AS (SELECT 1) SELECT * FROM t"
+
+def test_clean_empty():
+    assert clean_sql_output(None) == ""
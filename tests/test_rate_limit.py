@@ -0,0 +1,113 @@
+"""Tests du contrôle d'admission : quotas par utilisateur et file équitable"""
+import asyncio
+import threading
+import pytest
+from infrastructure.rate_limit import BATCH_USER, RateLimiter, RateLimitExceeded
+from infrastructure.settings import settings
+
+class ManualBucket:
+    """Bucket global piloté par le test"""
+
+    def __init__(self, tokens: int = 0):
+        self.tokens = tokens
+
+    def take(self, tokens: float = 1) -> float:
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return 0.05
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_enabled", True)
+
+def _limiter(**kwargs) -> RateLimiter:
+    options = dict(user_requests=100, user_window=3600, global_requests=100,
+                   global_window=1, global_burst=100, queue_timeout=1)
+    options.update(kwargs)
+    return RateLimiter(**options)
+
+def test_user_quota_rejects_immediately():
+    limiter = _limiter(user_requests=2)
+    limiter.acquire("alice")
+    limiter.acquire("alice")
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        limiter.acquire("alice")
+    assert exc_info.value.reason == "user_quota"
+    assert exc_info.value.retry_after > 0
+    # Quota indépendant par utilisateur
+    limiter.acquire("bob")
+
+def test_batch_user_has_its_own_quota(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_batch_requests", 5)
+    limiter = _limiter(user_requests=1)
+    for _ in range(5):
+        limiter.acquire(BATCH_USER)
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire(BATCH_USER)
+
+def test_fair_queue_serves_users_round_robin():
+    limiter = _limiter()
+    limiter._global = ManualBucket()
+    granted = []
+    for user, index in [("alice", 1), ("alice", 2), ("alice", 3), ("bob", 1), ("carol", 1)]:
+        limiter._enqueue(user, None, lambda user=user, index=index: granted.append(f"{user}{index}"))
+    assert limiter.queue_depth == 5
+
+    limiter._global.tokens = 5
+    assert limiter._dispatch() == 0.0
+    assert granted == ["alice1", "bob1", "carol1", "alice2", "alice3"]
+    assert limiter.queue_depth == 0 and limiter.admitted == 5
+
+def test_dispatch_stops_without_global_tokens():
+    limiter = _limiter()
+    limiter._global = ManualBucket(tokens=1)
+    granted = []
+    for user in ("alice", "bob"):
+        limiter._enqueue(user, None, lambda user=user: granted.append(user))
+    assert limiter._dispatch() > 0
+    assert granted == ["alice"] and limiter.queue_depth == 1
+
+def test_queue_timeout():
+    limiter = _limiter()
+    limiter._global = ManualBucket()
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        limiter.acquire("alice", timeout=0.1)
+    assert exc_info.value.reason == "queue_timeout"
+    assert limiter.queue_depth == 0 and limiter.timed_out == 1
+
+def test_waiting_thread_is_woken_when_token_arrives():
+    limiter = _limiter()
+    limiter._global = ManualBucket()
+    done = threading.Event()
+    worker = threading.Thread(target=lambda: (limiter.acquire("alice", timeout=2), done.set()))
+    worker.start()
+    assert not done.wait(0.1)
+    limiter._global.tokens = 1
+    worker.join(2)
+    assert done.is_set()
+
+def test_acquire_async_and_cancellation():
+    limiter = _limiter()
+    limiter._global = ManualBucket()
+
+    async def scenario():
+        waiting = asyncio.ensure_future(limiter.acquire_async("alice", timeout=2))
+        await asyncio.sleep(0.1)
+        assert limiter.queue_depth == 1
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert limiter.queue_depth == 0
+
+        limiter._global.tokens = 1
+        await limiter.acquire_async("bob", timeout=1)
+        assert limiter.admitted == 1
+
+    asyncio.run(scenario())
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_enabled", False)
+    limiter = _limiter(user_requests=1)
+    for _ in range(3):
+        limiter.acquire("alice")
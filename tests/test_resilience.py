@@ -0,0 +1,98 @@
+"""Tests du disjoncteur et des retries budgétés"""
+import time
+import pytest
+from infrastructure.resilience import (CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError,
+                                       retry_call)
+
+def _fail(breaker: CircuitBreaker, error: Exception):
+    with pytest.raises(type(error)):
+        with breaker.call():
+            raise error
+
+def _succeed(breaker: CircuitBreaker):
+    with breaker.call():
+        pass
+
+def test_opens_after_threshold():
+    breaker = CircuitBreaker("test", failure_threshold=3, recovery_timeout=60)
+    for _ in range(2):
+        _fail(breaker, TimeoutError())
+    assert breaker.state == CLOSED
+    _fail(breaker, TimeoutError())
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as exc_info:
+        _succeed(breaker)
+    assert exc_info.value.retry_after > 0
+    assert breaker.rejected == 1
+
+def test_success_resets_failures():
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=60)
+    _fail(breaker, TimeoutError())
+    _succeed(breaker)
+    _fail(breaker, TimeoutError())
+    assert breaker.state == CLOSED
+
+def test_non_transient_errors_do_not_open():
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=60)
+    for _ in range(5):
+        _fail(breaker, ValueError("column does not exist"))
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+
+def test_half_open_probe_success_closes():
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0.01)
+    _fail(breaker, TimeoutError())
+    time.sleep(0.02)
+    _succeed(breaker)
+    assert breaker.state == CLOSED
+
+def test_half_open_probe_failure_reopens():
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0.01)
+    _fail(breaker, TimeoutError())
+    time.sleep(0.02)
+    _fail(breaker, TimeoutError())
+    assert breaker.state == OPEN
+    assert breaker.opened_count == 2
+
+def test_half_open_allows_a_single_probe():
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0.01)
+    _fail(breaker, TimeoutError())
+    time.sleep(0.02)
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_cancelled_probe_is_released():
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0.01)
+    _fail(breaker, TimeoutError())
+    time.sleep(0.02)
+    with pytest.raises(KeyboardInterrupt):
+        with breaker.call():
+            raise KeyboardInterrupt
+    assert breaker.state == HALF_OPEN
+    _succeed(breaker)
+    assert breaker.state == CLOSED
+
+def test_retry_call_retries_transient_errors():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise TimeoutError()
+        return "ok"
+
+    assert retry_call("test-retry", flaky, attempts=3, budget=5, base_delay=0.001) == "ok"
+    assert len(calls) == 3
+
+def test_retry_call_does_not_retry_permanent_errors():
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise ValueError("invalid request")
+
+    with pytest.raises(ValueError):
+        retry_call("test-permanent", broken, attempts=3, budget=5, base_delay=0.001)
+    assert len(calls) == 1
@@ -0,0 +1,45 @@
+"""Tests de l'authentification de l'API et des jetons de SQL généré"""
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.security import check_auth_configured, require_api_key, sign_sql, verify_sql_token
+from infrastructure.settings import settings
+
+@pytest.fixture
+def auth(monkeypatch):
+    def configure(api_key=None, disabled=False):
+        monkeypatch.setattr(settings, "api_key", api_key)
+        monkeypatch.setattr(settings, "api_auth_disabled", disabled)
+    return configure
+
+def _status(x_api_key):
+    try:
+        asyncio.run(require_api_key(x_api_key))
+        return 200
+    except HTTPException as e:
+        return e.status_code
+
+def test_fails_closed_without_api_key(auth):
+    auth(api_key=None)
+    with pytest.raises(RuntimeError):
+        check_auth_configured()
+    assert _status(None) == 401
+    assert _status("anything") == 401
+
+def test_explicitly_disabled(auth):
+    auth(api_key=None, disabled=True)
+    check_auth_configured()
+    assert _status(None) == 200
+
+def test_api_key_required(auth):
+    auth(api_key="secret")
+    check_auth_configured()
+    assert _status("secret") == 200
+    assert _status("wrong") == 401
+    assert _status(None) == 401
+
+def test_sql_token():
+    token = sign_sql("SELECT 1")
+    assert verify_sql_token("SELECT 1", token)
+    assert not verify_sql_token("SELECT 2", token)
+    assert not verify_sql_token("SELECT 1", None)
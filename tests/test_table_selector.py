@@ -0,0 +1,43 @@
+"""Tests de la sélection des tables passées au prompt"""
+from domain.sql.table_selector import BM25Index, TableSelector, tokenize
+
+class FakeDatabase:
+    def __init__(self, tables):
+        self.tables = tables
+
+    def get_usable_table_names(self):
+        return list(self.tables)
+
+def _selector(columns, scores):
+    selector = TableSelector()
+    selector._columns = columns
+    selector.rank = lambda question, db: scores
+    return selector
+
+COLUMNS = {
+    "sales": ["id", "brand_id", "model_id", "dealer_id", "qty"],
+    "brands": ["id", "name"],
+    "models": ["id", "brand_id", "name"],
+    "dealers": ["id", "city"],
+    "audit_log": ["id", "message"],
+    "calendar": ["day"],
+}
+
+def test_small_schema_uses_all_tables():
+    selector = _selector(COLUMNS, {})
+    assert selector.select("question", FakeDatabase(COLUMNS), top_k=10) is None
+
+def test_ranked_tables_with_join_partners():
+    selector = _selector(COLUMNS, {"models": 1.0, "calendar": 0.2})
+    assert selector.select("modèles", FakeDatabase(COLUMNS), top_k=3) == ["models", "brands", "calendar"]
+
+def test_no_match_stays_bounded():
+    selector = _selector(COLUMNS, {})
+    selected = selector.select("質問", FakeDatabase(COLUMNS), top_k=3)
+    # Table de faits d'abord, puis ses dimensions
+    assert selected == ["sales", "brands", "models"]
+
+def test_bm25_prefers_matching_table():
+    index = BM25Index({"sales": tokenize("sales qty price"), "brands": tokenize("brands name")})
+    scores = index.scores(tokenize("total sales"))
+    assert set(scores) == {"sales"}
@@ -0,0 +1,72 @@
+"""Tests de la validation locale du SQL généré (sqlglot requis)"""
+import pytest
+
+pytest.importorskip("sqlglot")
+
+from domain.sql.postprocess import clean_sql_output, looks_like_sql
+from domain.sql.validation import validate_sql
+
+CATALOG = {
+    "sales": {"id", "qty", "price", "brand_id", "sale_date"},
+    "brands": {"id", "name", "country"},
+}
+
+@pytest.mark.parametrize("sql", [
+    "SELECT DATEADD(month, -1, sale_date) AS previous_month FROM sales",
+    "SELECT DATEDIFF(day, sale_date, GETDATE()) FROM sales",
+    "SELECT EXTRACT(year FROM sale_date) AS year, SUM(qty) FROM sales GROUP BY 1",
+    "SELECT DATE_TRUNC('month', sale_date) AS month, COUNT(*) FROM sales GROUP BY month",
+    "SELECT brand_id, SUM(qty) AS total FROM sales GROUP BY brand_id ORDER BY total DESC",
+    "SELECT b.name, SUM(s.qty) FROM sales s JOIN brands b ON b.id = s.brand_id GROUP BY b.name",
+    "WITH t AS (SELECT brand_id, qty FROM sales) SELECT brand_id, SUM(qty) FROM t GROUP BY brand_id",
+    "SELECT name FROM (SELECT name, country AS c FROM brands) x WHERE c = 'FR'",
+    "SELECT name FROM public.brands WHERE country = 'JP' LIMIT 10",
+    "SELECT SYSDATE, CURRENT_DATE, COUNT(*) FROM sales",
+])
+def test_valid_queries_have_no_false_positive(sql):
+    assert validate_sql(sql, CATALOG) is None
+
+def test_unknown_table():
+    error = validate_sql("SELECT * FROM cars", CATALOG)
+    assert error.startswith("Unknown table(s): cars")
+    assert "brands" in error and "sales" in error
+
+def test_unknown_qualified_column():
+    error = validate_sql("SELECT b.label FROM brands b", CATALOG)
+    assert error.startswith("Unknown column(s): b.label")
+
+def test_unknown_unqualified_column():
+    error = validate_sql("SELECT revenue FROM sales", CATALOG)
+    assert error.startswith("Unknown column(s): revenue")
+
+def test_names_not_checked_without_catalog():
+    assert validate_sql("SELECT revenue FROM cars") is None
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * INTO backup FROM sales",
+    "DELETE FROM sales",
+    "WITH d AS (DELETE FROM sales RETURNING id) SELECT * FROM d",
+    "SELECT pg_terminate_backend(123)",
+])
+def test_write_queries_rejected(sql):
+    assert validate_sql(sql, CATALOG) is not None
+
+def test_single_statement_required():
+    assert validate_sql("SELECT 1; SELECT 2", CATALOG) == "Expected exactly one SQL statement"
+
+def test_prose_rejected():
+    assert validate_sql("Désolé, je ne sais pas.", CATALOG).startswith("The output is not a SQL query")
+
+def test_syntax_error():
+    assert validate_sql("SELECT name FROM brands WHERE (", CATALOG).startswith("Syntax error")
+
+def test_prose_before_statement_is_stripped():
+    sql = clean_sql_output("Voici la requête :\nSELECT name FROM brands;\nCette requête liste les marques.")
+    assert sql == "SELECT name FROM brands;"
+    assert validate_sql(sql, CATALOG) is None
+
+def test_looks_like_sql():
+    assert looks_like_sql("-- commentaire\nSELECT 1")
+    assert looks_like_sql("(SELECT 1)")
+    assert not looks_like_sql("Je ne peux pas répondre à cette question.")
+    assert not looks_like_sql("DELETE FROM sales")
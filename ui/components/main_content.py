@@ -1,12 +1,18 @@
 """
 Zone de contenu principal de l'application
 """
+import uuid
 import streamlit as st
 from langue.translator import get_text
+from infrastructure.settings import settings
+from infrastructure.tracing import set_trace_tags, span
 
 def render_main_content():
     """Affiche le contenu principal de l'application"""
     
+    # Étiquette des mesures de latence prises pendant ce rendu
+    set_trace_tags(language=st.session_state.get('language'))
+    
     # Navigation par onglets
     tab1, tab2, tab3 = st.tabs([
         get_text("tab_generator"),
@@ -69,49 +75,114 @@ def render_sql_generator():
             st.session_state.question_input = ""
             if 'generated_sql' in st.session_state:
                 del st.session_state.generated_sql
+            close_result_stream()
             st.rerun()
     
-    # Génération SQL
+    # Génération SQL (asynchrone, suivie par le fragment de statut)
     if generate_clicked and question:
         generate_sql_query(question)
     
+    # Fragment à rafraîchissement périodique : uniquement pendant une génération
+    if st.session_state.get('generation_request_id'):
+        render_generation_status()
+    render_generation_notice()
+    
     # Affichage du résultat
     if 'generated_sql' in st.session_state and st.session_state.generated_sql:
         render_sql_result(st.session_state.generated_sql)
 
 def generate_sql_query(question):
-    """Génère la requête SQL"""
-    try:
-        with st.spinner(get_text("generating")):
-            # Import seulement quand nécessaire
-            from domain.sql.service import generate_sql_query_only
-            from infrastructure.llm import init_llm
-            from infrastructure.database import connect_to_redshift
-            
-            # Utilisation de votre code existant
-            llm = init_llm()
-            db = connect_to_redshift()
-            sql = generate_sql_query_only(question, llm, db)
-            
-            if sql:
-                st.session_state.generated_sql = sql
-                
-                # Ajouter à l'historique
-                if 'query_history' not in st.session_state:
-                    st.session_state.query_history = []
-                
-                st.session_state.query_history.insert(0, {
-                    'question': question,
-                    'sql': sql,
-                    'timestamp': str(st.session_state.get('current_time', 'now'))
-                })
-                
-                st.success(get_text("success_generated"))
-            else:
-                st.error(get_text("error_generation"))
-                
-    except Exception as e:
-        st.error(f"{get_text('error_generation')}: {str(e)}")
+    """Soumet la génération SQL sans bloquer le script Streamlit"""
+    from domain.sql.generation_jobs import generation_service
+    
+    # Une seule génération en cours par session
+    previous = st.session_state.get('generation_request_id')
+    if previous:
+        generation_service.cancel(previous)
+    
+    # Identifiant de session pour le quota par utilisateur
+    if 'rate_limit_user' not in st.session_state:
+        st.session_state.rate_limit_user = uuid.uuid4().hex
+    
+    st.session_state.generation_request_id = generation_service.submit(
+        question,
+        user_id=st.session_state.rate_limit_user,
+        language=st.session_state.get('language'),
+        llm_config=st.session_state.get('llm_config')
+    )
+
+@st.fragment(run_every=settings.generation_poll_interval)
+def render_generation_status():
+    """Suit la génération en cours par polling (seul ce fragment est réexécuté)"""
+    from domain.sql.generation_jobs import (generation_service, DONE, CANCELLED, TIMEOUT,
+                                            RATE_LIMITED, UNAVAILABLE)
+    
+    request_id = st.session_state.get('generation_request_id')
+    if not request_id:
+        return
+    
+    job = generation_service.get(request_id)
+    if job is None:
+        del st.session_state.generation_request_id
+        # Rerun complet : le fragment cesse d'être rendu (plus de polling)
+        st.rerun(scope="app")
+    
+    if not job.finished:
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.info(get_text("generating"))
+        with col2:
+            if st.button(get_text("cancel_button"), use_container_width=True):
+                generation_service.cancel(request_id)
+        
+        # SQL affiché au fil des tokens reçus
+        if job.partial_sql:
+            st.markdown(f"### {get_text('sql_generated')}")
+            st.code(job.partial_sql, language="sql")
+        return
+    
+    del st.session_state.generation_request_id
+    
+    if job.status == DONE and job.sql:
+        st.session_state.generated_sql = job.sql
+        close_result_stream()
+        
+        # Ajouter à l'historique
+        if 'query_history' not in st.session_state:
+            st.session_state.query_history = []
+        
+        st.session_state.query_history.insert(0, {
+            'question': job.question,
+            'sql': job.sql,
+            'timestamp': str(st.session_state.get('current_time', 'now'))
+        })
+        
+        st.session_state.generation_notice = ("success", get_text("success_generated"))
+    elif job.status == CANCELLED:
+        st.session_state.generation_notice = ("info", get_text("generation_cancelled"))
+    elif job.status == TIMEOUT:
+        st.session_state.generation_notice = ("error", get_text("generation_timeout"))
+    elif job.status == RATE_LIMITED:
+        st.session_state.generation_notice = (
+            "warning", get_text("rate_limited", seconds=max(1, round(job.retry_after or 1)))
+        )
+    elif job.status == UNAVAILABLE:
+        st.session_state.generation_notice = (
+            "warning", get_text("service_unavailable", seconds=max(1, round(job.retry_after or 1)))
+        )
+    else:
+        message = f"{get_text('error_generation')}: {job.error}" if job.error else get_text("error_generation")
+        st.session_state.generation_notice = ("error", message)
+    
+    # Rerun complet pour afficher le résultat hors du fragment et arrêter le polling
+    st.rerun(scope="app")
+
+def render_generation_notice():
+    """Affiche le message de fin de la dernière génération"""
+    notice = st.session_state.pop('generation_notice', None)
+    if notice:
+        level, message = notice
+        getattr(st, level)(message)
 
 def render_sql_result(sql):
     """Affiche le résultat SQL généré"""
@@ -140,7 +211,58 @@ def render_sql_result(sql):
     
     with col3:
         if st.button(get_text("execute_button"), use_container_width=True):
-            st.info("⚡ Fonctionnalité d'exécution à venir...")
+            execute_sql_query(sql)
+    
+    # Résultats de l'exécution (première page puis pages à la demande)
+    if st.session_state.get('query_result') and st.session_state.query_result['sql'] == sql:
+        render_query_results()
+
+def close_result_stream():
+    """Ferme le flux de résultats courant de la session"""
+    result = st.session_state.pop('query_result', None)
+    if result and result.get('stream') is not None:
+        result['stream'].close()
+
+def execute_sql_query(sql):
+    """Exécute la requête et charge immédiatement la première page"""
+    from domain.sql.execution import execute_query_stream, QueryExecutionError
+    
+    close_result_stream()
+    try:
+        with st.spinner(get_text("executing")):
+            stream = execute_query_stream(sql)
+            st.session_state.query_result = {
+                'sql': sql,
+                'stream': stream,
+                'columns': stream.columns,
+                'rows': stream.fetch_page()
+            }
+    except QueryExecutionError:
+        st.error(get_text("read_only_error"))
+    except Exception as e:
+        st.error(f"{get_text('execution_error')}: {str(e)}")
+
+def render_query_results():
+    """Affiche les lignes chargées et permet de charger la page suivante"""
+    import pandas as pd
+    
+    result = st.session_state.query_result
+    stream = result['stream']
+    
+    st.markdown(f"### {get_text('results_title')}")
+    with span("render"):
+        st.dataframe(
+            pd.DataFrame(result['rows'], columns=result['columns']),
+            use_container_width=True
+        )
+    st.caption(get_text("rows_loaded", count=len(result['rows'])))
+    
+    if stream.truncated:
+        st.warning(get_text("results_truncated"))
+    elif not stream.closed:
+        if st.button(get_text("load_more"), use_container_width=True):
+            result['rows'].extend(stream.fetch_page())
+            st.rerun()
 
 def render_query_history():
     """Affiche l'historique des requêtes"""
@@ -180,7 +302,7 @@ def render_advanced_settings():
             get_text("temperature_label"),
             min_value=0.0,
             max_value=0.3,  # Limité pour SQL
-            value=0.0,       # Valeur officielle recommandée
+            value=settings.llm_temperature,  # 0.0 : valeur officielle recommandée
             step=0.05,
             help="**Recommandation officielle : 0.0 pour SQL**\n\n"
                  "• 0.0 = Déterministe, résultats cohérents (RECOMMANDÉ)\n"
@@ -194,7 +316,7 @@ def render_advanced_settings():
             get_text("max_tokens_label"),
             min_value=500,
             max_value=2000,
-            value=1000,      # Valeur officielle recommandée
+            value=settings.llm_max_tokens or 1000,  # 1000 : valeur officielle recommandée
             step=100,
             help="**Recommandation officielle : 1000 tokens**\n\n"
                  "• 500-800 = Requêtes SQL simples\n"
@@ -230,7 +352,7 @@ def render_advanced_settings():
         if st.button(get_text("reset_params"), use_container_width=True):
             # Reset aux valeurs optimales recommandées
             st.session_state.llm_config = {
-                'temperature': 0.0,
-                'max_tokens': 1000
+                'temperature': settings.llm_temperature,
+                'max_tokens': settings.llm_max_tokens
             }
             st.success(get_text("params_reset"))
@@ -3,6 +3,12 @@ Panneau latéral (sidebar) pour configuration et paramètres
 """
 import streamlit as st
 from langue.translator import get_text, set_language, get_available_languages
+from infrastructure.health import get_status_emoji, get_system_status, health_prober
+from infrastructure.settings import settings
+
+# Libellé et couleur du delta st.metric par statut
+STATUS_LABELS = {"OK": "status_ok", "WARNING": "status_warning", "ERROR": "status_error"}
+STATUS_DELTA_COLORS = {"OK": "normal", "WARNING": "off", "ERROR": "inverse"}
 
 def render_sidebar():
     """Affiche le panneau latéral avec configuration"""
@@ -55,23 +61,29 @@ def render_language_selector():
             set_language(new_lang_code)
             st.rerun()
 
+def render_status_metric(label: str, status: str):
+    """Statut d'un service sous forme de métrique (emoji + libellé)"""
+    st.metric(
+        label=label,
+        value=get_status_emoji(status),
+        delta=get_text(STATUS_LABELS.get(status, "status_unknown")),
+        delta_color=STATUS_DELTA_COLORS.get(status, "off")
+    )
+
 def render_connection_status():
     """Affiche le statut des connexions"""
     st.subheader(get_text("database_config"))
     
-    # Status Database - Format vertical pour noms complets
-    st.metric(
-        label=get_text("database"),
-        value="🟢",
-        delta=get_text("connected")
-    )
-    st.caption("Redshift")
+    # Statut lu en mémoire (rafraîchi par le thread de health check)
+    status, message = get_system_status()["database"]
+    render_status_metric(get_text("database"), status)
+    st.caption(f"Redshift · {message}")
     
     st.metric(
         label=get_text("schema"),
         value="📋"
     )
-    st.caption("usedcar_dwh")
+    st.caption(settings.redshift_schema)
     
     # Status simplifié
     st.caption(get_text("secure_connection"))
@@ -81,11 +93,14 @@ def render_llm_settings():
     st.subheader(get_text("llm_settings"))
     
     # Status LLM
+    status, message = get_system_status()["llm"]
     st.metric(
         label=get_text("model_info"),
         value="🤖 Gemini",
-        delta=get_text("status_active")
+        delta=get_text(STATUS_LABELS.get(status, "status_unknown")),
+        delta_color=STATUS_DELTA_COLORS.get(status, "off")
     )
+    st.caption(message)
     
     # Configuration simplifiée - détails dans l'onglet Paramètres
     st.caption(get_text("config_details_available"))
@@ -94,22 +109,25 @@ def render_system_info():
     """Informations système"""
     st.subheader(get_text("system_title"))
     
+    statuses = get_system_status()
+    
     # Métriques rapides
     col1, col2 = st.columns(2)
     
     with col1:
-        st.metric("🗄️ DB", "🟢", "OK")
+        render_status_metric("🗄️ DB", statuses["database"][0])
     
     with col2:
-        st.metric("🤖 LLM", "🟢", "OK")
+        render_status_metric("🤖 LLM", statuses["llm"][0])
     
-    # Bouton de test
+    # Bouton de test : vérification immédiate par le thread de health check
     if st.button("🔍 " + get_text("connection_test"), use_container_width=True):
         with st.spinner(get_text("system_test_running")):
-            # Simuler un test de connexion
-            import time
-            time.sleep(2)
+            health_prober.refresh(wait=2 * settings.health_check_timeout)
+        if all(status == "OK" for status, _ in get_system_status().values()):
             st.success(get_text("system_test_success"))
+        else:
+            st.warning(get_text("system_test_failed"))
     
     # Version info
-    st.caption("v1.0.0 | TextToSQL Streamlit")
+    st.caption(f"v{settings.app_version} | TextToSQL Streamlit")